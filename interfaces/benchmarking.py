@@ -1,5 +1,6 @@
 """Benchmarking runtime."""
 
+from beartype.typing import Optional
 from beartype import beartype
 
 from .linux_minimal import LinuxMinimal
@@ -16,6 +17,7 @@ class Benchmarking(LinuxMinimal):
     DEFAULT_SHORTNAME = "bench"
     DEFAULT_COMMAND = (
         "PYTHONPATH=. ./env/bin/python runtimes/linux_benchmarking.py")
+    SCRIPT: Optional[str] = "runtimes/linux_benchmarking.py"
     PROFILE_TOPIC = "profile/benchmarking"
 
     def handle_profile(self, module: str, msg: bytes) -> None:
@@ -35,6 +37,7 @@ class BenchmarkingSeeded(Benchmarking):
     DEFAULT_SHORTNAME = "seed"
     DEFAULT_COMMAND = (
         "PYTHONPATH=. ./env/bin/python runtimes/linux_benchmarking_seeded.py")
+    SCRIPT = "runtimes/linux_benchmarking_seeded.py"
     PROFILE_TOPIC = "profile/seeded"
 
 
@@ -50,6 +53,7 @@ class BenchmarkingInterference(Benchmarking):
     DEFAULT_COMMAND = (
         "PYTHONPATH=. ./env/bin/python "
         "runtimes/linux_benchmarking_interference.py")
+    SCRIPT = "runtimes/linux_benchmarking_interference.py"
     PROFILE_TOPIC = "profile/interference"
 
 
@@ -64,4 +68,7 @@ class OpcodeCount(Benchmarking):
     DEFAULT_NAME = "benchmarking-opcodes"
     DEFAULT_SHORTNAME = "intrp"
     DEFAULT_COMMAND = "./runtimes/bin/profiling-opcodes"
+    SCRIPT = None
+    # Does not unpack multicast messages (channels are not supported).
+    MULTICAST = False
     PROFILE_TOPIC = "profile/opcodes"
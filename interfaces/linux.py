@@ -1,21 +1,27 @@
 """Linux runtime."""
 
-from beartype import beartype
 from beartype.typing import Optional
 
-from libsilverline import Message, Header, SLSocket
+from libsilverline import Message, Header, hotpath
+from manager import Outbox
 from .linux_minimal import LinuxMinimal
 
 
-@beartype
+@hotpath
 class LinuxRuntime(LinuxMinimal):
-    """Default Linux Runtime."""
+    """Default Linux Runtime.
+
+    Channel messages are sent directly to each module's socket, so multicast
+    messages (which are sent to the runtime) are not used.
+    """
 
     TYPE = "linux"
     APIS = ["wasm", "wasi", "channels", "stdio:out", "profile:deployed"]
     MAX_NMODULES = 128
+    MULTICAST = False
     DEFAULT_NAME = "linux"
     DEFAULT_COMMAND = "./runtimes/linux-default/runtime"
+    SCRIPT = None
 
     def __init__(
         self, rtid: Optional[str] = None, name: Optional[str] = None,
@@ -26,30 +32,79 @@ class LinuxRuntime(LinuxMinimal):
             "metadata": None, "platform": None
         })
         self.socket_mod: dict = {}
+        self.outbox_mod: dict = {}
 
     def create_module(self, data: dict) -> None:
-        """Create module."""
+        """Create module.
+
+        Does not wait for the module to connect; messages sent to the module
+        before then are held in its outbox, whose writer is only started once
+        the connection is accepted by the manager's event loop.
+        """
         index = self.modules.insert(data)
-        self.socket_mod[index] = SLSocket(
+        self.socket_mod[index] = self.TRANSPORT(
             self.index, module=index, server=True, timeout=1.)
+        self.outbox_mod[index] = self.make_outbox(index)
+        self.accept_transport(
+            self.socket_mod[index], lambda: self.outbox_mod[index].start(
+                self.socket_mod[index].write_many))
         self.send(Message.from_dict(
             Header.control | index, Header.create, data))
-        self.socket_mod[index].accept()
+
+    def stop(self) -> None:
+        """Stop process and module send queues."""
+        for index in list(self.outbox_mod):
+            self.__close_module(index)
+        super().stop()
+
+    def __close_module(self, index: int) -> None:
+        """Stop a module's send queue and close its transport, if open."""
+        outbox = self.outbox_mod.pop(index, None)
+        if outbox is not None:
+            outbox.close()
+        transport = self.socket_mod.pop(index, None)
+        if transport is not None:
+            self.remove_transport(transport)
+            transport.close()
 
     def delete_module(self, module_id: str) -> None:
         """Delete module."""
         try:
-            index = self.modules.get(module_id)["index"]
+            index = self.modules.get(module_id).index
             self.send(Message(Header.control | index, Header.delete, bytes()))
-            self.socket_mod[index].close()
-            del self.socket_mod[index]
+            self.__close_module(index)
         except KeyError:
             self.log.error(
                 "Tried to delete nonexistent module: {}".format(module_id))
 
+    def cleanup_module(self, idx: int, mid: str, msg: Message) -> None:
+        """Clean up module after exiting, including its transport."""
+        self.__close_module(idx)
+        super().cleanup_module(idx, mid, msg)
+
+    def outbox_for(self, module: int) -> Outbox:
+        """Get the send queue used for messages to a module."""
+        return self.outbox_mod.get(module, self.outbox)
+
     def send(self, msg: Message) -> None:
         """Send message."""
-        if msg.h1 & Header.control == 0:
-            self.socket_mod[msg.h1].write(msg)
-        else:
-            self.socket.write(msg)
+        self.send_many([msg])
+
+    def send_many(
+        self, msgs: list[Message], received: Optional[float] = None
+    ) -> None:
+        """Queue messages to the outbox of each destination socket."""
+        batches: dict[int, list[Message]] = {}
+        for msg in msgs:
+            dst = -1 if msg.h1 & Header.control else msg.h1
+            batches.setdefault(dst, []).append(msg)
+        for dst, batch in batches.items():
+            if dst == -1:
+                self.outbox.put_many(batch, received=received)
+            elif dst in self.outbox_mod:
+                # Module may have exited since the messages were routed.
+                self.outbox_mod[dst].put_many(batch, received=received)
+
+    def deliver(self, msgs: list[Message], received: float) -> None:
+        """Queue channel messages; latency is recorded when written."""
+        self.send_many(msgs, received=received)
@@ -7,11 +7,12 @@ import subprocess
 from beartype.typing import Optional
 from beartype import beartype
 
-from libsilverline import Message, SLSocket
-from manager import RuntimeManager, linux
+from libsilverline import (
+    Message, Header, SLSocket, Transport, Channel, Flags, hotpath)
+from manager import RuntimeManager, Outbox, linux
 
 
-@beartype
+@hotpath
 class LinuxMinimal(RuntimeManager):
     """Minimal linux runtime communicating with AF_UNIX sockets.
 
@@ -22,6 +23,20 @@ class LinuxMinimal(RuntimeManager):
     command: Command to execute runtime binary.
     cfg: Additional config attributes.
     cpus: CPUs to add to cgroup. If None, does not assign a cgroup.
+
+    Set ``TRANSPORT`` to `SLSharedMemory` in a subclass to communicate over
+    shared memory instead of AF_UNIX sockets; the runtime process is told
+    which transport to use through the ``SL_TRANSPORT`` environment variable.
+
+    Messages are sent through a bounded `Outbox` (``QUEUE_BYTES``,
+    ``QUEUE_POLICY``) drained by a writer thread, so a slow runtime does not
+    stall the MQTT client. Channels opened with ``Flags.conflate`` (or with
+    a delivery interval) are conflated in the outbox. Channel messages for
+    several channels on the runtime are sent as a single multicast message.
+
+    Runtimes implemented as a Python ``SCRIPT`` are forked from the manager's
+    `ForkServer` if it has one (and ``command`` is not overridden), instead
+    of running ``DEFAULT_COMMAND``.
     """
 
     TYPE = "linux/min/wasmer"
@@ -30,6 +45,12 @@ class LinuxMinimal(RuntimeManager):
     DEFAULT_NAME = "linux-minimal-python"
     DEFAULT_SHORTNAME = "min"
     DEFAULT_COMMAND = "PYTHONPATH=. ./env/bin/python runtimes/linux_minimal.py"
+    SCRIPT: Optional[str] = "runtimes/linux_minimal.py"
+    TRANSPORT: type[Transport] = SLSocket
+    POLL_RECEIVE = False
+    MULTICAST = True
+    QUEUE_BYTES: int = 1 << 22
+    QUEUE_POLICY: str = "drop_newest"
 
     def __init__(
         self, rtid: Optional[str] = None, name: Optional[str] = None,
@@ -38,6 +59,7 @@ class LinuxMinimal(RuntimeManager):
     ) -> None:
         self.cpus = cpus
         self.command = self.DEFAULT_COMMAND if command is None else command
+        self.script = self.SCRIPT if command is None else None
         super().__init__(rtid, name, cfg=cfg)
 
     def start(self) -> dict:
@@ -45,22 +67,85 @@ class LinuxMinimal(RuntimeManager):
         if self.cpus is not None:
             linux.make_cgroup(self.cpus, self.DEFAULT_SHORTNAME)
 
-        self.socket = SLSocket(self.index, server=True, timeout=5.)
-        self.process = subprocess.Popen(
-            "{} {}".format(self.command, self.index), shell=True,
-            preexec_fn=os.setsid)
+        self.socket: Transport = self.TRANSPORT(
+            self.index, server=True, timeout=5.)
+        env = {"SL_TRANSPORT": self.TRANSPORT.NAME}
+        if self.script is not None and self.mgr.fork_server is not None:
+            self.pid, self.pidfd = self.mgr.fork_server.spawn(
+                self.script, [str(self.index)], env=env)
+        else:
+            self.pid = subprocess.Popen(
+                "{} {}".format(self.command, self.index), shell=True,
+                preexec_fn=os.setsid, env={**os.environ, **env}).pid
+            self.pidfd = os.pidfd_open(self.pid)
         self.socket.accept()
+        self.add_transport(self.socket)
+        self.outbox = self.make_outbox()
+        self.outbox.start(self.socket.write_many)
         return self.config
 
+    def make_outbox(self, module: int = -1) -> Outbox:
+        """Create send queue for the runtime or a module."""
+        name = self.name if module == -1 else "{}.{}".format(self.name, module)
+        return Outbox(
+            name=name, max_bytes=self.QUEUE_BYTES, policy=self.QUEUE_POLICY,
+            latency=self.mgr.channels.metrics.latency_for(self.index),
+            on_drop=self.__dropped)
+
+    def __dropped(self, msg: Message) -> None:
+        """Count message dropped by the outbox for each of its channels."""
+        if msg.h1 & Header.control:
+            if msg.h2 != Header.multicast:
+                return
+            msgs = msg.unmulticast()
+        else:
+            msgs = [msg]
+        for m in msgs:
+            self.mgr.channels.metrics.dropped(
+                self.index, m.h1, m.h2, len(m.payload))
+
+    def outbox_for(self, module: int) -> Outbox:
+        """Get the send queue used for messages to a module."""
+        return self.outbox
+
+    def open_channel(self, channel: Channel) -> None:
+        """Conflate channel in the outbox if requested."""
+        if channel.flags & Flags.conflate or channel.interval > 0:
+            self.outbox_for(channel.module).conflate(
+                channel.module, channel.fd, channel.interval / 1000)
+
+    def close_channel(self, channel: Channel) -> None:
+        """Stop conflating channel."""
+        self.outbox_for(channel.module).unconflate(channel.module, channel.fd)
+
     def stop(self) -> None:
         """Stop process."""
+        self.outbox.close()
+        self.remove_transport(self.socket)
         self.socket.close()
-        os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
+        # The pid may have been reaped (and reused) if the runtime already
+        # exited; the pidfd still refers to the original process.
+        try:
+            signal.pidfd_send_signal(self.pidfd, 0)
+            # Runtime processes lead their own session and process group.
+            os.killpg(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.log.debug("Runtime process has already exited.")
+        finally:
+            os.close(self.pidfd)
         linux.delete_cgroup(self.DEFAULT_SHORTNAME)
 
     def send(self, msg: Message) -> None:
         """Send message."""
-        self.socket.write(msg)
+        self.outbox.put(msg)
+
+    def send_many(self, msgs: list[Message]) -> None:
+        """Send messages; the writer sends everything queued at once."""
+        self.outbox.put_many(msgs)
+
+    def deliver(self, msgs: list[Message], received: float) -> None:
+        """Queue channel messages; latency is recorded when written."""
+        self.outbox.put_many(msgs, received=received)
 
     def receive(self) -> Optional[Message]:
         """Receive message."""
@@ -77,3 +162,6 @@ class LinuxMinimalWAMR(LinuxMinimal):
     DEFAULT_NAME = "linux-minimal-wamr"
     DEFAULT_SHORTNAME = "wamr"
     DEFAULT_COMMAND = "./runtimes/bin/linux-minimal-wamr"
+    SCRIPT = None
+    # Does not unpack multicast messages (channels are not supported).
+    MULTICAST = False
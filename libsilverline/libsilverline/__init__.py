@@ -1,23 +1,31 @@
 """Common routines for Silverline components."""
 
-from .logging import configure_log, format_message, console
-from .mqtt import MQTTClient, MQTTServer
+from .logging import (
+    configure_log, format_message, console, DeferredDecode, TRACE)
+from .mqtt import MQTTClient, MQTTServer, MQTTPool
+from .broker import MQTTBroker
 from .http import SilverlineClient
 from .types import Message, Header, Channel, Flags, State
 from .socket import SLSocket
+from .shm import SLSharedMemory
+from .transport import Transport, connect
 from .cluster import SilverlineCluster
-from .util import dict_or_load
+from .util import dict_or_load, hotpath
 
 __all__ = [
     "configure_log",
     "console",
     "format_message",
+    "DeferredDecode",
+    "TRACE",
     "MQTTClient",
     "MQTTServer",
+    "MQTTPool",
+    "MQTTBroker",
     "SilverlineClient",
     "ArgumentParser",
     "Message", "Header", "Channel", "Flags", "State",
-    "SLSocket",
+    "SLSocket", "SLSharedMemory", "Transport", "connect",
     "SilverlineCluster",
-    "dict_or_load"
+    "dict_or_load", "hotpath"
 ]
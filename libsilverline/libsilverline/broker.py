@@ -0,0 +1,419 @@
+"""Lightweight MQTT 3.1.1 broker stand-in."""
+
+import asyncio
+import logging
+import struct
+import threading
+import time
+from collections import deque
+
+from beartype.typing import Optional, NamedTuple
+from beartype import beartype
+
+from .mqtt import MQTTServer
+
+
+# Packet types
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = range(1, 8)
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = range(8, 12)
+PINGREQ, PINGRESP, DISCONNECT = range(12, 15)
+
+
+class _Will(NamedTuple):
+    topic: str
+    payload: bytes
+    qos: int
+    retain: bool
+
+
+def _packet(kind: int, body: bytes, flags: int = 0) -> bytes:
+    """Encode packet with fixed header."""
+    header = bytearray([(kind << 4) | flags])
+    n = len(body)
+    while True:
+        b, n = n % 128, n // 128
+        header.append(b | (0x80 if n > 0 else 0))
+        if n == 0:
+            break
+    return bytes(header) + body
+
+
+def _string(s: str) -> bytes:
+    data = s.encode('utf-8')
+    return struct.pack("!H", len(data)) + data
+
+
+def _read_string(body: bytes, i: int) -> tuple[bytes, int]:
+    n, = struct.unpack_from("!H", body, i)
+    return body[i + 2:i + 2 + n], i + 2 + n
+
+
+def _matches(pattern: str, topic: str) -> bool:
+    """Check if a topic matches a subscription filter."""
+    # Topics starting with `$` are not matched by leading wildcards.
+    if topic.startswith('$') and pattern[:1] in ('+', '#'):
+        return False
+    p, t = pattern.split('/'), topic.split('/')
+    for i, level in enumerate(p):
+        if level == '#':
+            return True
+        if i >= len(t) or (level != '+' and level != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+class _Session:
+    """Connected client."""
+
+    def __init__(
+        self, writer: asyncio.StreamWriter, client_id: str, no_local: bool,
+        will: Optional[_Will]
+    ) -> None:
+        self.writer = writer
+        self.client_id = client_id
+        self.no_local = no_local
+        self.will = will
+        self.subscriptions: dict[str, int] = {}
+        # QoS 2 messages received, but not yet released
+        self.received: set[bytes] = set()
+        self._pid = 0
+
+    def next_pid(self) -> int:
+        self._pid = self._pid % 0xffff + 1
+        return self._pid
+
+
+@beartype
+class MQTTBroker:
+    """In-process MQTT 3.1.1 broker for offline testing and benchmarking.
+
+    Supports what Silverline components (via paho) use: CONNECT (including
+    last will, and bridge mode, where clients do not receive their own
+    messages), SUBSCRIBE and UNSUBSCRIBE with ``+``/``#`` wildcards,
+    PUBLISH with QoS 0-2, retained messages, and keepalive pings. Sessions
+    are not persisted (every connection is a clean session), authentication
+    is not checked, and messages are not retried, since each client is a
+    single TCP connection which is dropped on error.
+
+    Throughput and latency are recorded for all messages: ``latency`` is
+    the time from when a PUBLISH is received to when it is written to each
+    subscriber.
+
+    For example, to run against a broker in a background thread::
+
+        broker = MQTTBroker(port=0).start()
+        mgr = Manager(runtimes, server=broker.server()).start()
+        ...
+        print(broker.stats())
+        broker.stop()
+
+    Parameters
+    ----------
+    host: address to listen on.
+    port: port to listen on; if 0, any free port is used (see ``port``
+        once started).
+    latency_samples: number of recent latency samples to keep.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 1883,
+        latency_samples: int = 100000
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.log = logging.getLogger("broker")
+
+        self.sessions: dict[str, _Session] = {}
+        self.retained: dict[str, tuple[bytes, int]] = {}
+        # Subscribers (and QoS) for each exact topic and each wildcard filter
+        self._exact: dict[str, dict[_Session, int]] = {}
+        self._wildcard: dict[str, dict[_Session, int]] = {}
+
+        self.received = [0, 0]
+        self.sent = [0, 0]
+        self.topics: dict[str, list[int]] = {}
+        self.latency: deque = deque(maxlen=latency_samples)
+        self._start = time.perf_counter()
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def server(self, realm: str = "realm") -> MQTTServer:
+        """Get connection information for clients (e.g. `MQTTClient`)."""
+        return MQTTServer(
+            host=self.host, port=self.port, user="cli", pwd="", ssl=False,
+            realm=realm)
+
+    async def serve(self) -> None:
+        """Start listening on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(
+            self.__handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._start = time.perf_counter()
+        self.log.info("Listening on {}:{}".format(self.host, self.port))
+
+    async def close(self) -> None:
+        """Stop listening and disconnect all clients."""
+        if self._server is not None:
+            self._server.close()
+            for session in list(self.sessions.values()):
+                session.writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def start(self) -> "MQTTBroker":
+        """Run broker in a background thread; blocks until listening."""
+        ready = threading.Event()
+
+        def _run():
+            async def _main():
+                await self.serve()
+                ready.set()
+                assert self._server is not None
+                try:
+                    await self._server.serve_forever()
+                except asyncio.CancelledError:
+                    pass
+
+            asyncio.run(_main())
+
+        self._thread = threading.Thread(target=_run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> "MQTTBroker":
+        """Stop broker started with `start`."""
+        if self._loop is not None and self._thread is not None:
+            asyncio.run_coroutine_threadsafe(
+                self.close(), self._loop).result()
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def stats(self) -> dict:
+        """Get message counts, throughput, and latency percentiles (us)."""
+        duration = time.perf_counter() - self._start
+        latency = sorted(self.latency)
+        res = {
+            "clients": len(self.sessions),
+            "received": self.received[0], "received_bytes": self.received[1],
+            "sent": self.sent[0], "sent_bytes": self.sent[1],
+            "duration": round(duration, 3),
+            "received/s": round(self.received[0] / duration, 1),
+            "sent/s": round(self.sent[0] / duration, 1),
+            "topics": {
+                k: {"messages": v[0], "bytes": v[1]}
+                for k, v in list(self.topics.items())}
+        }
+        if len(latency) > 0:
+            res["latency"] = {
+                "count": len(latency),
+                "mean_us": round(sum(latency) / len(latency) * 1e6, 1),
+                **{
+                    "p{}_us".format(p): round(
+                        latency[min(len(latency) - 1,
+                                    len(latency) * p // 100)] * 1e6, 1)
+                    for p in (50, 90, 99)},
+                "max_us": round(latency[-1] * 1e6, 1)}
+        return res
+
+    # --------------------------- Internal Methods -------------------------- #
+
+    async def __read(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[int, int, bytes]:
+        """Read packet; returns (type, flags, body)."""
+        header = (await reader.readexactly(1))[0]
+        n, shift = 0, 0
+        while True:
+            b = (await reader.readexactly(1))[0]
+            n |= (b & 0x7f) << shift
+            shift += 7
+            if not b & 0x80:
+                break
+        body = await reader.readexactly(n) if n > 0 else b""
+        return header >> 4, header & 0x0f, body
+
+    async def __handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Client connection."""
+        session = None
+        clean = False
+        try:
+            kind, _, body = await self.__read(reader)
+            if kind != CONNECT:
+                return
+            session = self.__connect(writer, body)
+            while True:
+                kind, flags, body = await self.__read(reader)
+                if kind == DISCONNECT:
+                    clean = True
+                    break
+                self.__dispatch(session, kind, flags, body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            self.log.error("Client error: {}".format(e))
+        finally:
+            if session is not None:
+                self.__disconnect(session, clean)
+            writer.close()
+
+    def __connect(
+        self, writer: asyncio.StreamWriter, body: bytes
+    ) -> _Session:
+        """Handle CONNECT."""
+        _, i = _read_string(body, 0)
+        level, flags = body[i], body[i + 1]
+        i += 4
+        client_id, i = _read_string(body, i)
+        will = None
+        if flags & 0x04:
+            topic, i = _read_string(body, i)
+            payload, i = _read_string(body, i)
+            will = _Will(
+                topic.decode('utf-8'), payload, (flags >> 3) & 0x03,
+                bool(flags & 0x20))
+
+        # Bridge mode is indicated by the top bit of the protocol level.
+        session = _Session(
+            writer, client_id.decode('utf-8'), bool(level & 0x80), will)
+        # A new connection with the same client ID replaces the old one.
+        previous = self.sessions.get(session.client_id)
+        if previous is not None:
+            self.__disconnect(previous, True)
+            previous.writer.close()
+        self.sessions[session.client_id] = session
+        writer.write(_packet(CONNACK, b"\x00\x00"))
+        return session
+
+    def __disconnect(self, session: _Session, clean: bool) -> None:
+        """Remove session, and publish its will if it did not disconnect."""
+        if self.sessions.get(session.client_id) is not session:
+            return
+        del self.sessions[session.client_id]
+        for f in session.subscriptions:
+            self.__unsubscribe(session, f)
+        if not clean and session.will is not None:
+            will = session.will
+            self.__publish(
+                None, will.topic, will.payload, will.qos, will.retain)
+
+    def __dispatch(
+        self, session: _Session, kind: int, flags: int, body: bytes
+    ) -> None:
+        """Handle packet from a connected client."""
+        if kind == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic, i = _read_string(body, 0)
+            pid = body[i:i + 2]
+            payload = body[i + 2:] if qos > 0 else body[i:]
+            if qos == 1:
+                session.writer.write(_packet(PUBACK, pid))
+            elif qos == 2:
+                session.writer.write(_packet(PUBREC, pid))
+                # Resent before being released; already delivered.
+                if pid in session.received:
+                    return
+                session.received.add(pid)
+            self.__publish(
+                session, topic.decode('utf-8'), payload, qos, bool(flags & 1))
+        elif kind == PUBREL:
+            session.received.discard(body[:2])
+            session.writer.write(_packet(PUBCOMP, body[:2]))
+        elif kind == PUBREC:
+            session.writer.write(_packet(PUBREL, body[:2], flags=0x02))
+        elif kind == SUBSCRIBE:
+            self.__subscribe(session, body)
+        elif kind == UNSUBSCRIBE:
+            i = 2
+            while i < len(body):
+                f, i = _read_string(body, i)
+                self.__unsubscribe(session, f.decode('utf-8'))
+                session.subscriptions.pop(f.decode('utf-8'), None)
+            session.writer.write(_packet(UNSUBACK, body[:2]))
+        elif kind == PINGREQ:
+            session.writer.write(_packet(PINGRESP, b""))
+        # PUBACK, PUBCOMP: nothing to do, since messages are not retried.
+
+    def __subscribe(self, session: _Session, body: bytes) -> None:
+        """Handle SUBSCRIBE, and send matching retained messages."""
+        granted = bytearray()
+        filters = []
+        i = 2
+        while i < len(body):
+            f, i = _read_string(body, i)
+            qos = min(body[i], 2)
+            i += 1
+            pattern = f.decode('utf-8')
+            session.subscriptions[pattern] = qos
+            table = self._wildcard if (
+                '+' in pattern or '#' in pattern) else self._exact
+            table.setdefault(pattern, {})[session] = qos
+            granted.append(qos)
+            filters.append((pattern, qos))
+        session.writer.write(_packet(SUBACK, body[:2] + bytes(granted)))
+
+        for topic, (payload, qos) in self.retained.items():
+            sub = max(
+                (q for f, q in filters if _matches(f, topic)), default=-1)
+            if sub >= 0:
+                self.__send(session, topic, payload, min(qos, sub), True)
+
+    def __unsubscribe(self, session: _Session, pattern: str) -> None:
+        table = self._wildcard if (
+            '+' in pattern or '#' in pattern) else self._exact
+        subscribers = table.get(pattern)
+        if subscribers is not None:
+            subscribers.pop(session, None)
+            if len(subscribers) == 0:
+                del table[pattern]
+
+    def __publish(
+        self, source: Optional[_Session], topic: str, payload: bytes,
+        qos: int, retain: bool
+    ) -> None:
+        """Deliver message to subscribers (at most once per client)."""
+        received = time.perf_counter()
+        self.received[0] += 1
+        self.received[1] += len(payload)
+        counters = self.topics.setdefault(topic, [0, 0])
+        counters[0] += 1
+        counters[1] += len(payload)
+
+        if retain:
+            if len(payload) == 0:
+                self.retained.pop(topic, None)
+            else:
+                self.retained[topic] = (payload, qos)
+
+        targets = dict(self._exact.get(topic, {}))
+        for pattern, subscribers in self._wildcard.items():
+            if _matches(pattern, topic):
+                for session, q in subscribers.items():
+                    if q > targets.get(session, -1):
+                        targets[session] = q
+
+        for session, q in targets.items():
+            if session is source and session.no_local:
+                continue
+            self.__send(session, topic, payload, min(qos, q), False)
+            self.latency.append(time.perf_counter() - received)
+
+    def __send(
+        self, session: _Session, topic: str, payload: bytes, qos: int,
+        retain: bool
+    ) -> None:
+        """Write PUBLISH to a client."""
+        body = _string(topic)
+        if qos > 0:
+            body += struct.pack("!H", session.next_pid())
+        session.writer.write(_packet(
+            PUBLISH, body + payload, flags=(qos << 1) | int(retain)))
+        self.sent[0] += 1
+        self.sent[1] += len(payload)
@@ -1,14 +1,22 @@
 """Standardized logging configuration."""
 
 import os
+import queue
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from rich.logging import RichHandler
 from rich.text import Text
 from rich.console import Console
 from rich.theme import Theme
 from datetime import datetime
 
-from beartype.typing import Optional, Any
+from beartype.typing import Optional, Any, Union
+
+
+#: Trace logging level (i.e. per-message logging); check
+#: ``log.isEnabledFor(TRACE)`` before formatting trace messages.
+TRACE = 5
 
 
 console = Console(theme=Theme({
@@ -32,13 +40,85 @@ class __CustomHandler(RichHandler):
         ).append(":" + record.name.ljust(8), style="bold white")
 
 
-def configure_log(log: Optional[str] = None, level: int = 20) -> None:
+class DeferredDecode:
+    """Log message which is only decoded when formatted.
+
+    Pass as the message to a logger (i.e. ``log.info(DeferredDecode(data))``)
+    so that decoding happens in the logging thread in queued mode, and only
+    if the message is actually emitted.
+    """
+
+    __slots__ = ("data", "encoding")
+
+    def __init__(
+        self, data: Union[bytes, memoryview], encoding: str = 'unicode-escape'
+    ) -> None:
+        self.data = data
+        self.encoding = encoding
+
+    def __str__(self) -> str:
+        return bytes(self.data).decode(self.encoding)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queue handler which passes records through without formatting.
+
+    The default `QueueHandler` formats each record before queueing it (so
+    that it can be pickled); since the queue never leaves this process,
+    formatting is deferred to the listener thread instead.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _BatchFileHandler(logging.FileHandler):
+    """File handler which only flushes when `flush_batch` is called."""
+
+    def flush(self) -> None:
+        pass
+
+    def flush_batch(self) -> None:
+        super().flush()
+
+    def close(self) -> None:
+        self.flush_batch()
+        super().close()
+
+
+class _BatchQueueListener(QueueListener):
+    """Queue listener which flushes files once the queue is drained."""
+
+    def __init__(
+        self, records: queue.SimpleQueue, *handlers: logging.Handler,
+        respect_handler_level: bool = False
+    ) -> None:
+        super().__init__(
+            records, *handlers, respect_handler_level=respect_handler_level)
+        self.records = records
+
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        if self.records.empty():
+            for handler in self.handlers:
+                if isinstance(handler, _BatchFileHandler):
+                    handler.flush_batch()
+
+
+def configure_log(
+    log: Optional[str] = None, level: int = 20, queued: bool = False
+) -> None:
     """Configure SilverLine logging.
 
     Parameters
     ----------
     log: File to save log to (if not None). Will save to `{log}-{date}.log`.
     verbose: Logging level to use (python convension; 0 is most verbose).
+    queued: Emit log records from a background thread: loggers only put
+        records on a queue, which is drained by a `QueueListener`; messages
+        are formatted (and decoded, for `DeferredDecode` messages) by the
+        listener, and the log file is flushed once per batch of records
+        instead of after every record.
     """
     if log is not None:
         os.makedirs(log, exist_ok=True)
@@ -47,7 +127,17 @@ def configure_log(log: Optional[str] = None, level: int = 20) -> None:
         __CustomHandler(console=console, rich_tracebacks=True)]
     if log is not None:
         date = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        handlers.append(logging.FileHandler("{}{}.log".format(log, date)))
+        path = "{}{}.log".format(log, date)
+        handlers.append(
+            _BatchFileHandler(path) if queued else logging.FileHandler(path))
+
+    if queued:
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        listener = _BatchQueueListener(
+            records, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        handlers = [_DeferredQueueHandler(records)]
 
     logging.addLevelName(logging.CRITICAL, 'CRI')
     logging.addLevelName(logging.ERROR, 'ERR')
@@ -5,13 +5,15 @@ import ssl
 import json
 import uuid
 import os
-from threading import Semaphore
+from threading import Semaphore, Lock
+from collections import deque
+from concurrent.futures import Future
 import argparse
 
 import paho.mqtt.client as mqtt
 
 from beartype import beartype
-from beartype.typing import NamedTuple, Optional, Union, cast
+from beartype.typing import Any, NamedTuple, Optional, Union, cast
 
 from .util import dict_or_load
 
@@ -86,30 +88,94 @@ class MQTTClient(mqtt.Client):
         if None.
     bridge: whether MQTT client should be in bridge mode (bridge mode: broker
         doesn't return messages sent by this client even if subscribed)
+    max_inflight: maximum number of QoS 1/2 messages which can be in flight
+        (sent, but not acknowledged) at once.
+    max_queued: maximum number of outgoing QoS 1/2 messages (in flight or
+        waiting to be put in flight); publishes are dropped if the queue is
+        full. If 0, the queue is unbounded. QoS 0 messages are always sent
+        immediately.
+
+    Requests to the orchestrator can be sent with `request`, which returns a
+    future for the response with the same ``object_id``; responses are
+    received on topics passed to `subscribe_responses`.
     """
 
     def __init__(
         self, client_id: str = "client", server: Optional[MQTTServer] = None,
-        bridge: bool = False
+        bridge: bool = False, max_inflight: int = 20, max_queued: int = 0
     ) -> None:
         super().__init__(client_id=client_id)
         self.__log = logging.getLogger('mq')
         self.client_id = client_id
         self.server = MQTTServer.from_config({}) if server is None else server
 
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.max_inflight_messages_set(max_inflight)
+        self.max_queued_messages_set(max_queued)
+        self.published = [0, 0, 0]
+        self.dropped = 0
+        # QoS 1/2 messages which have not been acknowledged yet.
+        self._pending: deque[mqtt.MQTTMessageInfo] = deque()
+        self._pending_lock = Lock()
+
+        self._requests: dict[str, Future] = {}
+        self._requests_lock = Lock()
+
         if bridge:
             self.enable_bridge_mode()
 
-    def start(self) -> "MQTTClient":
-        """Connect to MQTT server; blocks until connected."""
-        semaphore = Semaphore()
-        semaphore.acquire()
+    def publish(
+        self, topic: str, payload: Any = None, qos: int = 0,
+        retain: bool = False, properties: Any = None
+    ) -> mqtt.MQTTMessageInfo:
+        """Publish message, and update counters.
 
-        def _on_connect(mqttc, obj, flags, rc):
-            semaphore.release()
+        See ``paho.mqtt.client.Client.publish``; messages are dropped (with
+        ``rc=MQTT_ERR_QUEUE_SIZE``) if the outgoing queue is full. QoS 0
+        messages are also dropped if the client is not connected, while QoS
+        1/2 messages are kept, and sent once the client reconnects.
+        """
+        info = super().publish(
+            topic, payload=payload, qos=qos, retain=retain,
+            properties=properties)
+        if info.rc == mqtt.MQTT_ERR_SUCCESS:
+            self.published[qos] += 1
+            if qos > 0:
+                with self._pending_lock:
+                    self._pending.append(info)
+        elif info.rc == mqtt.MQTT_ERR_QUEUE_SIZE or qos == 0:
+            self.dropped += 1
+        return info
 
-        self.on_connect = _on_connect
+    def mqtt_stats(self) -> dict:
+        """Get publish counters, and in-flight / queued message counts.
+
+        Messages are assumed to be put in flight in the order they are
+        published, up to ``max_inflight`` at once; messages published while
+        disconnected are not counted.
+        """
+        with self._pending_lock:
+            while len(self._pending) > 0 and self._pending[0].is_published():
+                self._pending.popleft()
+            outgoing = sum(not info.is_published() for info in self._pending)
+        inflight = (
+            outgoing if self.max_inflight == 0
+            else min(outgoing, self.max_inflight))
+        return {
+            "published": sum(self.published),
+            "published_qos": list(self.published),
+            "dropped": self.dropped,
+            "inflight": inflight, "max_inflight": self.max_inflight,
+            "queued": outgoing - inflight, "max_queued": self.max_queued
+        }
+
+    def _connect(self) -> None:
+        """Set credentials and open the connection without starting a loop.
 
+        Network events must then be handled by `loop_start` or by an external
+        event loop (``loop_read``, ``loop_write``, and ``loop_misc``).
+        """
         self.__log.info("Connecting MQTT client: {}".format(self.client_id))
         self.__log.info("Server: {}:{} (ssl={})".format(
             self.server.host, self.server.port, self.server.ssl))
@@ -127,6 +193,17 @@ class MQTTClient(mqtt.Client):
             self.tls_set(cert_reqs=ssl.CERT_NONE)
         self.connect(self.server.host, self.server.port, 60)
 
+    def start(self) -> "MQTTClient":
+        """Connect to MQTT server; blocks until connected."""
+        semaphore = Semaphore()
+        semaphore.acquire()
+
+        def _on_connect(mqttc, obj, flags, rc):
+            semaphore.release()
+
+        self.on_connect = _on_connect
+        self._connect()
+
         # Waiting for on_connect to release
         self.loop_start()
         semaphore.acquire()
@@ -142,26 +219,145 @@ class MQTTClient(mqtt.Client):
         return self
 
     @staticmethod
-    def control_message(action: str, payload: dict) -> str:
+    def control_message(
+        action: str, payload: dict, object_id: Optional[str] = None
+    ) -> str:
         """Format control message to the orchestrator."""
         return json.dumps({
-            "object_id": str(uuid.uuid4()),
+            "object_id": str(uuid.uuid4()) if object_id is None else object_id,
             "action": action,
             "type": "req",
             "data": payload
         })
 
+    def subscribe_responses(self, *topics: str) -> None:
+        """Subscribe to topics which responses to `request` are sent on.
+
+        All topics are subscribed to with a single SUBSCRIBE, and stay
+        subscribed until disconnecting.
+        """
+        for topic in topics:
+            self.message_callback_add(topic, self.__on_response)
+        if len(topics) > 0:
+            self.subscribe([(topic, 0) for topic in topics])
+
+    def request(
+        self, topic: str, action: str, payload: dict, qos: int = 0
+    ) -> Future:
+        """Send control message, and get a future for its response.
+
+        The future's result is the (JSON-decoded) response; cancel the future
+        to stop waiting for a response (i.e. after a timeout).
+        """
+        object_id = str(uuid.uuid4())
+        future: Future = Future()
+        with self._requests_lock:
+            self._requests[object_id] = future
+        future.add_done_callback(lambda _: self.__forget(object_id))
+        self.publish(
+            topic, self.control_message(action, payload, object_id), qos=qos)
+        return future
+
+    def __forget(self, object_id: str) -> None:
+        with self._requests_lock:
+            self._requests.pop(object_id, None)
+
+    def __on_response(self, client, userdata, msg) -> None:
+        """Resolve the pending request matching a response."""
+        try:
+            payload = json.loads(msg.payload)
+            if payload.get("type") != "resp":
+                return
+            with self._requests_lock:
+                future = self._requests.get(payload.get("object_id"))
+        except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+            return
+        if future is not None and future.set_running_or_notify_cancel():
+            future.set_result(payload)
+
     def control_topic(self, *topic: str) -> str:
         """Format control topic in the form ``{realm}/proc/{...}``."""
         return "{}/proc/{}".format(self.server.realm, "/".join(topic))
 
+    def handle_command(self, command: str) -> None:
+        """Handle command entered on stdin; overwrite to add commands."""
+        pass
+
     def run_until_stop(self) -> None:
         """Wait for KeyboardInterrupt or `q`/`quit` to trigger exit."""
         try:
             while True:
-                if input() in {'q', 'quit', 'exit'}:
+                command = input().strip()
+                if command in {'q', 'quit', 'exit'}:
                     break
+                self.handle_command(command)
         except KeyboardInterrupt:
             print("  Exiting due to KeyboardInterrupt.\n")
 
         self.stop()
+
+
+@beartype
+class MQTTPool:
+    """Pool of MQTT connections for publishing, sharded by topic.
+
+    Each topic is always published through the same connection (chosen by
+    hashing the topic), so messages on a topic stay in order; different
+    topics are sent (and, for QoS 1/2, acknowledged) on separate TCP
+    connections and network threads, so a large or slow message only delays
+    other messages on its own connection.
+
+    The connections only publish, and never subscribe to anything; note
+    that the broker only suppresses messages published by a client to its
+    own subscriptions, so topics the caller is subscribed to should not be
+    published through the pool.
+
+    Parameters
+    ----------
+    client_id: client ID prefix; connection ``i`` uses ``{client_id}.{i}``.
+    server: MQTT broker information.
+    size: number of connections.
+    max_inflight, max_queued: limits for each connection (see `MQTTClient`).
+    """
+
+    def __init__(
+        self, client_id: str = "client", server: Optional[MQTTServer] = None,
+        size: int = 2, max_inflight: int = 20, max_queued: int = 0
+    ) -> None:
+        self.clients = [
+            MQTTClient(
+                client_id="{}.{}".format(client_id, i), server=server,
+                max_inflight=max_inflight, max_queued=max_queued)
+            for i in range(size)]
+
+    def client(self, topic: str) -> MQTTClient:
+        """Get the connection a topic is published through."""
+        return self.clients[hash(topic) % len(self.clients)]
+
+    def publish(
+        self, topic: str, payload: Any = None, qos: int = 0,
+        retain: bool = False
+    ) -> mqtt.MQTTMessageInfo:
+        """Publish message through the topic's connection."""
+        return self.client(topic).publish(
+            topic, payload=payload, qos=qos, retain=retain)
+
+    def start(self) -> "MQTTPool":
+        """Connect all connections; blocks until connected."""
+        for client in self.clients:
+            client.start()
+        return self
+
+    def stop(self) -> "MQTTPool":
+        """Disconnect all connections."""
+        for client in self.clients:
+            client.stop()
+        return self
+
+    def mqtt_stats(self) -> dict:
+        """Get total publish counters, and statistics for each connection."""
+        connections = [client.mqtt_stats() for client in self.clients]
+        return {
+            "published": sum(c["published"] for c in connections),
+            "dropped": sum(c["dropped"] for c in connections),
+            "connections": connections}
@@ -0,0 +1,348 @@
+"""Shared memory ring buffer transport."""
+
+import os
+import mmap
+import select
+import socket
+import struct
+import threading
+
+from beartype.typing import Optional
+
+from .types import Message
+from .socket import HEADER_FMT as _HEADER_FMT
+from .util import hotpath
+
+
+_RING_HEADER = 192
+_HEAD = 0
+_TAIL = 64
+_WAITING = 128
+_PAD = 0xffffffff
+_POLL_INTERVAL = 0.01
+
+
+def _eventfd() -> int:
+    return os.eventfd(  # type: ignore[attr-defined]
+        0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)  # type: ignore[attr-defined]
+
+
+def _eventfd_read(fd: int) -> int:
+    return os.eventfd_read(fd)  # type: ignore[attr-defined]
+
+
+def _eventfd_write(fd: int, value: int = 1) -> None:
+    os.eventfd_write(fd, value)  # type: ignore[attr-defined]
+
+
+@hotpath
+class SLSharedMemory:
+    """Silverline shared memory transport.
+
+    Each connection consists of a ``/dev/shm`` file holding two
+    single-producer/single-consumer ring buffers (manager -> runtime, and
+    runtime -> manager)::
+
+        [ring 0 header][ ring 0 data ][ring 1 header][ ring 1 data ]
+
+    Each ring header has a consumer position (``head``), producer position
+    (``tail``), and a flag set by the producer when waiting for space, each on
+    their own cache line. Frames use the `SLSocket` v2 protocol (there are
+    no shared memory clients which predate it), padded to 8 bytes; frames
+    never wrap around the end of the ring (a ``0xffffffff`` length marks
+    padding to the end of the ring instead).
+
+    Each ring has a data eventfd (signalled by the producer after advancing
+    ``tail``) and a space eventfd (signalled by the consumer if the producer
+    is waiting). The server binds the same AF_UNIX address as `SLSocket`;
+    `accept` sends the shared memory path and eventfds to the client over
+    this socket, which is then kept open only to detect disconnection;
+    `fileno` is an epoll instance watching both the data eventfd and this
+    socket, so event loops are also woken up when the peer hangs up.
+
+    Parameters
+    ----------
+    runtime: runtime index
+    module: module index on this runtime.
+    server: whether this is the server (manager) or client (runtime) side.
+    timeout: connect, receive timeout in seconds.
+    base_path: socket base path.
+    shm_path: shared memory file base path.
+    capacity: size of each ring in bytes; messages larger than half of this
+        cannot be sent.
+    retries: maximum number of timeouts to wait for space before a write is
+        dropped.
+    """
+
+    NAME: str = "shm"
+    HEADER_FMT = _HEADER_FMT[2]
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+
+    def __init__(
+        self, runtime: int, module: int = -1, server: bool = True,
+        timeout: float = 5., base_path: str = "/tmp/sl",
+        shm_path: str = "/dev/shm", capacity: int = 1 << 22,
+        retries: int = 10
+    ) -> None:
+        self.timeout = timeout
+        self.server = server
+        self.retries = retries
+        self.closed = False
+        self._rlock = threading.Lock()
+        self._wlock = threading.Lock()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+
+        if module == -1:
+            name = "{:02x}".format(runtime)
+        else:
+            name = "{:02x}.{:02x}".format(runtime, module)
+        address = "{}/{}.s".format(base_path, name)
+
+        if server:
+            self.path = "{}/sl.{}".format(shm_path, name)
+            self.capacity = capacity - capacity % 8
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.ftruncate(fd, 2 * (_RING_HEADER + self.capacity))
+            self.efds = [_eventfd() for _ in range(4)]
+
+            if os.path.exists(address):
+                os.remove(address)
+            os.makedirs(os.path.dirname(address), exist_ok=True)
+            self.socket.bind(address)
+            self.socket.listen(1)
+        else:
+            self.socket.connect(address)
+            self.connection = self.socket
+            msg, self.efds, _, _ = socket.recv_fds(self.connection, 4096, 4)
+            self.capacity, = struct.unpack_from("I", msg)
+            self.path = msg[4:].decode('utf-8')
+            fd = os.open(self.path, os.O_RDWR)
+
+        self.mem = mmap.mmap(fd, 2 * (_RING_HEADER + self.capacity))
+        os.close(fd)
+
+        # Server writes to ring 0 and reads from ring 1; client the reverse.
+        ring_out, ring_in = (0, 1) if server else (1, 0)
+        self._out = ring_out * (_RING_HEADER + self.capacity)
+        self._in = ring_in * (_RING_HEADER + self.capacity)
+        self._out_ready, self._out_space = self.efds[2 * ring_out:][:2]
+        self._in_ready, self._in_space = self.efds[2 * ring_in:][:2]
+
+        self._rhead = self._load(self._in + _HEAD)
+        self._rlimit = self._rhead
+        self._wtail = self._load(self._out + _TAIL)
+        self._wpublished = self._wtail
+
+        self._epoll = select.epoll()
+        self._epoll.register(self._in_ready, select.EPOLLIN)
+        if not server:
+            self._epoll.register(self.connection, select.EPOLLIN)
+
+    def _load(self, offset: int) -> int:
+        return struct.unpack_from("Q", self.mem, offset)[0]
+
+    def _store(self, offset: int, value: int) -> None:
+        struct.pack_into("Q", self.mem, offset, value)
+
+    def accept(self) -> None:
+        """Accept connection and send the shared memory handles."""
+        self.connection, _ = self.socket.accept()
+        self.connection.settimeout(self.timeout)
+        socket.send_fds(
+            self.connection,
+            [struct.pack("I", self.capacity) + self.path.encode('utf-8')],
+            self.efds)
+        self._epoll.register(self.connection, select.EPOLLIN)
+
+    def fileno(self) -> int:
+        """File descriptor which is readable on new data or on hangup."""
+        return self._epoll.fileno()
+
+    def _hungup(self) -> bool:
+        """Check (without waiting) whether the peer closed its socket."""
+        try:
+            return self.connection.recv(
+                1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+        except (BlockingIOError, TimeoutError):
+            return False
+        except OSError:
+            return True
+
+    def _wait(self, efd: int, timeout: float) -> bool:
+        """Wait for eventfd; returns False on timeout, close, or hangup."""
+        if self.closed:
+            return False
+        try:
+            _eventfd_read(efd)
+            return True
+        except BlockingIOError:
+            pass
+
+        poll = select.poll()
+        poll.register(efd, select.POLLIN)
+        poll.register(self.connection, select.POLLIN)
+        events = dict(poll.poll(timeout * 1000))
+        if self.closed or self.connection.fileno() in events:
+            return False
+        if efd not in events:
+            return False
+        try:
+            _eventfd_read(efd)
+        except BlockingIOError:
+            pass
+        return True
+
+    def _get(self) -> Optional[Message]:
+        """Pop the next frame published by the producer, if any."""
+        while self._rhead < self._rlimit:
+            offset = self._in + _RING_HEADER + self._rhead % self.capacity
+            # Padding may be shorter than a frame header.
+            if struct.unpack_from("I", self.mem, offset)[0] == _PAD:
+                self._rhead += self.capacity - self._rhead % self.capacity
+                continue
+            payloadlen, h1, h2, flags = struct.unpack_from(
+                self.HEADER_FMT, self.mem, offset)
+
+            start = offset + self.HEADER_SIZE
+            payload = self.mem[start:start + payloadlen]
+            self._rhead += -(-(self.HEADER_SIZE + payloadlen) // 8) * 8
+            self._store(self._in + _HEAD, self._rhead)
+            if self._load(self._in + _WAITING):
+                self._store(self._in + _WAITING, 0)
+                _eventfd_write(self._in_space)
+            return Message(h1, h2, payload, flags)
+        return None
+
+    def read(self) -> Optional[Message]:
+        """Read with timeout.
+
+        Returns None if the timeout expires before a message is available,
+        or if the connection has been closed.
+        """
+        with self._rlock:
+            if self.closed:
+                return None
+            while True:
+                msg = self._get()
+                if msg is not None:
+                    return msg
+                # Frames published before a hangup are still drained.
+                ready = self._wait(self._in_ready, self.timeout)
+                if self.closed:
+                    return None
+                self._rlimit = self._load(self._in + _TAIL)
+                if not ready and self._rhead == self._rlimit:
+                    return None
+
+    def read_many(self) -> Optional[list[Message]]:
+        """Read all available messages without waiting.
+
+        Intended to be called when `fileno` is readable (i.e. from an event
+        loop). Returns None if the transport has been closed, or if the peer
+        has hung up and all messages it sent have been read.
+        """
+        with self._rlock:
+            if self.closed:
+                return None
+            try:
+                _eventfd_read(self._in_ready)
+            except BlockingIOError:
+                pass
+            self._rlimit = self._load(self._in + _TAIL)
+
+            msgs = []
+            while (msg := self._get()) is not None:
+                msgs.append(msg)
+            if len(msgs) == 0 and self._hungup():
+                return None
+            return msgs
+
+    def _publish(self) -> None:
+        """Make written frames visible to the consumer and signal it."""
+        if self._wtail != self._wpublished:
+            self._store(self._out + _TAIL, self._wtail)
+            self._wpublished = self._wtail
+            _eventfd_write(self._out_ready)
+
+    def _reserve(self, size: int) -> None:
+        """Wait until ``size`` bytes are free in the outbound ring."""
+        waited = 0.
+        while self.capacity - (
+                self._wtail - self._load(self._out + _HEAD)) < size:
+            self._publish()
+            self._store(self._out + _WAITING, 1)
+            if waited >= self.timeout * self.retries or self.closed:
+                raise TimeoutError
+            self._wait(self._out_space, _POLL_INTERVAL)
+            waited += _POLL_INTERVAL
+
+    def _put(self, msg: Message) -> None:
+        """Write a frame to the outbound ring without publishing it."""
+        payloadlen = len(msg.payload)
+        size = -(-(self.HEADER_SIZE + payloadlen) // 8) * 8
+        if size > self.capacity // 2:
+            raise ValueError(
+                "Message of {} bytes exceeds ring capacity ({}).".format(
+                    payloadlen, self.capacity))
+
+        remaining = self.capacity - self._wtail % self.capacity
+        pad = remaining if remaining < size else 0
+        self._reserve(pad + size)
+
+        if pad > 0:
+            struct.pack_into(
+                "I", self.mem,
+                self._out + _RING_HEADER + self._wtail % self.capacity, _PAD)
+            self._wtail += pad
+
+        offset = self._out + _RING_HEADER + self._wtail % self.capacity
+        struct.pack_into(
+            self.HEADER_FMT, self.mem, offset, payloadlen, msg.h1, msg.h2,
+            msg.flags)
+        start = offset + self.HEADER_SIZE
+        self.mem[start:start + payloadlen] = msg.payload
+        self._wtail += size
+
+    def write(self, msg: Message) -> None:
+        """Send message."""
+        self.write_many([msg])
+
+    def write_many(self, msgs: list[Message]) -> int:
+        """Send messages, signalling the consumer once for the whole batch.
+
+        Returns the number of messages written; the rest were not sent since
+        waiting for space in the ring timed out.
+        """
+        with self._wlock:
+            if self.closed:
+                return 0
+            written = 0
+            try:
+                for msg in msgs:
+                    self._put(msg)
+                    written += 1
+            except TimeoutError:
+                pass
+            finally:
+                self._publish()
+            return written
+
+    def close(self) -> None:
+        """Close transport (and interrupt currently reading operations)."""
+        if self.closed:
+            return
+        self.closed = True
+        _eventfd_write(self._in_ready)
+        if hasattr(self, "connection"):
+            self.connection.close()
+        self.socket.close()
+        if self.server and os.path.exists(self.path):
+            os.remove(self.path)
+        # Wait for readers and writers (which return promptly once closed)
+        # before releasing the eventfds and mapping they use.
+        with self._rlock, self._wlock:
+            self._epoll.close()
+            for efd in self.efds:
+                os.close(efd)
+            self.mem.close()
@@ -1,28 +1,47 @@
 """Socket helper code."""
 
 import os
+import bisect
 import socket
 import struct
+import threading
 
-from beartype.typing import Optional
-from beartype import beartype
+from beartype.typing import Optional, Union
 
-from .types import Message
+from .types import Message, Header
+from .util import hotpath
 
 
-_HEADER_FMT = "IBB"
+HEADER_FMT = {1: "IBB", 2: "IHHBx"}
+PROTOCOL_VERSION = 2
+_IOV_MAX = 1024
+_V1_CONTROL = 0x80
+_V1_INDEX = 0x7f
 
 
-@beartype
+@hotpath
 class SLSocket:
     """Silverline local socket.
 
-    Sockets use the following protocol::
+    Sockets use the following protocol (v1)::
 
         [ -- len:4 -- ][h1:1][h2:1][ ------ payload:len ------ ]
 
-    See the documentation of `manager.types.Message` for header values.
-    Empty payloads are also supported.
+    or, if negotiated by the client (v2)::
+
+        [ -- len:4 -- ][ h1:2 ][ h2:2 ][flags:1][-:1][ -- payload:len -- ]
+
+    See the documentation of `Header` for header values and version
+    negotiation. Empty payloads are also supported.
+
+    Outgoing headers and payloads are sent with scatter-gather ``sendmsg``
+    calls; use `write_many` to coalesce several messages into one call.
+
+    Incoming data is received with ``recv_into`` into a preallocated buffer,
+    so a single syscall can yield many frames. Payloads of received messages
+    are read-only ``memoryview`` slices of this buffer; the buffer is only
+    reused (compacted in place) once no payloads refer to it anymore, and a
+    fresh buffer is allocated otherwise.
 
     Parameters
     ----------
@@ -31,17 +50,19 @@ class SLSocket:
     server: whether this socket is a server or client socket.
     timeout: connect, receive timeout in seconds.
     base_path: socket base path.
-    chunk_size: size of chunks to read from the socket.
+    chunk_size: size of the receive buffer; frames larger than this are
+        received into a buffer of their own size.
     retries: maximum number of times to try sending data if send fails.
+    version: protocol version requested by a client socket on connect; set
+        to 1 to connect to servers which do not support negotiation.
     """
 
-    HEADER_FMT = _HEADER_FMT
-    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    NAME: str = "socket"
 
     def __init__(
         self, runtime: int, module: int = -1, server: bool = True,
-        timeout: float = 5., base_path="/tmp/sl", chunk_size: int = 4096,
-        retries: int = 10
+        timeout: float = 5., base_path="/tmp/sl", chunk_size: int = 65536,
+        retries: int = 10, version: int = PROTOCOL_VERSION
     ) -> None:
         self.timeout = timeout
         self.server = server
@@ -50,6 +71,14 @@ class SLSocket:
         self.chunk_size = chunk_size
         self.retries = retries
 
+        self._buf = bytearray(chunk_size)
+        self._view = memoryview(self._buf)
+        self._head = 0
+        self._tail = 0
+        self._wlock = threading.Lock()
+        self._wversion = 1
+        self._set_read_version(1)
+
         if module == -1:
             address = "{}/{:02x}.s".format(base_path, runtime)
         else:
@@ -65,45 +94,210 @@ class SLSocket:
             self.socket.connect(address)
             self.connection = self.socket
             self.connection.settimeout(self.timeout)
+            if version != 1:
+                self._hello(version)
 
     def accept(self) -> None:
         """Accept connection."""
         self.connection, _ = self.socket.accept()
         self.connection.settimeout(self.timeout)
 
+    @property
+    def version(self) -> int:
+        """Protocol version currently used for writing."""
+        return self._wversion
+
+    def _set_read_version(self, version: int) -> None:
+        if version not in HEADER_FMT:
+            raise ValueError(
+                "Unsupported protocol version: {}".format(version))
+        self._rversion = version
+        self._rheader = struct.Struct(HEADER_FMT[version])
+
+    def _hello(self, version: int) -> None:
+        """Send version negotiation message, then switch write version."""
+        msg = Message(Header.control, Header.hello, bytes([version]))
+        with self._wlock:
+            header = self._pack(msg)
+            if self._send([header, msg.payload]) < len(header) + 1:
+                raise TimeoutError
+            self._wversion = version
+
+    def _pack(self, msg: Message) -> bytes:
+        """Pack frame header for the current write version."""
+        if self._wversion == 2:
+            return struct.pack(
+                HEADER_FMT[2], len(msg.payload), msg.h1, msg.h2, msg.flags)
+
+        index = msg.h1 & Header.index_bits
+        if index > _V1_INDEX or msg.h2 > 0xff:
+            raise ValueError(
+                "Header ({:x}, {:x}) exceeds protocol v1 limits.".format(
+                    msg.h1, msg.h2))
+        h1 = index | (_V1_CONTROL if msg.h1 & Header.control else 0)
+        return struct.pack(HEADER_FMT[1], len(msg.payload), h1, msg.h2)
+
+    def _frame_size(self) -> int:
+        """Size of the (possibly incomplete) frame at the buffer head."""
+        if self._tail - self._head < self._rheader.size:
+            return self._rheader.size
+        payloadlen, = struct.unpack_from("I", self._buf, self._head)
+        return self._rheader.size + payloadlen
+
+    def _parse(self) -> Optional[Message]:
+        """Pop the next complete frame from the buffer, if any.
+
+        Version negotiation messages are handled here, and not returned.
+        """
+        while True:
+            size = self._frame_size()
+            if self._head + size > self._tail:
+                return None
+
+            if self._rversion == 2:
+                _, h1, h2, flags = self._rheader.unpack_from(
+                    self._buf, self._head)
+            else:
+                _, h1, h2 = self._rheader.unpack_from(self._buf, self._head)
+                flags = 0
+                h1 = (h1 & _V1_INDEX) | (
+                    Header.control if h1 & _V1_CONTROL else 0)
+            start = self._head + self._rheader.size
+            self._head += size
+
+            if h1 == Header.control and h2 == Header.hello:
+                version = self._buf[start]
+                self._set_read_version(version)
+                if self._wversion != version:
+                    self._hello(version)
+                continue
+            return Message(
+                h1, h2, self._view[start:self._head].toreadonly(), flags)
+
+    def _reserve(self, size: int) -> None:
+        """Ensure the buffer can hold a frame of ``size`` bytes at the head."""
+        if self._head + size <= len(self._buf):
+            return
+
+        pending = self._tail - self._head
+        self._view.release()
+        try:
+            # Resizing fails if any payload views are still alive.
+            self._buf.append(0)
+            del self._buf[-1]
+            reusable = size <= len(self._buf)
+        except BufferError:
+            reusable = False
+
+        if reusable:
+            self._buf[:pending] = self._buf[self._head:self._tail]
+        else:
+            buf = bytearray(max(self.chunk_size, size))
+            buf[:pending] = self._buf[self._head:self._tail]
+            self._buf = buf
+        self._view = memoryview(self._buf)
+        self._head = 0
+        self._tail = pending
+
     def read(self) -> Optional[Message]:
-        """Read with timeout."""
+        """Read with timeout.
+
+        Returns None if the timeout expires before a full message is
+        available, or if the connection has been closed.
+        """
+        while True:
+            msg = self._parse()
+            if msg is not None:
+                return msg
+
+            self._reserve(self._frame_size())
+            try:
+                received = self.connection.recv_into(self._view[self._tail:])
+            except TimeoutError:
+                return None
+            if received == 0:
+                return None
+            self._tail += received
+
+    def read_many(self) -> Optional[list[Message]]:
+        """Read all available messages without waiting.
+
+        Intended to be called when the socket is readable (i.e. from an event
+        loop). Returns None if the connection has been closed.
+        """
+        msgs = []
+        while (msg := self._parse()) is not None:
+            msgs.append(msg)
+
+        self._reserve(self._frame_size())
         try:
-            recv = self.connection.recv(self.HEADER_SIZE)
-            if len(recv) == self.HEADER_SIZE:
-                payloadlen, h1, h2 = struct.unpack(self.HEADER_FMT, recv)
-                payload = []
-                while payloadlen > 0:
-                    size = min(payloadlen, self.chunk_size)
-                    payload.append(self.connection.recv(size))
-                    payloadlen -= size
-                return Message(h1, h2, b"".join(payload))
-            return None
-        except TimeoutError:
-            return None
-
-    def _send(self, packet):
+            received = self.connection.recv_into(
+                self._view[self._tail:], 0, socket.MSG_DONTWAIT)
+        except (BlockingIOError, TimeoutError):
+            return msgs
+        if received == 0:
+            return msgs if len(msgs) > 0 else None
+        self._tail += received
+
+        while (msg := self._parse()) is not None:
+            msgs.append(msg)
+        return msgs
+
+    def fileno(self) -> int:
+        """File descriptor of the connection, for use with selectors."""
+        return self.connection.fileno()
+
+    @staticmethod
+    def _consume(
+        buffers: list[Union[bytes, memoryview]], sent: int
+    ) -> list[Union[bytes, memoryview]]:
+        """Drop the first ``sent`` bytes from a list of buffers."""
+        for i, buf in enumerate(buffers):
+            if sent < len(buf):
+                return [memoryview(buf)[sent:]] + buffers[i + 1:]
+            sent -= len(buf)
+        return []
+
+    def _send(self, buffers: list[Union[bytes, memoryview]]) -> int:
+        """Send buffers; returns the number of bytes sent before timing out."""
+        total = 0
         for _ in range(self.retries):
             try:
-                return self.connection.sendall(packet)
+                while len(buffers) > 0:
+                    sent = self.connection.sendmsg(buffers[:_IOV_MAX])
+                    buffers = self._consume(buffers, sent)
+                    total += sent
+                return total
             except TimeoutError:
                 pass
-        raise TimeoutError
+        return total
 
     def write(self, msg: Message) -> None:
         """Send message to socket."""
-        header = struct.pack(self.HEADER_FMT, len(msg.payload), msg.h1, msg.h2)
-        try:
-            self._send(header)
-            if len(msg.payload) > 0:
-                self._send(msg.payload)
-        except TimeoutError:
-            pass
+        self.write_many([msg])
+
+    def write_many(self, msgs: list[Message]) -> int:
+        """Send messages to socket using as few syscalls as possible.
+
+        Headers and payloads of all messages are gathered into a single
+        ``sendmsg`` call (split only if the ``IOV_MAX`` limit is reached).
+
+        Returns the number of messages which were sent in full; the rest
+        were not sent (or only partially) since the send timed out.
+        """
+        with self._wlock:
+            buffers: list[Union[bytes, memoryview]] = []
+            ends = []
+            size = 0
+            for msg in msgs:
+                header = self._pack(msg)
+                buffers.append(header)
+                if len(msg.payload) > 0:
+                    buffers.append(msg.payload)
+                size += len(header) + len(msg.payload)
+                ends.append(size)
+            sent = self._send(buffers)
+        return bisect.bisect_right(ends, sent)
 
     def close(self) -> None:
         """Close socket (and interrupt currently reading operations)."""
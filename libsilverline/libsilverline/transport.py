@@ -0,0 +1,29 @@
+"""Manager <-> runtime transport selection."""
+
+import os
+
+from beartype.typing import Union
+from beartype import beartype
+
+from .socket import SLSocket
+from .shm import SLSharedMemory
+
+
+Transport = Union[SLSocket, SLSharedMemory]
+
+TRANSPORTS: dict = {
+    SLSocket.NAME: SLSocket,
+    SLSharedMemory.NAME: SLSharedMemory
+}
+
+
+@beartype
+def connect(runtime: int, module: int = -1, **kwargs) -> Transport:
+    """Connect to the manager from a runtime.
+
+    The transport is chosen by the manager, which passes its name to the
+    runtime process in the ``SL_TRANSPORT`` environment variable (defaults
+    to ``socket`` if not set).
+    """
+    transport = TRANSPORTS[os.environ.get("SL_TRANSPORT", SLSocket.NAME)]
+    return transport(runtime, module=module, server=False, **kwargs)
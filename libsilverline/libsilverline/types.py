@@ -1,11 +1,13 @@
 """SilverLine Runtime Manager Messaging and Types."""
 
 import json
-from beartype.typing import NamedTuple
+import struct
+from beartype.typing import NamedTuple, Optional, Union
 from beartype import beartype
+from .util import hotpath
 
 
-@beartype
+@hotpath
 class Message(NamedTuple):
     """Runtime-manager messaging.
 
@@ -18,12 +20,17 @@ class Message(NamedTuple):
     ----------
     h1: first header value.
     h2: second header value.
-    payload: message contents.
+    payload: message contents. Messages read from a `SLSocket` carry a
+        read-only ``memoryview`` into the socket's receive buffer; use
+        ``bytes(msg.payload)`` where an owned copy is required.
+    flags: frame flags (see `Header`); only sent with protocol v2, and
+        always 0 for messages received over protocol v1.
     """
 
     h1: int
     h2: int
-    payload: bytes
+    payload: Union[bytes, memoryview]
+    flags: int = 0
 
     @classmethod
     def from_str(cls, h1: int, h2: int, payload: str):
@@ -36,15 +43,121 @@ class Message(NamedTuple):
         return cls(
             h1=h1, h2=h2, payload=bytes(json.dumps(payload), encoding='utf-8'))
 
+    @classmethod
+    def from_batch(cls, msgs: list["Message"], h1: Optional[int] = None):
+        """Create batch message containing several messages.
+
+        Each message is encoded using the v2 frame format (regardless of the
+        protocol version of the connection)::
+
+            [ -- len:4 -- ][ h1:2 ][ h2:2 ][flags:1][-:1][ -- payload:len -- ]
+
+        Parameters
+        ----------
+        msgs: messages to send.
+        h1: header value for the batch message itself; defaults to a
+            runtime-level control message (index 0).
+        """
+        chunks: list[Union[bytes, memoryview]] = []
+        for msg in msgs:
+            chunks.append(_BATCH_HEADER.pack(
+                len(msg.payload), msg.h1, msg.h2, msg.flags))
+            chunks.append(msg.payload)
+        return cls(
+            h1=Header.control if h1 is None else h1, h2=Header.batch,
+            payload=b"".join(chunks))
+
+    def unbatch(self) -> list["Message"]:
+        """Decode messages contained in a batch message.
+
+        Payloads are ``memoryview`` slices of this message's payload.
+        """
+        view = memoryview(self.payload)
+        msgs = []
+        offset = 0
+        while offset < len(view):
+            payloadlen, h1, h2, flags = _BATCH_HEADER.unpack_from(
+                view, offset)
+            start = offset + _BATCH_HEADER.size
+            offset = start + payloadlen
+            if offset > len(view):
+                raise ValueError("Truncated message in batch.")
+            msgs.append(Message(h1, h2, view[start:offset], flags))
+        return msgs
+
+    @classmethod
+    def from_multicast(
+        cls, targets: list[tuple[int, int]],
+        payload: Union[bytes, memoryview]
+    ):
+        """Create multicast message delivering one payload to many channels.
+
+        The payload is sent once, after a list of targets::
+
+            [ n:2 ][ module:2 ][ fd:2 ] ... (n targets) ... [ -- payload -- ]
+
+        Parameters
+        ----------
+        targets: (module index, channel index) for each destination.
+        payload: message payload.
+        """
+        header = bytearray(2 + _MULTICAST_TARGET.size * len(targets))
+        struct.pack_into("H", header, 0, len(targets))
+        for i, (module, fd) in enumerate(targets):
+            _MULTICAST_TARGET.pack_into(
+                header, 2 + i * _MULTICAST_TARGET.size, module, fd)
+        return cls(
+            h1=Header.control, h2=Header.multicast,
+            payload=bytes(header) + payload)
+
+    def unmulticast(self) -> list["Message"]:
+        """Decode the messages (one per target) in a multicast message.
+
+        Payloads are the same ``memoryview`` slice of this message's payload.
+        """
+        view = memoryview(self.payload)
+        n, = struct.unpack_from("H", view, 0)
+        start = 2 + _MULTICAST_TARGET.size * n
+        if start > len(view):
+            raise ValueError("Truncated multicast target list.")
+        payload = view[start:]
+        return [
+            Message(module, fd, payload) for module, fd in
+            _MULTICAST_TARGET.iter_unpack(view[2:start])]
+
+
+_BATCH_HEADER = struct.Struct("IHHBx")
+_MULTICAST_TARGET = struct.Struct("HH")
+
 
 class Header:
-    """Header enum with header byte values.
+    """Header enum with header values.
+
+    ``h1`` holds the control bit and a 15-bit module index, and ``h2`` the
+    control message type or a 16-bit channel index. Protocol v1 frames only
+    have a byte for each (7-bit module index, 8-bit channel index), and are
+    translated to and from these values by the transport; protocol v2 frames
+    carry both as 16-bit values, as well as a flags byte.
+
+    The ``hello`` control message negotiates the protocol version: clients
+    send ``Message(control, hello, [version])`` using v1 framing right after
+    connecting, and then write using that version; the server replies with
+    the same message (also using v1 framing) and switches over. Clients which
+    never send ``hello`` (i.e. older runtimes) stay on v1.
 
-    Change these values and upgrade the underlying connection if larger
-    header values are required, i.e. to support >128 modules or >256 channels.
+    The ``batch`` control message carries several messages in its payload
+    (see `Message.from_batch`), which are handled as if sent individually.
+    The ``multicast`` control message (manager to runtime only) carries a
+    single channel message payload for several (module, channel) targets
+    (see `Message.from_multicast`); it is only sent to runtimes which set
+    ``MULTICAST`` (see `RuntimeManager`).
 
-    Uprading module index assignment (``ModuleLookup.free_index``) not to use
-    brute force search is also likely required.
+    Frame flags:
+    - ``wide``: channel indices in the payload of open/close channel
+      messages are 16-bit (little endian) instead of 8-bit.
+    - ``interval``: the open channel message has a minimum delivery interval
+      (ms, 16-bit little endian) after the channel flags; the channel is
+      conflated, and receives at most one message per interval.
     """
 
     keepalive   = 0x00
@@ -54,13 +167,19 @@ class Header:
     ch_close    = 0x04
     log_module  = 0x05
     profile     = 0x06
+    hello       = 0x07
+    batch       = 0x08
+    multicast   = 0x09
 
     create      = 0x00
     delete      = 0x01
     stop        = 0x02
 
-    control     = 0x80
-    index_bits  = 0x7f
+    control     = 0x8000
+    index_bits  = 0x7fff
+
+    wide        = 0x01
+    interval    = 0x02
 
 
 @beartype
@@ -73,7 +192,8 @@ class Channel(NamedTuple):
     module: Module index for this runtime.
     fd: Channel index for this module.
     topic: Topic name.
-    flags: Read, write, or read-write.
+    flags: Read, write, or read-write (see `Flags`).
+    interval: Minimum delivery interval (ms) for conflated channels.
     """
 
     runtime: int
@@ -81,6 +201,7 @@ class Channel(NamedTuple):
     fd: int
     topic: str
     flags: int
+    interval: int = 0
 
 
 class Flags:
@@ -90,7 +211,11 @@ class Flags:
     Notably, if the write bit is set, the channel topic cannot contain
     wildcards.
 
-    Higher bits can be saved for other features (such as MQTT QoS).
+    Higher bits can be saved for other features (such as MQTT QoS). If the
+    local bit is set, the channel is only connected to other channels on the
+    same manager, and messages never go through the MQTT broker. If the
+    conflate bit is set, only the latest pending message is delivered to the
+    channel (i.e. if the module reads slower than messages arrive).
     """
 
     read      = 0b0001
@@ -101,6 +226,14 @@ class Flags:
     qos1      = 0b0100
     qos2      = 0b1000
 
+    local     = 0b10000
+    conflate  = 0b100000
+
+    @staticmethod
+    def qos(flags: int) -> int:
+        """Get MQTT QoS level from channel flags."""
+        return min((flags >> 2) & 0b11, 2)
+
 
 class State:
     """Silverline entity state enum.
@@ -1,8 +1,27 @@
 """Miscellaneous utilities."""
 
+import os
 import json
 
-from beartype.typing import Union
+from beartype import beartype
+from beartype.typing import Union, TypeVar, cast
+
+
+#: Production mode; set ``SL_PRODUCTION=1`` (before importing silverline
+#: modules) to skip runtime type checking on hot-path classes.
+PRODUCTION = os.environ.get("SL_PRODUCTION", "0") not in {"", "0"}
+
+T = TypeVar("T", bound=type)
+
+
+def hotpath(obj: T) -> T:
+    """`beartype` decorator for classes used on the message hot path.
+
+    In production mode (``SL_PRODUCTION=1``), the class is returned as-is,
+    i.e. without any runtime type checking; otherwise, equivalent to
+    ``@beartype``.
+    """
+    return obj if PRODUCTION else cast(T, beartype(obj))
 
 
 def dict_or_load(cfg: Union[str, dict]) -> dict:
@@ -2,6 +2,14 @@
 
 from .manager import Manager
 from .runtime import RuntimeManager
+from .aio import AsyncManager, AsyncRuntimeManager
+from .outbox import Outbox
+from .dispatch import Dispatcher
+from .metrics import ChannelMetrics, Histogram
+from .forkserver import ForkServer
 from . import linux
 
-__all__ = ["Manager", "RuntimeManager", "linux"]
+__all__ = [
+    "Manager", "RuntimeManager", "AsyncManager", "AsyncRuntimeManager",
+    "Outbox", "Dispatcher", "ChannelMetrics", "Histogram", "ForkServer",
+    "linux"]
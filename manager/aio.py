@@ -0,0 +1,366 @@
+"""Asyncio runtime interface and node manager."""
+
+import sys
+import asyncio
+from concurrent.futures import Future
+
+from beartype.typing import Optional, Any, Callable
+from beartype import beartype
+
+from libsilverline import format_message, Message, Header, TRACE, hotpath
+
+from .manager import Manager
+from .runtime import RuntimeManager
+from . import exceptions
+
+
+@hotpath
+class AsyncRuntimeManager(RuntimeManager):
+    """Asyncio runtime interface layer.
+
+    Like `RuntimeManager`, except that `start`, `stop`, `send`, `receive`,
+    `create_module`, and `delete_module` are coroutines, which run on the
+    `AsyncManager` event loop and should never block.
+
+    Control messages are queued and handled in order by a per-runtime task,
+    so a slow `create_module` does not block the MQTT client. Messages passed
+    to `send_many` (i.e. channel messages) are likewise queued and sent in
+    order by a per-runtime sender task. If ``POLL_RECEIVE`` is set, a third
+    task awaits `receive` in a loop.
+
+    Must be used with `AsyncManager`.
+    """
+
+    async def start(self) -> dict:  # type: ignore[override]
+        """Start runtime, and return the registration config."""
+        return {}
+
+    async def stop(self) -> None:  # type: ignore[override]
+        """Stop runtime."""
+        pass
+
+    async def send(self, msg: Message) -> None:  # type: ignore[override]
+        """Send message to runtime."""
+        pass
+
+    def send_many(self, msgs: list[Message]) -> None:
+        """Queue messages to be sent to the runtime by the sender task.
+
+        May be called from any thread.
+        """
+        self.mgr._call_soon(self._outbox.put_nowait, msgs)
+
+    async def receive(  # type: ignore[override]
+        self
+    ) -> Optional[Message]:
+        """Wait for a message from the runtime; return None on timeout."""
+        await asyncio.sleep(self.mgr.timeout)
+        return None
+
+    async def create_module(  # type: ignore[override]
+        self, data: dict
+    ) -> None:
+        """Create module; overwrite this method to add additional steps.
+
+        Parameters
+        ----------
+        data: module create message payload; is sent on as a JSON. See
+            documentation for field structure.
+        """
+        index = self.modules.insert(data)
+        data["index"] = index
+        await self.send(Message.from_dict(
+            Header.control | index, Header.create, data))
+        self.log.info(format_message(
+            "Created module: {}".format(data['uuid']), self.index, index))
+
+    async def delete_module(  # type: ignore[override]
+        self, module_id: str
+    ) -> None:
+        """Delete module; overwrite this method to add additional steps."""
+        try:
+            index = self.modules.get(module_id).index
+        except KeyError:
+            raise exceptions.ModuleException(
+                "Tried to delete nonexisting module: {}".format(module_id))
+        await self.send(
+            Message(Header.control | index, Header.delete, bytes()))
+        self.log.info(format_message("Deleted module.", self.index, index))
+
+    # --------------------------- Internal Methods -------------------------- #
+
+    async def __control_loop(self) -> None:
+        """Handle queued control messages in order."""
+        while True:
+            data = await self._control.get()
+            try:
+                action, module = self._parse_control_message(data)
+                if action == "create":
+                    await self.create_module(module)
+                else:
+                    await self.delete_module(module["uuid"])
+            except Exception as e:
+                exceptions.handle_error(e, self.log, self.index)
+
+    async def __send_loop(self) -> None:
+        """Send queued messages in order."""
+        while True:
+            msgs = await self._outbox.get()
+            for msg in msgs:
+                try:
+                    await self.send(msg)
+                except Exception as e:
+                    exceptions.handle_error(
+                        e, self.log, self.index, msg.h1, msg.h2)
+
+    async def __receive_loop(self) -> None:
+        """Dispatch messages returned by `receive`."""
+        trace = self.log.isEnabledFor(TRACE)
+        while not self.done:
+            msg = await self.receive()
+            if msg is not None:
+                if trace:
+                    self.log.log(TRACE, format_message(
+                        "Received message.", self.index, msg.h1, msg.h2))
+                self.on_runtime_message(msg)
+        self.log.debug(format_message("Exiting main loop.", self.index))
+
+    def on_mqtt_message(self, client, userdata, msg) -> None:
+        """External message callback; queues the message for handling."""
+        self.mgr._call_soon(self._control.put_nowait, msg.payload)
+
+    def _start(self, mgr, index: int) -> Future:
+        """Runtimes must be started using `_start_async`."""
+        raise exceptions.UnhandledSLException(
+            "AsyncRuntimeManager requires an AsyncManager.")
+
+    async def _start_async(self, mgr: "AsyncManager", index: int) -> Future:
+        """Start runtime, and send its registration request."""
+        self.index = index
+        self.mgr = mgr
+        self._control: asyncio.Queue = asyncio.Queue()
+        self._outbox: asyncio.Queue = asyncio.Queue()
+
+        topic = self.control_topic("control")
+        self.mgr.subscribe(topic)
+        self.mgr.message_callback_add(topic, self.on_mqtt_message)
+
+        metadata = await self.start()
+        metadata["parent"] = self.mgr.uuid
+        return self.mgr.request(self.control_topic("reg"), "create", metadata)
+
+    def _start_done(self) -> None:
+        """Start runtime tasks after registration."""
+        self.tasks = [
+            asyncio.create_task(self.__control_loop()),
+            asyncio.create_task(self.__send_loop())]
+        if self.POLL_RECEIVE:
+            self.tasks.append(asyncio.create_task(self.__receive_loop()))
+        self.log.info("Registered: {}:{} (x{:02x})".format(
+            self.name, self.rtid, self.index))
+
+    async def _stop_async(self) -> None:
+        """Full runtime stop procedure."""
+        await self.stop()
+        self.done = True
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+@beartype
+class AsyncManager(Manager):
+    """Silverline node manager using an asyncio event loop.
+
+    The MQTT client socket is driven by the event loop (using
+    ``loop.add_reader``/``add_writer``) instead of a paho network thread, and
+    runtime transports registered with `add_reader` are watched by the same
+    loop. MQTT callbacks, transport callbacks, and `AsyncRuntimeManager`
+    tasks all run on the event loop thread.
+
+    Synchronous `RuntimeManager` runtimes are still supported; their
+    (blocking) start and stop procedures are run in a worker thread.
+
+    Use `start_async` and `stop_async` from inside a running event loop, or
+    `start` / `run_until_stop` / `stop` to have the manager run its own loop.
+    Takes the same parameters as `Manager`.
+    """
+
+    _MISC_INTERVAL = 1.
+
+    def _in_loop(self) -> bool:
+        """Whether the caller is running on the manager's event loop."""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _call_soon(self, func: Callable, *args: Any) -> None:
+        """Call function on the event loop thread without waiting."""
+        if self._in_loop():
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _call(self, func: Callable, *args: Any) -> Any:
+        """Call function on the event loop thread and wait for the result."""
+        if self._in_loop():
+            return func(*args)
+
+        async def _wrapped():
+            return func(*args)
+
+        future = asyncio.run_coroutine_threadsafe(_wrapped(), self._loop)
+        return future.result()
+
+    def add_reader(self, fileobj: Any, callback: Callable[[], None]) -> None:
+        """Watch file object (or descriptor) in the manager event loop.
+
+        May be called from any thread; ``callback`` is always called from the
+        event loop thread.
+        """
+        self._call(self._loop.add_reader, fileobj, self._dispatch, callback)
+
+    def remove_reader(self, fileobj: Any) -> None:
+        """Stop watching file object; does nothing if not registered."""
+        def _remove():
+            try:
+                self._loop.remove_reader(fileobj)
+            except (KeyError, ValueError):
+                pass
+
+        self._call(_remove)
+
+    def __attach(self) -> None:
+        """Route paho socket events to the event loop."""
+        def _on_socket_open(client, userdata, sock):
+            self._call(self._loop.add_reader, sock, self.loop_read)
+
+        def _on_socket_close(client, userdata, sock):
+            self._call(self._loop.remove_reader, sock)
+
+        def _on_socket_register_write(client, userdata, sock):
+            self._call(self._loop.add_writer, sock, self.loop_write)
+
+        def _on_socket_unregister_write(client, userdata, sock):
+            self._call(self._loop.remove_writer, sock)
+
+        self.on_socket_open = _on_socket_open
+        self.on_socket_close = _on_socket_close
+        self.on_socket_register_write = _on_socket_register_write
+        self.on_socket_unregister_write = _on_socket_unregister_write
+
+    async def __misc_loop(self) -> None:
+        """Periodic MQTT housekeeping (keepalive pings, retries)."""
+        while True:
+            self.loop_misc()
+            await asyncio.sleep(self._MISC_INTERVAL)
+
+    async def start_async(self) -> "AsyncManager":
+        """Connect manager and start runtimes on the running event loop."""
+        self._print_banner()
+        self._loop = asyncio.get_running_loop()
+        if self.fork_server is not None:
+            self.fork_server.start()
+
+        connected = self._loop.create_future()
+
+        def _on_connect(mqttc, obj, flags, rc):
+            self._call_soon(
+                lambda: connected.done() or connected.set_result(rc))
+
+        self.on_connect = _on_connect
+        self.__attach()
+        self.dispatcher.start()
+        self.will_set(
+            self.control_topic("reg", self.uuid), qos=2,
+            payload=self.control_message("delete", self.metadata))
+        self._connect()
+        self._misc = asyncio.create_task(self.__misc_loop())
+        await connected
+        self.log.info("Connected to MQTT server.")
+        if self.pool is not None:
+            await asyncio.to_thread(self.pool.start)
+
+        self.log.info("Registering manager...")
+        self.subscribe_responses(*self._registration_topics())
+        await asyncio.to_thread(
+            self._wait_registered, self._register_manager())
+        self.log.info("Manager registered.")
+        self.channels.start()
+
+        self.log.info("Registering {} runtimes.".format(len(self.runtimes)))
+        requests = {}
+        for i, rt in enumerate(self.runtimes):
+            if isinstance(rt, AsyncRuntimeManager):
+                future = await rt._start_async(self, i)
+            else:
+                future = await asyncio.to_thread(rt._start, self, i)
+            requests[self.control_topic("reg", rt.rtid)] = future
+        await asyncio.to_thread(self._wait_registered, requests)
+        for rt in self.runtimes:
+            rt._start_done()
+
+        self.log.info("Initialization complete.")
+        print()  # empty line after initialization
+
+        return self
+
+    async def stop_async(self) -> "AsyncManager":
+        """Stop runtimes and disconnect manager."""
+        self.log.info("Stopping runtimes...")
+        await asyncio.to_thread(self.dispatcher.close)
+        for rt in self.runtimes:
+            if isinstance(rt, AsyncRuntimeManager):
+                await rt._stop_async()
+            else:
+                await asyncio.to_thread(rt._stop)
+        if self.fork_server is not None:
+            await asyncio.to_thread(self.fork_server.close)
+
+        self.channels.stop()
+        self.publish(
+            self.control_topic("reg", self.uuid),
+            self.control_message("delete", self.metadata), qos=2)
+        if self.pool is not None:
+            await asyncio.to_thread(self.pool.stop)
+        self.disconnect()
+        self._misc.cancel()
+        await asyncio.gather(self._misc, return_exceptions=True)
+        self.log.info("Manager and runtime(s) stopped.")
+
+        return self
+
+    def start(self) -> "AsyncManager":
+        """Create an event loop, and connect manager using it."""
+        self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.start_async())
+
+    def stop(self) -> "AsyncManager":
+        """Stop manager, and close the event loop created by `start`."""
+        self._loop.run_until_complete(self.stop_async())
+        self._loop.close()
+        return self
+
+    async def __wait_for_exit(self) -> None:
+        """Wait for `q`/`quit` (or end of input) on stdin."""
+        lines: asyncio.Queue = asyncio.Queue()
+        self._loop.add_reader(
+            sys.stdin, lambda: lines.put_nowait(sys.stdin.readline()))
+        try:
+            while True:
+                line = await lines.get()
+                if line == '' or line.strip() in {'q', 'quit', 'exit'}:
+                    break
+                self.handle_command(line.strip())
+        finally:
+            self._loop.remove_reader(sys.stdin)
+
+    def run_until_stop(self) -> None:
+        """Run event loop until KeyboardInterrupt or `q`/`quit`."""
+        try:
+            self._loop.run_until_complete(self.__wait_for_exit())
+        except KeyboardInterrupt:
+            print("  Exiting due to KeyboardInterrupt.\n")
+
+        self.stop()
@@ -1,37 +1,98 @@
 """Channels interface."""
 
 import logging
-import paho.mqtt.client as mqtt
-from beartype import beartype
+import time
+from beartype.typing import Union
 
-from libsilverline import format_message, Message, Flags, Channel
+from libsilverline import (
+    format_message, Message, Header, Flags, Channel, hotpath)
 from . import exceptions
+from .routing import RoutingIndex
+from .interest import InterestRegistry
+from .metrics import ChannelMetrics
+from .subscriptions import SubscriptionBatcher
 
 
-@beartype
+@hotpath
 class ChannelManager:
     """Channel manager.
 
     Attributes
     ----------
-    matcher: mqtt.MQTTMatcher
-        Dictionary-like object that fetches sets of subscribed channels for a
-        topic string.
+    routes: RoutingIndex
+        Index of subscribed channels, with cached matches for each topic.
     channels: dict
         Channel lookup table with runtime, module, and fd levels.
+    subscriptions: SubscriptionBatcher
+        Number of (non-local) channels subscribed to each topic filter, and
+        the MQTT QoS of each (the highest QoS of its channels); changes are
+        sent to the broker in batches.
+    interest: InterestRegistry
+        Topics subscribed to by other managers.
+    metrics: ChannelMetrics
+        Traffic counters and delivery latency.
+
+    If the manager has a publish pool (``mgr.pool``; see `MQTTPool`), channel
+    messages are published through it, except on topics which this manager
+    is itself subscribed to on the broker; these stay on the manager's
+    connection, which the broker does not echo messages back to. Each topic
+    is assigned a connection when its first writer is opened (see
+    `SubscriptionBatcher.pin`).
+
+    Parameters
+    ----------
+    mgr: parent manager.
+    local_fastpath: only publish channel messages to the broker if another
+        manager has subscribed to the topic; otherwise, messages are only
+        delivered to channels on this manager. Note that this excludes any
+        subscribers which are not managers, and managers which do not also
+        use the fast path.
+    subscribe_delay, subscribe_linger, subscribe_collapse: subscription
+        batching delay, time to keep unused topics subscribed, and number of
+        sibling topics to collapse into a wildcard (see `SubscriptionBatcher`).
     """
 
-    def __init__(self, mgr):
+    def __init__(
+        self, mgr, local_fastpath: bool = False,
+        subscribe_delay: float = 0.02, subscribe_linger: float = 0.,
+        subscribe_collapse: int = 0
+    ) -> None:
 
         self.mgr = mgr
         self.log = logging.getLogger("ch")
-        self.matcher = mqtt.MQTTMatcher()
-        self.channels = {}
+        self.routes = RoutingIndex()
+        self.channels: dict[int, dict[int, dict[int, Channel]]] = {}
+        self.local_fastpath = local_fastpath
+        self.interest = InterestRegistry(mgr, track=local_fastpath)
+        self.subscriptions = SubscriptionBatcher(
+            mgr, self.interest, delay=subscribe_delay,
+            linger=subscribe_linger, collapse=subscribe_collapse)
+        self.metrics = ChannelMetrics()
+
+    def start(self) -> None:
+        """Start tracking remote interest; call once connected."""
+        self.interest.start()
+
+    def stop(self) -> None:
+        """Clear remote interest; call before disconnecting."""
+        self.subscriptions.stop()
+        self.interest.stop()
 
     def open(
-        self, runtime: int, module: int, fd: int, topic: bytes, flags: int
+        self, runtime: int, module: int, fd: int, topic: bytes, flags: int,
+        interval: int = 0
     ) -> None:
-        """Open channel."""
+        """Open channel.
+
+        Parameters
+        ----------
+        runtime: runtime index.
+        module: module index on this runtime.
+        fd: channel index on this module.
+        topic: topic name; may start with ``$SL/``.
+        flags: channel flags (see `Flags`).
+        interval: minimum delivery interval (ms) for conflated channels.
+        """
         if runtime not in self.channels:
             self.channels[runtime] = {}
         if module not in self.channels[runtime]:
@@ -57,19 +118,20 @@ class ChannelManager:
 
         ch = Channel(
             runtime=runtime, module=module, fd=fd, topic=topic_str,
-            flags=flags)
+            flags=flags, interval=interval)
 
-        # Requires subscribing
-        if (flags | Flags.read) != 0:
-            try:
-                self.matcher[topic_str].add(ch)
-            except KeyError:
-                self.mgr.subscribe(topic_str)
-                self.matcher[topic_str] = {ch}
+        # Requires subscribing (local channels are only used for loopback)
+        if flags & Flags.read:
+            self.routes.add(ch)
+            if not flags & Flags.local:
+                self.subscriptions.add(topic_str, Flags.qos(flags))
+        if flags & Flags.write and not flags & Flags.local:
+            self.subscriptions.pin(topic_str)
 
         self.log.debug("Opened channel: {} (flags=x{:02x})".format(
             topic.decode('utf-8'), flags))
         self.channels[runtime][module][fd] = ch
+        self.mgr.runtimes[runtime].open_channel(ch)
 
     def close(self, runtime: int, module: int, fd: int) -> None:
         """Close channel.
@@ -87,14 +149,15 @@ class ChannelManager:
                 "Tried to close nonexisting channel.")
 
         del self.channels[runtime][module][fd]
+        self.mgr.runtimes[runtime].close_channel(channel)
+        self.metrics.remove(runtime, module, fd)
 
-        if channel.flags | Flags.read:
-            subscribed = self.matcher[channel.topic]
-            if channel in subscribed:
-                subscribed.remove(channel)
-            if len(subscribed) == 0:
-                self.mgr.unsubscribe(channel.topic)
-                del self.matcher[channel.topic]
+        if channel.flags & Flags.read:
+            self.routes.remove(channel)
+            if not channel.flags & Flags.local:
+                self.subscriptions.remove(channel.topic)
+        if channel.flags & Flags.write and not channel.flags & Flags.local:
+            self.subscriptions.unpin(channel.topic)
 
     def cleanup(self, runtime: int, module: int) -> None:
         """Cleanup all channels associated with a module.
@@ -114,7 +177,9 @@ class ChannelManager:
             pass
 
     def publish(
-            self, runtime: int, module: int, fd: int, payload: bytes) -> None:
+        self, runtime: int, module: int, fd: int,
+        payload: Union[bytes, memoryview]
+    ) -> None:
         """Publish message.
 
         Parameters
@@ -122,7 +187,8 @@ class ChannelManager:
         runtime: Runtime index.
         module: Module index on this runtime.
         fd: Channel index on this module.
-        payload: Message payload.
+        payload: Message payload; loopback delivery forwards ``memoryview``
+            payloads without copying.
         """
         try:
             ch = self.channels[runtime][module][fd]
@@ -130,16 +196,32 @@ class ChannelManager:
             raise exceptions.ChannelException(
                 "Tried to publish to nonexisting channel.")
 
-        self.log.debug(format_message(
-            "Publishing message: {}:{:02b}".format(ch.topic, ch.flags),
-            runtime, module, fd))
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(format_message(
+                "Publishing message: {}:{:02b}".format(ch.topic, ch.flags),
+                runtime, module, fd))
+        self.metrics.published(ch, len(payload))
 
         # Loopback
         self.handle_message(ch.topic, payload, rt=runtime, mod=module)
-        # MQTT
-        self.mgr.publish(ch.topic, payload)
+        # MQTT, unless there cannot be any remote subscribers
+        if ch.flags & Flags.local:
+            return
+        if self.local_fastpath and not self.interest.has_interest(ch.topic):
+            return
+        if (
+            self.mgr.pool is not None
+            and self.subscriptions.pooled.get(ch.topic, False)
+        ):
+            self.mgr.pool.publish(
+                ch.topic, bytes(payload), qos=Flags.qos(ch.flags))
+        else:
+            self.mgr.publish(
+                ch.topic, bytes(payload), qos=Flags.qos(ch.flags))
 
-    def handle_message(self, topic: str, payload: bytes, rt=-1, mod=-1):
+    def handle_message(
+        self, topic: str, payload: Union[bytes, memoryview], rt=-1, mod=-1
+    ) -> None:
         """Handle MQTT message.
 
         Parameters
@@ -147,15 +229,81 @@ class ChannelManager:
         topic, payload: message contents.
         rt, mod: runtime and module indices to exclude for loopback.
         """
-        matched = False
-        for topic_matches in self.matcher.iter_match(topic):
-            for ch in topic_matches:
-                matched = True
-                if ch.runtime != rt and ch.module != mod:
+        received = time.perf_counter()
+        size = len(payload)
+        matched = self.routes.match(topic)
+        self.metrics.received(topic, size, len(matched) > 0)
+
+        debug = self.log.isEnabledFor(logging.DEBUG)
+        batches: dict[int, list[Message]] = {}
+        multicast: dict[int, list[tuple[int, int]]] = {}
+        for ch in matched:
+            if ch.runtime != rt and ch.module != mod:
+                if debug:
                     self.log.debug("Matched to channel: {}".format(ch))
-                    self.mgr.runtimes[ch.runtime].send(
+                self.metrics.delivered(ch, size)
+                # Conflated channels are sent individually so that the
+                # runtime's send queue can replace pending messages.
+                if (
+                    self.mgr.runtimes[ch.runtime].MULTICAST
+                    and not ch.flags & Flags.conflate and ch.interval == 0
+                ):
+                    multicast.setdefault(ch.runtime, []).append(
+                        (ch.module, ch.fd))
+                else:
+                    batches.setdefault(ch.runtime, []).append(
                         Message(ch.module, ch.fd, payload))
 
-        if not matched:
+        for runtime, targets in multicast.items():
+            if len(targets) == 1:
+                msg = Message(*targets[0], payload)
+            else:
+                msg = Message.from_multicast(targets, payload)
+            batches.setdefault(runtime, []).append(msg)
+
+        for runtime, msgs in batches.items():
+            modules = self.mgr.runtimes[runtime].modules
+            self.mgr.dispatcher.submit(
+                runtime, self.__deliver, runtime, msgs, modules.generation,
+                received)
+
+        # Expected for loopback, or if subscriptions are collapsed or linger
+        # after closing.
+        if len(matched) == 0 and rt == -1 and not self.subscriptions.lossy:
             raise exceptions.ChannelException(
                 "Handling message without any matches.")
+
+    def __deliver(
+        self, runtime: int, msgs: list[Message], generation: int,
+        received: float
+    ) -> None:
+        """Deliver messages matched when modules were at ``generation``.
+
+        Messages for modules which exited (or whose index was reused by a new
+        module) while the messages were queued are dropped.
+        """
+        rt = self.mgr.runtimes[runtime]
+        if rt.modules.generation != generation:
+            msgs = self.__current(rt.modules, msgs, generation)
+            if len(msgs) == 0:
+                return
+        rt.deliver(msgs, received)
+
+    @staticmethod
+    def __current(modules, msgs: list[Message], generation: int) -> list:
+        """Remove targets which are stale since ``generation``."""
+        res = []
+        for msg in msgs:
+            if msg.h1 & Header.control == 0:
+                if not modules.stale(msg.h1, generation):
+                    res.append(msg)
+                continue
+            targets = [
+                m for m in msg.unmulticast()
+                if not modules.stale(m.h1, generation)]
+            if len(targets) == 1:
+                res.append(targets[0])
+            elif len(targets) > 1:
+                res.append(Message.from_multicast(
+                    [(m.h1, m.h2) for m in targets], targets[0].payload))
+        return res
@@ -0,0 +1,120 @@
+"""Channel message dispatch worker pool."""
+
+import logging
+import threading
+from collections import deque
+
+from beartype.typing import Callable, Any
+
+from libsilverline import hotpath
+from . import exceptions
+
+
+@hotpath
+class Dispatcher:
+    """Worker pool with ordered per-key work queues.
+
+    Work submitted with the same key (i.e. runtime index) is run in order,
+    and never concurrently; work for different keys runs in parallel on up
+    to ``workers`` threads. This lets the MQTT network thread hand off
+    delivery to runtimes instead of writing to them directly, so a slow
+    runtime does not delay MQTT keepalives or other runtimes.
+
+    If ``workers`` is 0, work is run immediately by the caller.
+
+    Parameters
+    ----------
+    name: name for logging.
+    workers: number of worker threads.
+    """
+
+    def __init__(self, name: str = "dispatch", workers: int = 2) -> None:
+        self.log = logging.getLogger(name)
+        self.workers = workers
+
+        self.submitted = 0
+        self.completed = 0
+        self.max_depth: dict[Any, int] = {}
+
+        self._queues: dict[Any, deque] = {}
+        self._ready: deque = deque()
+        self._active: set = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        """Start worker threads."""
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self.__loop, name="{}.{}".format(self.log.name, i),
+                daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self) -> None:
+        """Stop worker threads; pending work is discarded."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def depth(self) -> dict:
+        """Number of pending work items for each key."""
+        with self._cond:
+            return {k: len(v) for k, v in self._queues.items() if len(v) > 0}
+
+    def stats(self) -> dict:
+        """Get dispatch counters and queue depths."""
+        return {
+            "submitted": self.submitted, "completed": self.completed,
+            "depth": self.depth(), "max_depth": dict(self.max_depth)}
+
+    def submit(self, key: Any, func: Callable, *args: Any) -> None:
+        """Run ``func(*args)`` after all previously submitted work for key."""
+        if self.workers == 0:
+            self.submitted += 1
+            self.__run(key, func, args)
+            self.completed += 1
+            return
+
+        with self._cond:
+            queue = self._queues.setdefault(key, deque())
+            queue.append((func, args))
+            self.submitted += 1
+            if len(queue) > self.max_depth.get(key, 0):
+                self.max_depth[key] = len(queue)
+            if key not in self._active and len(queue) == 1:
+                self._ready.append(key)
+                self._cond.notify()
+
+    def __run(self, key: Any, func: Callable, args: tuple) -> None:
+        try:
+            func(*args)
+        except Exception as e:
+            exceptions.handle_error(e, self.log, key)
+
+    def __loop(self) -> None:
+        """Worker thread; runs all pending work for one key at a time."""
+        while True:
+            with self._cond:
+                while len(self._ready) == 0 and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                key = self._ready.popleft()
+                self._active.add(key)
+                work = list(self._queues[key])
+                self._queues[key].clear()
+
+            for func, args in work:
+                self.__run(key, func, args)
+
+            with self._cond:
+                self.completed += len(work)
+                self._active.discard(key)
+                if len(self._queues[key]) > 0:
+                    self._ready.append(key)
+                    self._cond.notify()
@@ -0,0 +1,188 @@
+"""Pre-forked runtime process server.
+
+Python runtimes (``runtimes/linux_minimal.py``, ``runtimes/linux_benchmarking*
+.py``, ...) spend most of their startup time starting an interpreter and
+importing ``libsilverline``, ``paho`` and ``beartype``. The fork server is a
+template process which imports these once; each runtime is then a fork of
+the template, which only has to run the script's ``__main__`` block.
+
+The template is started by running this file as a script (so it does not
+import the ``manager`` package); requests and responses are JSON lines on a
+socket pair shared with the manager.
+"""
+
+import os
+import sys
+import json
+import signal
+import socket
+import runpy
+import logging
+import threading
+import traceback
+import subprocess
+
+from beartype.typing import Optional
+from beartype import beartype
+
+
+@beartype
+class ForkServer:
+    """Template process which forks Python runtime processes on request.
+
+    Each child starts a new session (so ``os.killpg(pid, ...)`` stops the
+    runtime and anything it started, as with ``subprocess.Popen(...,
+    preexec_fn=os.setsid)``), and runs the script as ``__main__`` with the
+    given arguments and additional environment variables. Children are
+    reaped by the template, not the manager; since their pid can then be
+    reused, `spawn` also returns a pidfd, which always refers to the
+    runtime process.
+
+    Environment variables which are only read at import time (e.g.
+    ``SL_PRODUCTION``) take the value the template was started with.
+
+    Parameters
+    ----------
+    preload: scripts to import (without running ``__main__``) in the
+        template, so that their dependencies are already loaded when forked.
+    python: Python executable for the template process.
+    env: additional environment variables for the template process.
+    """
+
+    def __init__(
+        self, preload: Optional[list[str]] = None,
+        python: str = sys.executable, env: Optional[dict[str, str]] = None
+    ) -> None:
+        self.preload = [] if preload is None else preload
+        self.python = python
+        self.env = {} if env is None else env
+        self.log = logging.getLogger("fork")
+
+        self.process: Optional[subprocess.Popen] = None
+        self._socket: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start template process; does not wait for preloading to finish."""
+        with self._lock:
+            if self.process is not None:
+                return
+            self._socket, child = socket.socketpair()
+            self.process = subprocess.Popen(
+                [self.python, os.path.abspath(__file__),
+                 str(child.fileno())] + self.preload,
+                pass_fds=[child.fileno()], env={
+                    **os.environ, **self.env, "PYTHONPATH": os.pathsep.join(
+                        [".", os.environ.get("PYTHONPATH", "")])})
+            child.close()
+            self.log.info("Started fork server (pid={}).".format(
+                self.process.pid))
+
+    def spawn(
+        self, script: str, args: Optional[list[str]] = None,
+        env: Optional[dict[str, str]] = None
+    ) -> tuple[int, int]:
+        """Fork runtime process running a script.
+
+        Starts the template if it is not running yet, and waits for it to
+        finish preloading. Returns the pid and a pidfd (owned by the caller)
+        of the runtime process.
+        """
+        self.start()
+        with self._lock:
+            assert self._socket is not None
+            self._socket.sendall(json.dumps({
+                "script": script, "args": [] if args is None else args,
+                "env": {} if env is None else env
+            }).encode('utf-8') + b'\n')
+            line, fds, _, _ = socket.recv_fds(self._socket, 4096, 1)
+            while len(line) > 0 and not line.endswith(b'\n'):
+                line += self._socket.recv(4096)
+        if not line:
+            raise ChildProcessError("Fork server exited.")
+        res = json.loads(line)
+        if "error" in res:
+            raise ChildProcessError(res["error"])
+        return res["pid"], fds[0]
+
+    def close(self) -> None:
+        """Stop template process; running runtimes are not affected."""
+        with self._lock:
+            if self.process is None:
+                return
+            assert self._socket is not None
+            self._socket.close()
+            self.process.wait()
+            self.process = None
+
+
+def _run_child(request: dict) -> None:
+    """Set up and run a forked runtime; never returns."""
+    status = 0
+    try:
+        os.setsid()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD})
+        os.environ.update(request["env"])
+        script = request["script"]
+        sys.argv = [script] + request["args"]
+        sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def _reap(signum, frame) -> None:
+    """Reap exited children."""
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _serve(fd: int, preload: list[str]) -> None:
+    """Template process main loop."""
+    signal.signal(signal.SIGCHLD, _reap)
+    # Like `python script.py`, each script only sees its own directory.
+    sys.path.pop(0)
+    for script in preload:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+        runpy.run_path(script, run_name="__forkserver__")
+        sys.path.pop(0)
+
+    sock = socket.socket(fileno=fd)
+    reader = sock.makefile('r')
+    for line in reader:
+        request = json.loads(line)
+        # Children are not reaped until a pidfd has been opened, so that the
+        # pidfd cannot refer to a different process which reused the pid.
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGCHLD})
+        try:
+            pid = os.fork()
+            if pid == 0:
+                reader.close()
+                sock.close()
+                _run_child(request)
+            pidfd = os.pidfd_open(pid)
+        except OSError as e:
+            sock.sendall(json.dumps({"error": str(e)}).encode('utf-8') + b'\n')
+            continue
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD})
+        socket.send_fds(
+            sock, [json.dumps({"pid": pid}).encode('utf-8') + b'\n'], [pidfd])
+        os.close(pidfd)
+
+
+if __name__ == '__main__':
+    _serve(int(sys.argv[1]), sys.argv[2:])
@@ -0,0 +1,102 @@
+"""Remote channel interest tracking."""
+
+import json
+import logging
+import threading
+
+import paho.mqtt.client as mqtt
+from beartype.typing import Iterable
+from beartype import beartype
+
+
+@beartype
+class InterestRegistry:
+    """Registry of topics subscribed to by other managers.
+
+    Managers which use the local fast path publish the topic filters they
+    are subscribed to (for channels) as a retained message on
+    ``{realm}/proc/interest/{manager}`` whenever they change, and clear it
+    when stopping; they also subscribe to ``{realm}/proc/interest/+``, and
+    use this to check if a topic has any remote subscribers. The fast path
+    should therefore be enabled on all managers in a realm, since managers
+    without it do not publish their interest.
+
+    Since retained messages outlive managers which exit uncleanly, stale
+    interest may be kept; this only causes messages to be published
+    unnecessarily. Subscribers which are not managers (i.e. orchestrator or
+    external clients) do not register any interest.
+
+    Parameters
+    ----------
+    mgr: parent manager.
+    track: whether to publish this manager's interest and track remote
+        interest; if False, the registry does nothing.
+    """
+
+    CACHE_SIZE = 4096
+
+    def __init__(self, mgr, track: bool = False) -> None:
+        self.mgr = mgr
+        self.track = track
+        self.log = logging.getLogger("ch.interest")
+        self.remote: dict[str, set[str]] = {}
+        self._cache: dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def topic(self, manager: str = "+") -> str:
+        """Interest topic for a manager."""
+        return self.mgr.control_topic("interest", manager)
+
+    def start(self) -> None:
+        """Start tracking interest of other managers."""
+        if self.track:
+            self.mgr.subscribe(self.topic())
+            self.mgr.message_callback_add(self.topic(), self.on_message)
+
+    def stop(self) -> None:
+        """Clear this manager's interest."""
+        if self.track:
+            self.mgr.publish(
+                self.topic(self.mgr.uuid), b"", qos=1, retain=True)
+
+    def update(self, topics: Iterable[str]) -> None:
+        """Publish this manager's interest."""
+        if self.track:
+            self.mgr.publish(
+                self.topic(self.mgr.uuid), json.dumps(sorted(topics)),
+                qos=1, retain=True)
+
+    def on_message(self, client, userdata, msg) -> None:
+        """Handle interest update from another manager."""
+        manager = msg.topic.split("/")[-1]
+        if manager == self.mgr.uuid:
+            return
+        try:
+            topics = set(json.loads(msg.payload)) if msg.payload else set()
+        except json.JSONDecodeError:
+            self.log.error("Invalid interest message from {}: {}".format(
+                manager, msg.payload))
+            return
+
+        with self._lock:
+            if len(topics) == 0:
+                self.remote.pop(manager, None)
+            else:
+                self.remote[manager] = topics
+            self._cache.clear()
+        self.log.debug("Updated interest: {} ({} topics)".format(
+            manager, len(topics)))
+
+    def has_interest(self, topic: str) -> bool:
+        """Check if any other manager is subscribed to a topic."""
+        with self._lock:
+            try:
+                return self._cache[topic]
+            except KeyError:
+                res = any(
+                    mqtt.topic_matches_sub(sub, topic)
+                    for topics in self.remote.values() for sub in topics)
+                if len(self._cache) >= self.CACHE_SIZE:
+                    self._cache.clear()
+                self._cache[topic] = res
+                return res
@@ -1,16 +1,21 @@
 """Node manager."""
 
+import json
 import logging
 import uuid
-from threading import Semaphore
+import selectors
+import threading
+from concurrent.futures import Future, wait
 import paho.mqtt.client as mqtt
 
 from beartype import beartype
-from beartype.typing import Optional
+from beartype.typing import Optional, Any, Callable
 
-from libsilverline import MQTTClient, MQTTServer
+from libsilverline import MQTTClient, MQTTServer, MQTTPool
 from .runtime import RuntimeManager
 from .channels import ChannelManager
+from .dispatch import Dispatcher
+from .forkserver import ForkServer
 from . import exceptions
 
 
@@ -21,6 +26,13 @@ class Manager(MQTTClient):
     The node manager is a thin layer that operates at a high level -- just like
     a cirrus cloud.
 
+    Runtime and module transports are multiplexed onto a single event loop
+    thread (see `add_reader`) instead of using a thread per runtime.
+
+    Channel messages are delivered to runtimes by a `Dispatcher` worker pool,
+    with an ordered queue for each runtime; the MQTT network thread only
+    matches topics and queues messages.
+
     Parameters
     ----------
     runtimes: runtimes to manage.
@@ -28,6 +40,22 @@ class Manager(MQTTClient):
     name: manager short name.
     mgr_id: manager UUID.
     timeout: Timeout duration (seconds).
+    local_fastpath: skip publishing channel messages to the MQTT broker if
+        no other manager is subscribed to the topic (see `ChannelManager`).
+    max_inflight, max_queued: MQTT in-flight window and outgoing queue limit
+        for QoS 1/2 messages (see `MQTTClient`).
+    dispatch_workers: number of channel message delivery threads; if 0,
+        messages are delivered from the thread which received them.
+    subscribe_delay, subscribe_linger, subscribe_collapse: channel
+        subscription batching options (see `SubscriptionBatcher`).
+    fork_server: template process for starting Python runtimes (see
+        `ForkServer`); started with the manager, and used by runtimes which
+        support it instead of starting a new interpreter.
+    publish_connections: number of additional MQTT connections to publish
+        channel messages through (see `MQTTPool`), so that channel traffic
+        is not queued behind control messages and profiling data (or other
+        channels) on a single connection. If 0, all messages are published
+        on the manager's connection.
     """
 
     _BANNER = r"""
@@ -41,7 +69,12 @@ class Manager(MQTTClient):
     def __init__(
         self, runtimes: list[RuntimeManager],
         server: Optional[MQTTServer] = None, name: str = "manager",
-        mgr_id: Optional[str] = None, timeout: float = 5.
+        mgr_id: Optional[str] = None, timeout: float = 5.,
+        local_fastpath: bool = False, max_inflight: int = 20,
+        max_queued: int = 0, dispatch_workers: int = 2,
+        subscribe_delay: float = 0.02, subscribe_linger: float = 0.,
+        subscribe_collapse: int = 0, fork_server: Optional[ForkServer] = None,
+        publish_connections: int = 0
     ) -> None:
         self.uuid = str(uuid.uuid4()) if mgr_id is None else mgr_id
         self.name = name
@@ -51,7 +84,8 @@ class Manager(MQTTClient):
         # (Connection Refused: unknown reason.)
         super().__init__(
             client_id="{}:{}".format(self.name, self.uuid),
-            server=server, bridge=True)
+            server=server, bridge=True, max_inflight=max_inflight,
+            max_queued=max_queued)
 
         self.log = logging.getLogger('mgr')
 
@@ -60,29 +94,91 @@ class Manager(MQTTClient):
 
         self.metadata = {
             "type": "manager", "uuid": self.uuid, "name": self.name}
-        self.channels = ChannelManager(self)
+        self.channels = ChannelManager(
+            self, local_fastpath=local_fastpath,
+            subscribe_delay=subscribe_delay, subscribe_linger=subscribe_linger,
+            subscribe_collapse=subscribe_collapse)
+        self.dispatcher = Dispatcher(workers=dispatch_workers)
+        self.fork_server = fork_server
+        self.pool: Optional[MQTTPool] = None
+        if publish_connections > 0:
+            self.pool = MQTTPool(
+                client_id=self.client_id, server=self.server,
+                size=publish_connections, max_inflight=max_inflight,
+                max_queued=max_queued)
 
-    def start(self) -> "Manager":
-        """Connect manager."""
+        self._selector = selectors.DefaultSelector()
+        self._done = False
+
+    def add_reader(self, fileobj: Any, callback: Callable[[], None]) -> None:
+        """Watch file object (or descriptor) in the manager event loop.
+
+        Parameters
+        ----------
+        fileobj: object with a ``fileno()`` method, or file descriptor.
+        callback: called with no arguments from the event loop thread each
+            time ``fileobj`` becomes readable.
+        """
+        self._selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fileobj: Any) -> None:
+        """Stop watching file object; does nothing if not registered."""
+        try:
+            self._selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def _dispatch(self, callback: Callable[[], None]) -> None:
+        """Run event loop callback, logging any errors."""
+        try:
+            callback()
+        except Exception as e:
+            exceptions.handle_error(e, self.log)
+
+    def __loop(self) -> None:
+        """Event loop; dispatches readable file objects to their callbacks."""
+        while not self._done:
+            for key, _ in self._selector.select(timeout=self.timeout):
+                self._dispatch(key.data)
+        self.log.debug("Exiting event loop.")
+
+    def _print_banner(self) -> None:
+        """Print banner and runtime list."""
         print(self._BANNER)
         for rt in self.runtimes:
             print("    {}{}".format(rt.name.ljust(12), rt.TYPE))
         print()
 
+    def start(self) -> "Manager":
+        """Connect manager."""
+        self._print_banner()
+        # Preloads while connecting and registering.
+        if self.fork_server is not None:
+            self.fork_server.start()
+
+        self.thread = threading.Thread(target=self.__loop)
+        self.thread.start()
+        self.dispatcher.start()
+
         self.will_set(
             self.control_topic("reg", self.uuid), qos=2,
             payload=self.control_message("delete", self.metadata))
         super().start()
+        if self.pool is not None:
+            self.pool.start()
 
         self.log.info("Registering manager...")
-        self._register(
-            self.control_topic("reg", self.uuid),
-            self.control_message("create", self.metadata))
+        self.subscribe_responses(*self._registration_topics())
+        self._wait_registered(self._register_manager())
         self.log.info("Manager registered.")
+        self.channels.start()
 
         self.log.info("Registering {} runtimes.".format(len(self.runtimes)))
-        for i, rt in enumerate(self.runtimes):
-            rt._start(self, i)
+        self._wait_registered({
+            self.control_topic("reg", rt.rtid): rt._start(self, i)
+            for i, rt in enumerate(self.runtimes)})
+        for rt in self.runtimes:
+            rt._start_done()
 
         self.log.info("Initialization complete.")
         print()  # empty line after initialization
@@ -92,17 +188,42 @@ class Manager(MQTTClient):
     def stop(self) -> "Manager":
         """Stop manager."""
         self.log.info("Stopping runtimes...")
+        self.dispatcher.close()
         for rt in self.runtimes:
             rt._stop()
+        if self.fork_server is not None:
+            self.fork_server.close()
 
+        self.channels.stop()
         self.publish(
             self.control_topic("reg", self.uuid),
             self.control_message("delete", self.metadata), qos=2)
+        if self.pool is not None:
+            self.pool.stop()
         super().stop()
+        self._done = True
+        self.thread.join()
+        self._selector.close()
         self.log.info("Manager and runtime(s) stopped.")
 
         return self
 
+    def stats(self) -> dict:
+        """Get channel, dispatch, MQTT, and runtime send queue statistics."""
+        return {
+            "channels": self.channels.metrics.stats(),
+            "dispatch": self.dispatcher.stats(),
+            "mqtt": self.mqtt_stats(),
+            "pool": None if self.pool is None else self.pool.mqtt_stats(),
+            "runtimes": {
+                rt.name: rt.outbox.stats()
+                for rt in self.runtimes if hasattr(rt, "outbox")}}
+
+    def handle_command(self, command: str) -> None:
+        """Print statistics (see `stats`) on ``stats``."""
+        if command == "stats":
+            print(json.dumps(self.stats(), indent=2))
+
     def on_disconnect(self, client, userdata, rc):
         """Disconnection callback."""
         self.log.info("Disconnected: rc={} ({})".format(
@@ -119,26 +240,26 @@ class Manager(MQTTClient):
         except Exception as e:
             exceptions.handle_error(e, self.log, msg.topic)
 
-    def _register(self, topic: str, msg: str) -> None:
-        """Blocking registration.
+    def _registration_topics(self) -> list[str]:
+        """Registration topics of the manager and each runtime.
 
-        Parameters
-        ----------
-        topic: MQTT topic.
-        msg: Message payload in final encoded form.
+        The orchestrator responds to registration on the same topic.
         """
-        self.subscribe(topic)
-
-        sem = Semaphore()
-        sem.acquire()
+        return [self.control_topic("reg", self.uuid)] + [
+            self.control_topic("reg", rt.rtid) for rt in self.runtimes]
 
-        def _handler(client, userdata, msg, sem=sem, topic=topic):
-            sem.release()
+    def _register_manager(self) -> dict[str, Future]:
+        """Send manager registration request."""
+        topic = self.control_topic("reg", self.uuid)
+        return {topic: self.request(topic, "create", self.metadata)}
 
-        self.message_callback_add(topic, _handler)
-        self.publish(topic, msg)
+    def _wait_registered(self, requests: dict[str, Future]) -> None:
+        """Wait for registration responses (by topic), up to ``timeout``.
 
-        if not sem.acquire(timeout=self.timeout):
-            self.log.error("Registration timed out on {}.".format(topic))
-        self.message_callback_remove(topic)
-        self.unsubscribe(topic)
+        Registration continues even if the orchestrator does not respond.
+        """
+        _, pending = wait(requests.values(), timeout=self.timeout)
+        for topic, future in requests.items():
+            if future in pending:
+                future.cancel()
+                self.log.error("Registration timed out on {}.".format(topic))
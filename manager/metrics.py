@@ -0,0 +1,201 @@
+"""Channel traffic and latency metrics."""
+
+import math
+import threading
+
+from beartype.typing import Optional
+
+from libsilverline import Channel, hotpath
+
+
+@hotpath
+class Histogram:
+    """Latency histogram with power-of-two (microsecond) buckets.
+
+    Bucket ``i`` counts samples in ``[2^(i-1), 2^i)`` us (bucket 0 counts
+    samples under 1us); the last bucket also counts anything larger.
+    Percentiles are estimated as the upper bound of the matching bucket.
+
+    Parameters
+    ----------
+    nbuckets: number of buckets; the default covers up to ~8s.
+    """
+
+    def __init__(self, nbuckets: int = 24) -> None:
+        self.buckets = [0] * nbuckets
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Add sample (in seconds)."""
+        us = seconds * 1e6
+        i = min(
+            len(self.buckets) - 1,
+            0 if us < 1. else int(math.log2(us)) + 1)
+        with self._lock:
+            self.buckets[i] += 1
+            self.count += 1
+            self.total += us
+            if us > self.max:
+                self.max = us
+
+    def percentile(self, p: float) -> float:
+        """Estimate percentile (0-100), in microseconds."""
+        target = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n > 0 and seen >= target:
+                return min(float(1 << i), round(self.max, 1))
+        return round(self.max, 1)
+
+    def summary(self) -> dict:
+        """Get sample count, mean, percentiles, and maximum."""
+        with self._lock:
+            if self.count == 0:
+                return {"count": 0}
+            return {
+                "count": self.count,
+                "mean_us": round(self.total / self.count, 1),
+                "p50_us": self.percentile(50.), "p90_us": self.percentile(90.),
+                "p99_us": self.percentile(99.), "max_us": round(self.max, 1)}
+
+
+@hotpath
+class ChannelMetrics:
+    """Channel traffic counters and delivery latency.
+
+    Counts, for each open channel, messages and bytes delivered to it
+    (``in``), published by it (``out``), and dropped before being delivered
+    (``dropped``, reported by runtime send queues); and for each topic, the
+    messages and bytes received (from MQTT or loopback) and how many did not
+    match any channel (``misses``).
+
+    Delivery latency is measured from when a message is received to when it
+    is written to the runtime (or passed to `RuntimeManager.send_many`, for
+    runtimes which do not queue messages), separately for each runtime.
+
+    Parameters
+    ----------
+    max_topics: maximum number of topics to keep separate counters for;
+        any other topics are counted under ``$other``.
+    """
+
+    # Per-channel counter indices
+    IN, IN_BYTES, OUT, OUT_BYTES, DROPPED, DROPPED_BYTES = range(6)
+    _CHANNEL_FIELDS = [
+        "in", "in_bytes", "out", "out_bytes", "dropped", "dropped_bytes"]
+    # Per-topic counter indices
+    MESSAGES, BYTES, MISSES = range(3)
+    _TOPIC_FIELDS = ["messages", "bytes", "misses"]
+
+    def __init__(self, max_topics: int = 4096) -> None:
+        self.max_topics = max_topics
+        self.channels: dict[tuple[int, int, int], list[int]] = {}
+        self.topics: dict[str, list[int]] = {}
+        self.latency: dict[int, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def __channel(self, runtime: int, module: int, fd: int) -> list[int]:
+        key = (runtime, module, fd)
+        counters = self.channels.get(key)
+        if counters is None:
+            counters = self.channels[key] = [0] * 6
+        return counters
+
+    def received(self, topic: str, size: int, matched: bool) -> None:
+        """Count message received on a topic."""
+        with self._lock:
+            counters = self.topics.get(topic)
+            if counters is None:
+                if len(self.topics) >= self.max_topics:
+                    topic = "$other"
+                counters = self.topics.setdefault(topic, [0, 0, 0])
+            counters[self.MESSAGES] += 1
+            counters[self.BYTES] += size
+            if not matched:
+                counters[self.MISSES] += 1
+
+    def delivered(self, channel: Channel, size: int) -> None:
+        """Count message delivered to a channel."""
+        with self._lock:
+            counters = self.__channel(
+                channel.runtime, channel.module, channel.fd)
+            counters[self.IN] += 1
+            counters[self.IN_BYTES] += size
+
+    def published(self, channel: Channel, size: int) -> None:
+        """Count message published by a channel."""
+        with self._lock:
+            counters = self.__channel(
+                channel.runtime, channel.module, channel.fd)
+            counters[self.OUT] += 1
+            counters[self.OUT_BYTES] += size
+
+    def dropped(self, runtime: int, module: int, fd: int, size: int) -> None:
+        """Count message dropped before being delivered to a channel."""
+        with self._lock:
+            counters = self.__channel(runtime, module, fd)
+            counters[self.DROPPED] += 1
+            counters[self.DROPPED_BYTES] += size
+
+    def remove(self, runtime: int, module: int, fd: int) -> None:
+        """Remove counters for a closed channel."""
+        with self._lock:
+            self.channels.pop((runtime, module, fd), None)
+
+    def latency_for(self, runtime: int) -> Histogram:
+        """Get delivery latency histogram for a runtime."""
+        with self._lock:
+            hist = self.latency.get(runtime)
+            if hist is None:
+                hist = self.latency[runtime] = Histogram()
+            return hist
+
+    def channel(self, runtime: int, module: int, fd: int) -> Optional[dict]:
+        """Get counters for a channel."""
+        with self._lock:
+            counters = self.channels.get((runtime, module, fd))
+            if counters is None:
+                return None
+            return dict(zip(self._CHANNEL_FIELDS, counters))
+
+    def topic(self, topic: str) -> Optional[dict]:
+        """Get counters for a topic."""
+        with self._lock:
+            counters = self.topics.get(topic)
+            if counters is None:
+                return None
+            return dict(zip(self._TOPIC_FIELDS, counters))
+
+    def summary(self, runtime: int) -> dict:
+        """Get compact summary for a runtime (i.e. for keepalives)."""
+        with self._lock:
+            totals = [0] * 6
+            nchannels = 0
+            for (rt, _, _), counters in self.channels.items():
+                if rt == runtime:
+                    nchannels += 1
+                    totals = [a + b for a, b in zip(totals, counters)]
+        res: dict = dict(zip(self._CHANNEL_FIELDS, totals))
+        res["channels"] = nchannels
+        res["latency"] = self.latency_for(runtime).summary()
+        return res
+
+    def stats(self) -> dict:
+        """Get all counters."""
+        with self._lock:
+            channels = {
+                "{:02x}.{:02x}.{:02x}".format(*k): dict(
+                    zip(self._CHANNEL_FIELDS, v))
+                for k, v in self.channels.items()}
+            topics = {
+                k: dict(zip(self._TOPIC_FIELDS, v))
+                for k, v in self.topics.items()}
+            runtimes = list(self.latency.keys())
+        return {
+            "channels": channels, "topics": topics,
+            "latency": {
+                rt: self.latency_for(rt).summary() for rt in runtimes}}
@@ -1,58 +1,103 @@
 """Module tracking."""
 
-from beartype.typing import Union
-from beartype import beartype
+from beartype.typing import Union, Optional
 
+from libsilverline import hotpath
 from manager.exceptions import ModuleException
 
 
-@beartype
+@hotpath
+class ModuleSlot:
+    """Module table entry.
+
+    Attributes
+    ----------
+    index: module index on its runtime.
+    uuid: module UUID; None if the slot is free.
+    generation: `ModuleLookup.generation` when the slot was last filled or
+        freed.
+    """
+
+    __slots__ = ("index", "uuid", "generation")
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.uuid: Optional[str] = None
+        self.generation = 0
+
+
+@hotpath
 class ModuleLookup:
-    """Module lookup by index and by UUID."""
+    """Module lookup by index and by UUID.
 
-    def __init__(self, max: int = 128):
-        self.modules_idx: dict = {}
-        self.modules_uuid: dict = {}
-        self.max_nmodules = max
+    Modules are stored in a preallocated table of `ModuleSlot`, indexed by
+    module index, with a UUID -> slot map; only the index and UUID are kept
+    (not the module create payload), so memory use does not grow as modules
+    are created and exit.
+
+    Free indices are tracked in a bitmap (stored as an integer, with bit
+    ``i`` set if index ``i`` is free), so the lowest free index is found
+    without searching the module table.
 
-    def add(self, data: dict) -> None:
-        """Add item."""
-        self.modules_idx[data["index"]] = data
-        self.modules_uuid[data["uuid"]] = data
+    Each insertion and removal increments ``generation``, and stamps the
+    slot with it; work which refers to a module by index can save the
+    current generation, and later check (`stale`) whether that index has
+    since been freed or reused by another module.
+    """
 
-    def get(self, x: Union[int, str]) -> dict:
-        """Get item by index or UUID."""
-        if isinstance(x, int):
-            return self.modules_idx[x]
-        else:
-            return self.modules_uuid[x]
+    def __init__(self, max: int = 128) -> None:
+        self.max_nmodules = max
+        self.slots = [ModuleSlot(i) for i in range(max)]
+        self.by_uuid: dict[str, ModuleSlot] = {}
+        self.generation = 0
+        self._free = (1 << max) - 1
+
+    def get(self, x: Union[int, str]) -> ModuleSlot:
+        """Get slot by index or UUID; raises KeyError if not found."""
+        if isinstance(x, str):
+            return self.by_uuid[x]
+        if 0 <= x < self.max_nmodules and self.slots[x].uuid is not None:
+            return self.slots[x]
+        raise KeyError(x)
 
     def uuid(self, x: int) -> str:
         """Get UUID by index."""
-        return self.modules_idx[x]["uuid"]
+        return self.get(x).uuid  # type: ignore
 
     def free_index(self) -> int:
         """Get first free index."""
-        for i in range(self.max_nmodules):
-            if i not in self.modules_idx:
-                return i
-        raise ModuleException(
-            "Module limit (max={}) exceeded.".format(self.max_nmodules))
+        if self._free == 0:
+            raise ModuleException(
+                "Module limit (max={}) exceeded.".format(self.max_nmodules))
+        return (self._free & -self._free).bit_length() - 1
 
     def insert(self, data: dict) -> int:
-        """Insert item."""
+        """Insert module (with ``uuid``); sets and returns its index."""
+        if data["uuid"] in self.by_uuid:
+            raise ModuleException(
+                "Module already exists: {}".format(data["uuid"]))
         idx = self.free_index()
+        self.generation += 1
+        slot = self.slots[idx]
+        slot.uuid = data["uuid"]
+        slot.generation = self.generation
+        self.by_uuid[data["uuid"]] = slot
+        self._free &= ~(1 << idx)
         data["index"] = idx
-        self.add(data)
         return idx
 
     def remove(self, x: Union[int, str]) -> None:
-        """Remove item by index or UUID."""
-        if isinstance(x, int):
-            index = x
-            module_id = self.modules_idx[index]["uuid"]
-        else:
-            module_id = x
-            index = self.modules_uuid[x]["index"]
-        del self.modules_idx[index]
-        del self.modules_uuid[module_id]
+        """Remove module by index or UUID."""
+        slot = self.get(x)
+        del self.by_uuid[slot.uuid]  # type: ignore
+        self.generation += 1
+        slot.uuid = None
+        slot.generation = self.generation
+        self._free |= 1 << slot.index
+
+    def stale(self, index: int, generation: int) -> bool:
+        """Check if a module index was freed or reused since ``generation``."""
+        if not 0 <= index < self.max_nmodules:
+            return True
+        slot = self.slots[index]
+        return slot.uuid is None or slot.generation > generation
@@ -0,0 +1,285 @@
+"""Bounded outbound message queues."""
+
+import time
+import logging
+import threading
+from collections import deque
+
+from beartype.typing import Any, Callable, Optional
+
+from libsilverline import Message, Header, hotpath
+
+from . import exceptions
+from .metrics import Histogram
+
+
+@hotpath
+class Outbox:
+    """Bounded send queue drained by a writer thread.
+
+    Channel messages are queued until the total payload size reaches
+    ``max_bytes``; after that, ``policy`` determines what happens:
+
+    - ``block``: wait until the writer makes space (backpressure).
+    - ``drop_oldest``: drop the oldest queued channel messages.
+    - ``drop_newest``: drop the message being queued.
+    - ``conflate``: only keep the newest queued message for each
+      (module, fd); if the queue is still full, drop the oldest.
+
+    Control messages (i.e. create/delete module) are never dropped or
+    conflated, and are always queued.
+
+    Individual channels can also be conflated regardless of ``policy``
+    (see `conflate`): only the newest queued message for the channel is
+    kept, and is sent once the writer drains the queue. If a minimum
+    interval is set, messages are sent at most once per interval, and the
+    newest message is held until the interval expires.
+
+    Parameters
+    ----------
+    name: name for logging.
+    max_bytes: maximum total size of queued payloads.
+    policy: policy when the queue is full.
+    latency: if passed, records the time from when each message was received
+        (see `put_many`) until it is written.
+    on_drop: called with each dropped message (while holding the queue lock,
+        so must not block).
+    """
+
+    POLICIES = ("block", "drop_oldest", "drop_newest", "conflate")
+
+    def __init__(
+        self, name: str = "outbox", max_bytes: int = 1 << 22,
+        policy: str = "drop_newest", latency: Optional[Histogram] = None,
+        on_drop: Optional[Callable[[Message], Any]] = None
+    ) -> None:
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown queue policy: {}".format(policy))
+
+        self.log = logging.getLogger("q.{}".format(name))
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.latency = latency
+        self.on_drop = on_drop
+
+        self.queued_bytes = 0
+        self.dropped = 0
+        self.dropped_bytes = 0
+        self.sent = 0
+        self.sent_bytes = 0
+
+        # Entries are [message, received time] lists so that conflated
+        # messages can be replaced in place without losing their position in
+        # the queue.
+        self._queue: deque[list] = deque()
+        self._latest: dict[tuple[int, int], list] = {}
+        # Per-channel conflation: interval, next send time, held entry.
+        self._conflate: dict[tuple[int, int], float] = {}
+        self._due: dict[tuple[int, int], float] = {}
+        self._held: dict[tuple[int, int], list] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self.thread: Optional[threading.Thread] = None
+
+    def stats(self) -> dict:
+        """Get queue counters."""
+        with self._cond:
+            return {
+                "queued": len(self._queue), "queued_bytes": self.queued_bytes,
+                "dropped": self.dropped, "dropped_bytes": self.dropped_bytes,
+                "sent": self.sent, "sent_bytes": self.sent_bytes
+            }
+
+    def start(self, write: Callable[[list[Message]], int]) -> None:
+        """Start writer thread.
+
+        Messages can be queued before the writer is started, i.e. while
+        waiting for a runtime to connect.
+
+        Parameters
+        ----------
+        write: writes a list of messages, and returns how many were written
+            (i.e. ``Transport.write_many``); the rest are counted as dropped.
+        """
+        self.thread = threading.Thread(
+            target=self.__loop, args=(write,), daemon=True)
+        self.thread.start()
+
+    def conflate(self, module: int, fd: int, interval: float = 0.) -> None:
+        """Conflate messages sent to a channel.
+
+        Parameters
+        ----------
+        module: module index (``h1``).
+        fd: channel index (``h2``).
+        interval: minimum interval between messages, in seconds.
+        """
+        with self._cond:
+            self._conflate[(module, fd)] = interval
+
+    def unconflate(self, module: int, fd: int) -> None:
+        """Stop conflating a channel; any held message is discarded."""
+        with self._cond:
+            self._conflate.pop((module, fd), None)
+            self._due.pop((module, fd), None)
+            self._held.pop((module, fd), None)
+
+    def close(self) -> None:
+        """Stop writer thread; queued messages are discarded."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __count_drop(self, msg: Message) -> None:
+        self.dropped += 1
+        self.dropped_bytes += len(msg.payload)
+        if self.on_drop is not None:
+            self.on_drop(msg)
+
+    def __drop(self, entry: list) -> None:
+        msg = entry[0]
+        self.__count_drop(msg)
+        self.queued_bytes -= len(msg.payload)
+        if self._latest.get((msg.h1, msg.h2)) is entry:
+            del self._latest[(msg.h1, msg.h2)]
+
+    def __drop_oldest(self, size: int) -> None:
+        """Drop oldest channel messages until ``size`` bytes fit."""
+        i = 0
+        while self.queued_bytes + size > self.max_bytes and i < len(
+                self._queue):
+            if self._queue[i][0].h1 & Header.control:
+                i += 1
+            else:
+                self.__drop(self._queue[i])
+                del self._queue[i]
+
+    def __hold(self, key: tuple[int, int], entry: list) -> bool:
+        """Hold message for a rate-limited channel, if not due yet."""
+        interval = self._conflate.get(key, 0.)
+        if interval <= 0.:
+            return False
+
+        now = time.monotonic()
+        if key not in self._held and now >= self._due.get(key, 0.):
+            self._due[key] = now + interval
+            return False
+
+        held = self._held.get(key)
+        if held is not None:
+            self.__count_drop(held[0])
+        self._held[key] = entry
+        return True
+
+    def __release(self) -> Optional[float]:
+        """Queue held messages which are due.
+
+        Returns the time until the next held message is due, if any.
+        """
+        wait: Optional[float] = None
+        now = time.monotonic()
+        for key, entry in list(self._held.items()):
+            due = self._due[key]
+            if due <= now:
+                del self._held[key]
+                self._due[key] = now + self._conflate[key]
+                self.__put(entry, hold=False)
+            elif wait is None or due - now < wait:
+                wait = due - now
+        return wait
+
+    def __put(self, entry: list, hold: bool = True) -> None:
+        msg = entry[0]
+        size = len(msg.payload)
+        key = (msg.h1, msg.h2)
+        conflate = False
+        if msg.h1 & Header.control == 0:
+            conflate = self.policy == "conflate" or key in self._conflate
+            if hold and self.__hold(key, entry):
+                return
+            if conflate and key in self._latest:
+                latest = self._latest[key]
+                self.__drop(latest)
+                latest[:] = entry
+                self._latest[key] = latest
+                self.queued_bytes += size
+                return
+
+            if self.queued_bytes + size > self.max_bytes:
+                if self.policy == "drop_newest":
+                    self.__count_drop(msg)
+                    return
+                elif self.policy == "block":
+                    while (
+                            self.queued_bytes + size > self.max_bytes
+                            and len(self._queue) > 0 and not self._closed):
+                        self._cond.wait()
+                else:
+                    self.__drop_oldest(size)
+
+        if conflate:
+            self._latest[key] = entry
+        self._queue.append(entry)
+        self.queued_bytes += size
+
+    def put_many(
+        self, msgs: list[Message], received: Optional[float] = None
+    ) -> None:
+        """Queue messages for sending.
+
+        Parameters
+        ----------
+        msgs: messages to send.
+        received: when the messages were received by the manager (from
+            ``time.perf_counter``), for latency measurements.
+        """
+        with self._cond:
+            for msg in msgs:
+                self.__put([msg, received])
+            self._cond.notify_all()
+
+    def put(self, msg: Message) -> None:
+        """Queue message for sending."""
+        self.put_many([msg])
+
+    def __loop(self, write: Callable[[list[Message]], int]) -> None:
+        """Writer thread; sends everything queued in a single write."""
+        while True:
+            with self._cond:
+                while True:
+                    wait = self.__release()
+                    if len(self._queue) > 0 or self._closed:
+                        break
+                    self._cond.wait(wait)
+                if self._closed:
+                    return
+                msgs = [entry[0] for entry in self._queue]
+                received = [entry[1] for entry in self._queue]
+                self._queue.clear()
+                self._latest.clear()
+                self.queued_bytes = 0
+                self._cond.notify_all()
+
+            written = 0
+            try:
+                written = write(msgs)
+            except Exception as e:
+                exceptions.handle_error(e, self.log)
+
+            with self._cond:
+                self.sent += written
+                self.sent_bytes += sum(
+                    len(msg.payload) for msg in msgs[:written])
+                for msg in msgs[written:]:
+                    self.__count_drop(msg)
+            if self.latency is not None:
+                now = time.perf_counter()
+                for t in received[:written]:
+                    if t is not None:
+                        self.latency.record(now - t)
+            if written < len(msgs):
+                self.log.warning(
+                    "Write timed out; dropped {} messages.".format(
+                        len(msgs) - written))
@@ -0,0 +1,185 @@
+"""Topic routing index."""
+
+import threading
+from collections import OrderedDict
+
+import paho.mqtt.client as mqtt
+from beartype.typing import Optional
+
+from libsilverline import Channel, hotpath
+
+
+class _Node:
+    """Wildcard trie node."""
+
+    __slots__ = ("children", "channels")
+
+    def __init__(self) -> None:
+        self.children: dict[str, "_Node"] = {}
+        self.channels: Optional[set[Channel]] = None
+
+
+@hotpath
+class RoutingIndex:
+    """Lookup of channels subscribed to each topic.
+
+    Subscriptions without wildcards are kept in a hash map; subscriptions
+    with wildcards (``+``, ``#``) are kept in a trie. Matched channels for
+    each topic are cached (least recently used), so routing a message to a
+    hot topic is a single dictionary lookup.
+
+    Cache entries are invalidated incrementally: adding or removing an exact
+    subscription only invalidates that topic, and adding or removing a
+    wildcard subscription only invalidates cached topics which it matches.
+
+    Parameters
+    ----------
+    cache_size: maximum number of cached topics.
+    """
+
+    def __init__(self, cache_size: int = 1024) -> None:
+        self.cache_size = cache_size
+        self.exact: dict[str, set[Channel]] = {}
+        self.wildcard = _Node()
+        self._cache: OrderedDict[str, tuple[Channel, ...]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_wildcard(topic: str) -> bool:
+        """Check if a subscription topic contains wildcards."""
+        return '+' in topic or '#' in topic
+
+    def __contains__(self, topic: str) -> bool:
+        """Check if there are any channels subscribed to this exact filter."""
+        with self._lock:
+            return self.__get(topic) is not None
+
+    def __get(self, topic: str) -> Optional[set[Channel]]:
+        if not self.is_wildcard(topic):
+            return self.exact.get(topic)
+        node = self.wildcard
+        for level in topic.split('/'):
+            child = node.children.get(level)
+            if child is None:
+                return None
+            node = child
+        return node.channels
+
+    def __invalidate(self, topic: str) -> None:
+        if not self.is_wildcard(topic):
+            self._cache.pop(topic, None)
+        else:
+            matched = [
+                t for t in self._cache if mqtt.topic_matches_sub(topic, t)]
+            for cached in matched:
+                del self._cache[cached]
+
+    def add(self, channel: Channel) -> bool:
+        """Add channel subscription.
+
+        Returns
+        -------
+        True if this is the first channel subscribed to this topic filter
+        (i.e. the topic needs to be subscribed to).
+        """
+        topic = channel.topic
+        with self._lock:
+            self.__invalidate(topic)
+            if not self.is_wildcard(topic):
+                channels = self.exact.setdefault(topic, set())
+            else:
+                node = self.wildcard
+                for level in topic.split('/'):
+                    node = node.children.setdefault(level, _Node())
+                if node.channels is None:
+                    node.channels = set()
+                channels = node.channels
+            channels.add(channel)
+            return len(channels) == 1
+
+    def remove(self, channel: Channel) -> bool:
+        """Remove channel subscription.
+
+        Returns
+        -------
+        True if no channels are subscribed to this topic filter anymore (i.e.
+        the topic should be unsubscribed from).
+        """
+        topic = channel.topic
+        with self._lock:
+            self.__invalidate(topic)
+            if not self.is_wildcard(topic):
+                channels = self.exact.get(topic)
+                if channels is None:
+                    return False
+                channels.discard(channel)
+                if len(channels) == 0:
+                    del self.exact[topic]
+                    return True
+                return False
+
+            path = [self.wildcard]
+            levels = topic.split('/')
+            for level in levels:
+                node = path[-1].children.get(level)
+                if node is None:
+                    return False
+                path.append(node)
+            if path[-1].channels is None:
+                return False
+            path[-1].channels.discard(channel)
+            if len(path[-1].channels) > 0:
+                return False
+
+            # Prune empty nodes
+            path[-1].channels = None
+            for parent, node, level in zip(
+                    reversed(path[:-1]), reversed(path[1:]), reversed(levels)):
+                if node.channels is not None or len(node.children) > 0:
+                    break
+                del parent.children[level]
+            return True
+
+    def __match_wildcard(self, topic: str) -> list[Channel]:
+        """Walk wildcard trie (following `mqtt.MQTTMatcher` semantics)."""
+        levels = topic.split('/')
+        # Wildcards at the first level do not match topics starting with $.
+        normal = not topic.startswith('$')
+        matched: list[Channel] = []
+
+        def _walk(node: _Node, i: int) -> None:
+            if i == len(levels):
+                if node.channels is not None:
+                    matched.extend(node.channels)
+            else:
+                child = node.children.get(levels[i])
+                if child is not None:
+                    _walk(child, i + 1)
+                if '+' in node.children and (normal or i > 0):
+                    _walk(node.children['+'], i + 1)
+            if '#' in node.children and (normal or i > 0):
+                channels = node.children['#'].channels
+                if channels is not None:
+                    matched.extend(channels)
+
+        _walk(self.wildcard, 0)
+        return matched
+
+    def match(self, topic: str) -> tuple[Channel, ...]:
+        """Get all channels subscribed to a topic."""
+        with self._lock:
+            try:
+                self._cache.move_to_end(topic)
+                return self._cache[topic]
+            except KeyError:
+                pass
+
+            matched = list(self.exact.get(topic, ()))
+            if len(self.wildcard.children) > 0:
+                matched += self.__match_wildcard(topic)
+            result = tuple(matched)
+
+            self._cache[topic] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return result
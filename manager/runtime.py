@@ -4,18 +4,21 @@ import logging
 import uuid
 import json
 import threading
+import time
 
 from abc import abstractmethod
-from beartype.typing import Optional
-from beartype import beartype
+from concurrent.futures import Future
+from beartype.typing import Optional, Callable
 
-from libsilverline import format_message, Message, Header
+from libsilverline import (
+    format_message, Message, Header, Transport, Channel, DeferredDecode,
+    TRACE, hotpath)
 
 from . import exceptions
 from .module import ModuleLookup
 
 
-@beartype
+@hotpath
 class RuntimeManager:
     """Runtime interface layer.
 
@@ -23,6 +26,16 @@ class RuntimeManager:
     initialization and config. Generally, configuration should be set using
     the ``TYPE``, ``APIS``, ``MAX_NMODULES``, and ``DEFAULT_NAME`` attributes.
 
+    Runtimes which communicate over `SLSocket` or `SLSharedMemory` should
+    register their transports with the manager's event loop using
+    `add_transport`, and set ``POLL_RECEIVE = False``; otherwise, a thread
+    is started which polls `receive`.
+
+    Runtimes which can deliver ``Header.multicast`` messages (one payload for
+    several module channels; see `Message.from_multicast`) should set
+    ``MULTICAST = True``; channel messages with more than one destination on
+    the runtime are then sent as a single multicast message.
+
     Parameters
     ----------
     rtid: Runtime UUID.
@@ -35,6 +48,8 @@ class RuntimeManager:
     MAX_NMODULES: int = 0
     DEFAULT_NAME: str = "runtime"
     DEFAULT_SHORTNAME: str = "rt"
+    POLL_RECEIVE: bool = True
+    MULTICAST: bool = False
 
     def __init__(
         self, rtid: Optional[str] = None, name: Optional[str] = None,
@@ -48,6 +63,7 @@ class RuntimeManager:
         self.index = -1
         self.manager = None
         self.modules = ModuleLookup(max=self.MAX_NMODULES)
+        self._accepting: set[Transport] = set()
 
         self.config = {
             "type": "runtime",
@@ -61,6 +77,26 @@ class RuntimeManager:
 
         self.done = False
 
+        # Control message handlers, by message type (h2); each is called
+        # with the module index (h1) and the message.
+        self.control_handlers: dict[int, Callable[[int, Message], None]] = {
+            Header.keepalive: lambda idx, msg: self.handle_keepalive(
+                bytes(msg.payload)),
+            Header.log_runtime: lambda idx, msg: self.handle_log(
+                bytes(msg.payload), module=-1),
+            Header.exited: lambda idx, msg: self.cleanup_module(
+                idx, self.modules.uuid(idx), msg),
+            Header.ch_open: lambda idx, msg: self.mgr.channels.open(
+                runtime=self.index, module=idx,
+                **self.__open_channel_args(msg)),
+            Header.ch_close: lambda idx, msg: self.mgr.channels.close(
+                self.index, idx, self.__channel_index(msg)[0]),
+            Header.log_module: lambda idx, msg: self.handle_log(
+                bytes(msg.payload), module=idx),
+            Header.profile: lambda idx, msg: self.handle_profile(
+                self.modules.uuid(idx), bytes(msg.payload)),
+        }
+
     @abstractmethod
     def start(self) -> dict:
         """Start runtime, and return the registration config."""
@@ -75,6 +111,22 @@ class RuntimeManager:
         """Send message to runtime."""
         pass
 
+    def send_many(self, msgs: list[Message]) -> None:
+        """Send several messages to runtime; overwrite to batch writes."""
+        for msg in msgs:
+            self.send(msg)
+
+    def deliver(self, msgs: list[Message], received: float) -> None:
+        """Send channel messages received at ``received`` (perf_counter).
+
+        Records delivery latency once `send_many` returns; runtimes which
+        queue messages should overwrite this to record latency when the
+        messages are actually written.
+        """
+        self.send_many(msgs)
+        self.mgr.channels.metrics.latency_for(self.index).record(
+            time.perf_counter() - received)
+
     @abstractmethod
     def receive(self) -> Optional[Message]:
         """Poll interface and receive message; return None on timeout."""
@@ -98,13 +150,76 @@ class RuntimeManager:
     def delete_module(self, module_id: str) -> None:
         """Delete module; overwrite this method to add additional steps."""
         try:
-            index = self.modules.get(module_id)["index"]
+            index = self.modules.get(module_id).index
             self.send(Message(Header.control | index, Header.delete, bytes()))
             self.log.info(format_message("Deleted module.", self.index, index))
         except KeyError:
             raise exceptions.ModuleException(
                 "Tried to delete nonexisting module: {}".format(module_id))
 
+    def add_transport(self, transport: Transport) -> None:
+        """Dispatch messages from transport using the manager's event loop."""
+        def _on_readable():
+            msgs = transport.read_many()
+            if msgs is None:
+                self.log.debug(format_message(
+                    "Transport closed.", self.index))
+                self.remove_transport(transport)
+                return
+            trace = self.log.isEnabledFor(TRACE)
+            for msg in msgs:
+                if trace:
+                    self.log.log(TRACE, format_message(
+                        "Received message.", self.index, msg.h1, msg.h2))
+                self.on_runtime_message(msg)
+
+        self.mgr.add_reader(transport, _on_readable)
+
+    def accept_transport(
+        self, transport: Transport,
+        callback: Optional[Callable[[], None]] = None
+    ) -> None:
+        """Accept connection on a server transport without blocking.
+
+        The listening socket is watched by the manager's event loop; once the
+        runtime connects, the connection is accepted, the transport is added
+        with `add_transport`, and ``callback`` (if any) is called from the
+        event loop thread. Removing the transport before then cancels the
+        pending accept.
+        """
+        def _on_connect():
+            self._accepting.discard(transport)
+            self.mgr.remove_reader(transport.socket)
+            transport.accept()
+            self.add_transport(transport)
+            if callback is not None:
+                callback()
+
+        self._accepting.add(transport)
+        self.mgr.add_reader(transport.socket, _on_connect)
+
+    def remove_transport(self, transport: Transport) -> None:
+        """Remove transport (or pending accept) from the event loop."""
+        if transport in self._accepting:
+            self._accepting.discard(transport)
+            self.mgr.remove_reader(transport.socket)
+        else:
+            self.mgr.remove_reader(transport)
+
+    def open_channel(self, channel: Channel) -> None:
+        """Configure delivery for a newly opened channel.
+
+        Called for all channels opened by modules on this runtime. Does
+        nothing by default; runtimes which queue messages should overwrite
+        this to conflate channels opened with ``Flags.conflate`` (see
+        `Outbox.conflate`).
+        """
+        pass
+
+    def close_channel(self, channel: Channel) -> None:
+        """Clean up delivery configuration for a closed channel."""
+        pass
+
     def handle_profile(self, module: str, msg: bytes) -> None:
         """Handle profiling message.
 
@@ -120,35 +235,52 @@ class RuntimeManager:
             self.mgr.control_message("update", {
                 "type": "runtime", "uuid": self.rtid,
                 "apis": self.APIS, "name": self.name,
+                "channels": self.mgr.channels.metrics.summary(self.index),
                 **json.loads(payload)
             }))
 
     def handle_log(self, payload: bytes, module: int = -1) -> None:
-        """Handle logging message."""
+        """Handle logging message.
+
+        The payload is only decoded if the message is emitted (and, with
+        queued logging, by the logging thread; see `configure_log`).
+        """
         if payload[0] & 0x80 == 0:
-            self.log_rt.debug(payload.decode('unicode-escape'))
+            level, text = logging.DEBUG, payload
         else:
-            self.log_rt.log(
-                payload[0] & 0x7f, payload[1:].decode('unicode-escape'))
+            level, text = payload[0] & 0x7f, payload[1:]
+        if self.log_rt.isEnabledFor(level):
+            self.log_rt.log(level, DeferredDecode(text))
 
     # --------------------------- Internal Methods -------------------------- #
 
     def __loop_start(self) -> None:
-        """Start main loop."""
+        """Start main loop, if `receive` should be polled."""
+        self.thread: Optional[threading.Thread] = None
+        if not self.POLL_RECEIVE:
+            return
+
         def _loop():
+            trace = self.log.isEnabledFor(TRACE)
             while not self.done:
                 msg = self.receive()
                 if msg is not None:
-                    self.log.log(5, format_message(
-                        "Received message.", self.index, msg.h1, msg.h2))
+                    if trace:
+                        self.log.log(TRACE, format_message(
+                            "Received message.", self.index, msg.h1, msg.h2))
                     self.on_runtime_message(msg)
             self.log.debug(format_message("Exiting main loop.", self.index))
 
         self.thread = threading.Thread(target=_loop)
         self.thread.start()
 
-    def _start(self, mgr, index: int) -> None:
-        """Full runtime start procedure."""
+    def _start(self, mgr, index: int) -> Future:
+        """Start runtime, and send its registration request.
+
+        Returns a future for the registration response; the manager calls
+        `_start_done` once all runtimes are registered (or timed out), so
+        that runtimes are registered concurrently.
+        """
         self.index = index
         self.mgr = mgr
 
@@ -158,9 +290,10 @@ class RuntimeManager:
 
         metadata = self.start()
         metadata["parent"] = self.mgr.uuid
-        self.mgr._register(
-            self.control_topic("reg"),
-            self.mgr.control_message("create", metadata))
+        return self.mgr.request(self.control_topic("reg"), "create", metadata)
+
+    def _start_done(self) -> None:
+        """Finish starting runtime after registration."""
         self.__loop_start()
         self.log.info("Registered: {}:{} (x{:02x})".format(
             self.name, self.rtid, self.index))
@@ -169,7 +302,8 @@ class RuntimeManager:
         """Full runtime stop procedure."""
         self.stop()
         self.done = True
-        self.thread.join()
+        if self.thread is not None:
+            self.thread.join()
 
     def control_topic(self, topic: str, *ids: str) -> str:
         """Format control topic name."""
@@ -180,26 +314,26 @@ class RuntimeManager:
         self.mgr.publish(
             self.control_topic("control"),
             self.mgr.control_message("exited", {
-                "type": "module", "uuid": mid, **json.loads(msg.payload)}))
+                "type": "module", "uuid": mid,
+                **json.loads(bytes(msg.payload))}))
         self.mgr.channels.cleanup(self.index, idx)
         self.modules.remove(idx)
         self.log.info(format_message("Module exited.", self.index, idx))
 
-    def __handle_control_message(self, data: bytes) -> None:
-        """Handle control message on {realm}/proc/control/{rtid}."""
+    def _parse_control_message(self, data: bytes) -> tuple[str, dict]:
+        """Parse control message into (``create``|``delete``, module data)."""
         self.log.debug(
             "Received control message: {}".format(data.decode('utf-8')))
         try:
             data_dict = json.loads(data)
-            action = (data_dict["action"], data_dict["data"]["type"])
+            module = data_dict["data"]
+            action = (data_dict["action"], module["type"], module["uuid"])
             match action:
-                case ("create", "module"):
-                    self.create_module(data_dict["data"])
-                case ("delete", "module"):
-                    self.delete_module(data_dict["data"]["uuid"])
+                case ("create" | "delete", "module", _):
+                    return data_dict["action"], module
                 case _:
                     raise exceptions.InvalidMessage(
-                        "Invalid message action: {}".format(action))
+                        "Invalid message action: {}".format(action[:2]))
         except json.JSONDecodeError:
             raise exceptions.InvalidMessage(
                 "Invalid json: {}".format(data.decode('utf-8')))
@@ -207,6 +341,14 @@ class RuntimeManager:
             raise exceptions.InvalidMessage(
                 "Message missing required key: {}".format(e))
 
+    def __handle_control_message(self, data: bytes) -> None:
+        """Handle control message on {realm}/proc/control/{rtid}."""
+        action, module = self._parse_control_message(data)
+        if action == "create":
+            self.create_module(module)
+        else:
+            self.delete_module(module["uuid"])
+
     def on_mqtt_message(self, client, userdata, msg) -> None:
         """External message callback."""
         try:
@@ -214,33 +356,63 @@ class RuntimeManager:
         except Exception as e:
             exceptions.handle_error(e, self.log, self.index)
 
-    def __handle_runtime_control_message(self, msg: Message) -> None:
-        """Handle control message."""
-        match (msg.h1 & Header.control, msg.h1 & Header.index_bits, msg.h2):
-            case (0x00, h1, h2):
-                self.mgr.channels.publish(self.index, h1, h2, msg.payload)
-            case (Header.control, _, Header.keepalive):
-                self.handle_keepalive(msg.payload)
-            case (Header.control, _, Header.log_runtime):
-                self.handle_log(msg.payload, module=-1)
-            case (Header.control, idx, Header.exited):
-                self.cleanup_module(idx, self.modules.uuid(idx), msg)
-            case (Header.control, idx, Header.ch_open):
-                self.mgr.channels.open(
-                    runtime=self.index, module=idx, fd=msg.payload[0],
-                    topic=msg.payload[2:], flags=msg.payload[1])
-            case (Header.control, _, Header.ch_close):
-                self.mgr.channels.close(self.index, msg.payload[0])
-            case (Header.control, idx, Header.log_module):
-                self.handle_log(msg.payload, module=idx)
-            case (Header.control, idx, Header.profile):
-                self.handle_profile(self.modules.uuid(idx), msg.payload)
-            case _:
+    @staticmethod
+    def __channel_index(msg: Message) -> tuple[int, int]:
+        """Get channel index from open/close channel message payload.
+
+        Returns the index and the offset of the rest of the payload.
+        """
+        if msg.flags & Header.wide:
+            return msg.payload[0] | (msg.payload[1] << 8), 2
+        return msg.payload[0], 1
+
+    @classmethod
+    def __open_channel_args(cls, msg: Message) -> dict:
+        """Parse open channel message payload."""
+        fd, offset = cls.__channel_index(msg)
+        flags = msg.payload[offset]
+        offset += 1
+        interval = 0
+        if msg.flags & Header.interval:
+            interval = msg.payload[offset] | (msg.payload[offset + 1] << 8)
+            offset += 2
+        return {
+            "fd": fd, "flags": flags, "interval": interval,
+            "topic": bytes(msg.payload[offset:])}
+
+    def __handle_runtime_message(self, msg: Message) -> None:
+        """Handle (non-batch) message.
+
+        Channel payloads are forwarded as-is (possibly as a ``memoryview``);
+        control messages are looked up in ``control_handlers``, and their
+        payloads are copied to ``bytes`` before being handled.
+        """
+        h1 = msg.h1
+        try:
+            if not h1 & Header.control:
+                self.mgr.channels.publish(self.index, h1, msg.h2, msg.payload)
+                return
+            handler = self.control_handlers.get(msg.h2)
+            if handler is None:
                 raise exceptions.SLException("Unknown message type")
+            handler(h1 & Header.index_bits, msg)
+        except Exception as e:
+            exceptions.handle_error(e, self.log, self.index, h1, msg.h2)
 
     def on_runtime_message(self, msg: Message) -> None:
-        """Handle message from the runtime."""
+        """Handle message from the runtime.
+
+        Batch messages are unpacked, and each contained message is handled
+        (and any errors reported) individually.
+        """
+        if not msg.h1 & Header.control or msg.h2 != Header.batch:
+            self.__handle_runtime_message(msg)
+            return
+
         try:
-            self.__handle_runtime_control_message(msg)
+            msgs = msg.unbatch()
         except Exception as e:
             exceptions.handle_error(e, self.log, self.index, msg.h1, msg.h2)
+            return
+        for m in msgs:
+            self.__handle_runtime_message(m)
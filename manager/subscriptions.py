@@ -0,0 +1,228 @@
+"""Batched MQTT subscriptions."""
+
+import logging
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+from beartype.typing import Optional
+from beartype import beartype
+
+from .interest import InterestRegistry
+from .routing import RoutingIndex
+
+
+@beartype
+class SubscriptionBatcher:
+    """Reference-counted channel subscriptions, sent to the broker in batches.
+
+    Subscription changes are not sent immediately; instead, all changes made
+    within ``delay`` seconds are coalesced into (at most) one multi-topic
+    SUBSCRIBE and one multi-topic UNSUBSCRIBE packet, so that starting or
+    stopping many modules at once does not flood the broker.
+
+    Two optional policies further reduce broker traffic:
+
+    - ``collapse``: if at least this many topics without wildcards share the
+      same parent (e.g. ``a/b/1``, ``a/b/2``, ...), subscribe to ``a/b/+``
+      instead; messages for other topics matching the filter are dropped by
+      the channel routing index.
+    - ``linger``: topics which no longer have any channels stay subscribed for
+      this many seconds, so modules which exit and restart do not cause the
+      topic to be unsubscribed and subscribed again.
+
+    Parameters
+    ----------
+    mgr: parent manager.
+    interest: registry to publish this manager's interest (the subscribed
+        channel topics, not the broker-level filters) to after each batch.
+    delay: time to wait for more changes before sending; if 0, changes are
+        sent immediately.
+    linger: time to keep unused topics subscribed.
+    collapse: number of sibling topics to collapse into a wildcard filter;
+        if 0, topics are never collapsed.
+    """
+
+    def __init__(
+        self, mgr, interest: InterestRegistry, delay: float = 0.02,
+        linger: float = 0., collapse: int = 0
+    ) -> None:
+        self.mgr = mgr
+        self.interest = interest
+        self.delay = delay
+        self.linger = linger
+        self.collapse = collapse
+        self.log = logging.getLogger("ch.sub")
+
+        # Channel topics: number of channels, and highest QoS.
+        self.count: dict[str, int] = {}
+        self.qos: dict[str, int] = {}
+        # Filters currently subscribed to on the broker, and their QoS.
+        self.subscribed: dict[str, int] = {}
+        # Unused broker filters, and when they should be unsubscribed.
+        self.lingering: dict[str, float] = {}
+
+        # Topics written to by (non-local) channels: number of channels, and
+        # whether the topic is published through the publish pool.
+        self.writers: dict[str, int] = {}
+        self.pooled: dict[str, bool] = {}
+        self._published: Optional[frozenset[str]] = None
+        self._timer: Optional[threading.Timer] = None
+        self._deadline = 0.
+        self._lock = threading.RLock()
+
+    @property
+    def lossy(self) -> bool:
+        """Whether the broker may send messages which match no channel."""
+        return self.collapse > 0 or self.linger > 0
+
+    def add(self, topic: str, qos: int = 0) -> None:
+        """Add a channel subscribed to a topic."""
+        with self._lock:
+            self.count[topic] = self.count.get(topic, 0) + 1
+            self.qos[topic] = max(qos, self.qos.get(topic, 0))
+            self.__schedule(self.delay)
+
+    def remove(self, topic: str) -> None:
+        """Remove a channel subscribed to a topic."""
+        with self._lock:
+            count = self.count.get(topic, 0)
+            if count <= 1:
+                self.count.pop(topic, None)
+                self.qos.pop(topic, None)
+            else:
+                self.count[topic] = count - 1
+            self.__schedule(self.delay)
+
+    def pin(self, topic: str) -> None:
+        """Add a channel which writes to a topic.
+
+        The first writer chooses the connection the topic is published
+        through (``pooled``): the manager's publish pool, unless the manager
+        is (or is about to be) subscribed to the topic, since the broker
+        would send messages published through the pool back to it. The topic
+        stays on that connection until all its writers are closed, so that
+        its messages stay in order; the only exception is a pooled topic
+        which becomes subscribed, which is moved to the manager's connection
+        before the subscription is sent.
+        """
+        with self._lock:
+            count = self.writers.get(topic, 0)
+            if count == 0:
+                self.pooled[topic] = not self.__covers(
+                    topic, {**self.subscribed, **self.filters()})
+            self.writers[topic] = count + 1
+
+    def unpin(self, topic: str) -> None:
+        """Remove a channel which writes to a topic."""
+        with self._lock:
+            count = self.writers.get(topic, 0)
+            if count <= 1:
+                self.writers.pop(topic, None)
+                self.pooled.pop(topic, None)
+            else:
+                self.writers[topic] = count - 1
+
+    @staticmethod
+    def __covers(topic: str, filters: dict[str, int]) -> bool:
+        """Check if a topic matches any of the given filters."""
+        return topic in filters or any(
+            mqtt.topic_matches_sub(f, topic)
+            for f in filters if RoutingIndex.is_wildcard(f))
+
+    def stop(self) -> None:
+        """Cancel any pending batch."""
+        with self._lock:
+            self.__cancel()
+
+    def __cancel(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def __schedule(self, delay: float) -> None:
+        """Flush after ``delay``, unless a flush is already due before."""
+        if delay == 0:
+            self.flush()
+            return
+        deadline = time.perf_counter() + delay
+        if self._timer is None or deadline < self._deadline:
+            self.__cancel()
+            self._deadline = deadline
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def filters(self) -> dict[str, int]:
+        """Get the broker filters (and QoS) needed for the current topics."""
+        with self._lock:
+            res: dict[str, int] = {}
+            groups: dict[str, list[str]] = {}
+            for topic, qos in self.qos.items():
+                # Topics starting with `$` are not matched by wildcards.
+                if (
+                    self.collapse > 0 and '/' in topic
+                    and not topic.startswith('$')
+                    and not RoutingIndex.is_wildcard(topic)
+                ):
+                    parent = topic.rsplit('/', 1)[0]
+                    groups.setdefault(parent, []).append(topic)
+                else:
+                    res[topic] = qos
+
+            for parent, topics in groups.items():
+                if len(topics) >= self.collapse:
+                    wildcard = parent + "/+"
+                    res[wildcard] = max(
+                        res.get(wildcard, 0), *(self.qos[t] for t in topics))
+                else:
+                    for topic in topics:
+                        res[topic] = self.qos[topic]
+            return res
+
+    def flush(self) -> None:
+        """Send all pending subscription changes to the broker."""
+        with self._lock:
+            self.__cancel()
+            now = time.perf_counter()
+            desired = self.filters()
+
+            subscribe = [
+                (f, qos) for f, qos in desired.items()
+                if qos > self.subscribed.get(f, -1)]
+            for f in desired:
+                self.lingering.pop(f, None)
+
+            unsubscribe = []
+            for f in self.subscribed:
+                if f in desired:
+                    continue
+                expires = self.lingering.setdefault(f, now + self.linger)
+                if expires <= now:
+                    unsubscribe.append(f)
+
+            # Subscribing again replaces the existing subscription's QoS.
+            if len(subscribe) > 0:
+                filters = dict(subscribe)
+                for topic, pooled in self.pooled.items():
+                    if pooled and self.__covers(topic, filters):
+                        self.pooled[topic] = False
+                self.subscribed.update(subscribe)
+                self.mgr.subscribe(subscribe)
+            if len(unsubscribe) > 0:
+                self.mgr.unsubscribe(unsubscribe)
+                for f in unsubscribe:
+                    del self.subscribed[f]
+                    del self.lingering[f]
+            if len(subscribe) > 0 or len(unsubscribe) > 0:
+                self.log.debug("Subscribed: {}; unsubscribed: {}".format(
+                    [f for f, _ in subscribe], unsubscribe))
+
+            topics = frozenset(self.count)
+            if topics != self._published:
+                self._published = topics
+                self.interest.update(topics)
+
+            if len(self.lingering) > 0:
+                self.__schedule(max(
+                    0.001, min(self.lingering.values()) - now))
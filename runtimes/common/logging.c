@@ -34,9 +34,13 @@ void log_msg(int level, const char *format, ...) {
     va_start(args, format);
 
     char buf[LOG_MAX_LEN];
-    int len = vsnprintf(&buf[1], LOG_MAX_LEN, format, args);
-    if (len > LOG_MAX_LEN) { len = LOG_MAX_LEN; }
-    buf[0] = H_CONTROL | (level < 256 ? level : 256);
+    int len = vsnprintf(&buf[1], LOG_MAX_LEN - 1, format, args);
+    va_end(args);
+    if (len < 0) { len = 0; }
+    if (len > LOG_MAX_LEN - 2) { len = LOG_MAX_LEN - 2; }
+    if (level > LOG_LEVEL_MAX) { level = LOG_LEVEL_MAX; }
+    if (level < 0) { level = 0; }
+    buf[0] = (char) (LOG_HAS_LEVEL | level);
 
     slsocket_rwrite(_socket, H_CONTROL | 0x00, H_LOG_RUNTIME, buf, len + 1);
 }
@@ -19,6 +19,10 @@
 
 #define LOG_MAX_LEN 1024
 
+/** Log message level byte: leading bit set, followed by a 7-bit level. */
+#define LOG_HAS_LEVEL 0x80
+#define LOG_LEVEL_MAX 0x7f
+
 #if !defined(DOXYGEN_SHOULD_SKIP_THIS)
 void log_init(int fd);
 void log_msg(int level, const char *format, ...);
@@ -0,0 +1,242 @@
+/**
+ * @addtogroup shm
+ * @{
+ * @file common/shm.c
+ * @brief Silverline Shared Memory Transport.
+ */
+
+#include <sys/mman.h>
+#include <sys/socket.h>
+#include <sys/eventfd.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <poll.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#include "shm.h"
+
+/** Poll interval (ms) while waiting for space in the outbound ring. */
+#define SLSHM_POLL_MS 10
+
+/** Frame size including header, padded to 8 bytes. */
+static uint64_t slshm_frame_size(uint32_t payloadlen) {
+    return (HEADER_SIZE_V2 + (uint64_t) payloadlen + 7) & ~((uint64_t) 7);
+}
+
+/**
+ * @brief Connect to manager and map shared memory.
+ * @param runtime runtime index.
+ * @param module module index.
+ * @return Connection, or NULL on error.
+ */
+slshm_t *slshm_open(int runtime, int module) {
+    int sock = slsocket_connect(runtime, module);
+    if (sock < 0) { return NULL; }
+
+    char buf[4096];
+    char control[CMSG_SPACE(4 * sizeof(int))];
+    struct iovec iov = { .iov_base = buf, .iov_len = sizeof(buf) - 1 };
+    struct msghdr hdr = {
+        .msg_iov = &iov, .msg_iovlen = 1,
+        .msg_control = control, .msg_controllen = sizeof(control)
+    };
+    ssize_t len = recvmsg(sock, &hdr, 0);
+    struct cmsghdr *cmsg = CMSG_FIRSTHDR(&hdr);
+    if (len < (ssize_t) sizeof(uint32_t) || cmsg == NULL
+            || cmsg->cmsg_type != SCM_RIGHTS) {
+        close(sock);
+        return NULL;
+    }
+    buf[len] = '\0';
+
+    slshm_t *shm = malloc(sizeof(slshm_t));
+    shm->sock = sock;
+    shm->mem = NULL;
+    memcpy(&shm->capacity, buf, sizeof(uint32_t));
+    int efds[4];
+    memcpy(efds, CMSG_DATA(cmsg), sizeof(efds));
+    /* Runtime reads ring 0 and writes ring 1. */
+    shm->in_ready = efds[0];
+    shm->in_space = efds[1];
+    shm->out_ready = efds[2];
+    shm->out_space = efds[3];
+
+    size_t size = 2 * (SLSHM_RING_HEADER + (size_t) shm->capacity);
+    int fd = open(&buf[sizeof(uint32_t)], O_RDWR);
+    if (fd < 0) {
+        slshm_close(shm);
+        return NULL;
+    }
+    shm->mem = mmap(NULL, size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    close(fd);
+    if (shm->mem == MAP_FAILED) {
+        shm->mem = NULL;
+        slshm_close(shm);
+        return NULL;
+    }
+    shm->in = (slshm_ring_t *) shm->mem;
+    shm->out = (slshm_ring_t *) (
+        shm->mem + SLSHM_RING_HEADER + shm->capacity);
+    return shm;
+}
+
+/**
+ * @brief Wait for an eventfd to be signalled.
+ * @return false if the manager disconnected or the timeout expired.
+ */
+static bool slshm_wait(slshm_t *shm, int efd, int timeout_ms) {
+    uint64_t count;
+    if (read(efd, &count, sizeof(count)) == sizeof(count)) { return true; }
+
+    struct pollfd fds[2] = {
+        { .fd = efd, .events = POLLIN }, { .fd = shm->sock, .events = POLLIN }
+    };
+    int res = poll(fds, 2, timeout_ms);
+    if (res < 0 && errno == EINTR) { return true; }
+    if (res <= 0 || fds[1].revents != 0) { return false; }
+    read(efd, &count, sizeof(count));
+    return true;
+}
+
+/**
+ * @brief Read message from shared memory; blocks until available.
+ * @param shm Connection.
+ * @return Message read (free with `slsocket_free`), or NULL on disconnect.
+ */
+message_t *slshm_read(slshm_t *shm) {
+    char *data = (char *) shm->in + SLSHM_RING_HEADER;
+    uint64_t head = shm->in->head;
+    while (1) {
+        uint64_t tail = __atomic_load_n(&shm->in->tail, __ATOMIC_ACQUIRE);
+        if (head == tail) {
+            /* Frames published before a hangup are still drained. */
+            if (!slshm_wait(shm, shm->in_ready, -1) && head == __atomic_load_n(
+                    &shm->in->tail, __ATOMIC_ACQUIRE)) {
+                return NULL;
+            }
+            continue;
+        }
+
+        char *frame = data + head % shm->capacity;
+        uint32_t payloadlen;
+        memcpy(&payloadlen, frame, sizeof(uint32_t));
+        if (payloadlen == SLSHM_PAD) {
+            head += shm->capacity - head % shm->capacity;
+            __atomic_store_n(&shm->in->head, head, __ATOMIC_RELEASE);
+            continue;
+        }
+
+        message_t *msg = malloc(sizeof(message_t));
+        slsocket_unpack(frame, msg, 2);
+        msg->payload = malloc(payloadlen);
+        memcpy(msg->payload, frame + HEADER_SIZE_V2, payloadlen);
+
+        head += slshm_frame_size(payloadlen);
+        __atomic_store_n(&shm->in->head, head, __ATOMIC_SEQ_CST);
+        if (__atomic_exchange_n(&shm->in->waiting, 0, __ATOMIC_SEQ_CST)) {
+            uint64_t one = 1;
+            write(shm->in_space, &one, sizeof(one));
+        }
+        return msg;
+    }
+}
+
+/**
+ * @brief Publish outbound tail and signal the manager.
+ */
+static void slshm_publish(slshm_t *shm, uint64_t tail) {
+    if (tail != shm->out->tail) {
+        __atomic_store_n(&shm->out->tail, tail, __ATOMIC_RELEASE);
+        uint64_t one = 1;
+        write(shm->out_ready, &one, sizeof(one));
+    }
+}
+
+/**
+ * @brief Write several messages; the manager is signalled once per batch.
+ * @param shm Connection.
+ * @param msgs Array of messages to write. Have header values already set.
+ * @param nmsgs Number of messages.
+ * @return false if a message is too large or the manager disconnected.
+ */
+bool slshm_write_many(slshm_t *shm, message_t *msgs, int nmsgs) {
+    char *data = (char *) shm->out + SLSHM_RING_HEADER;
+    uint64_t tail = shm->out->tail;
+    bool res = true;
+    for (int i = 0; i < nmsgs && res; i++) {
+        uint64_t size = slshm_frame_size(msgs[i].payloadlen);
+        if (size > shm->capacity / 2) { res = false; break; }
+
+        uint64_t remaining = shm->capacity - tail % shm->capacity;
+        uint64_t pad = remaining < size ? remaining : 0;
+        while (shm->capacity - (tail - __atomic_load_n(
+                &shm->out->head, __ATOMIC_SEQ_CST)) < pad + size) {
+            slshm_publish(shm, tail);
+            __atomic_store_n(&shm->out->waiting, 1, __ATOMIC_SEQ_CST);
+            if (!slshm_wait(shm, shm->out_space, SLSHM_POLL_MS)) {
+                struct pollfd hup = { .fd = shm->sock, .events = POLLIN };
+                if (poll(&hup, 1, 0) != 0) { res = false; break; }
+            }
+        }
+        if (!res) { break; }
+
+        if (pad > 0) {
+            uint32_t marker = SLSHM_PAD;
+            memcpy(data + tail % shm->capacity, &marker, sizeof(uint32_t));
+            tail += pad;
+        }
+        char *frame = data + tail % shm->capacity;
+        slsocket_pack(frame, &msgs[i], 2);
+        memcpy(frame + HEADER_SIZE_V2, msgs[i].payload, msgs[i].payloadlen);
+        tail += size;
+    }
+    slshm_publish(shm, tail);
+    return res;
+}
+
+/**
+ * @brief Write message to shared memory.
+ * @param shm Connection.
+ * @param msg Message to write. Has header values already set.
+ */
+bool slshm_write(slshm_t *shm, message_t *msg) {
+    return slshm_write_many(shm, msg, 1);
+}
+
+/**
+ * @brief Write buffer (non-msg version of slshm_write).
+ * @param shm Connection.
+ * @param h1 First header value.
+ * @param h2 Second header value.
+ * @param payload Message payload.
+ * @param payloadlen Length of payload buffer.
+ */
+bool slshm_rwrite(
+        slshm_t *shm, int h1, int h2, char *payload, int payloadlen) {
+    message_t msg;
+    msg.h1 = h1;
+    msg.h2 = h2;
+    msg.flags = 0;
+    msg.payload = payload;
+    msg.payloadlen = payloadlen;
+    return slshm_write(shm, &msg);
+}
+
+/**
+ * @brief Close connection and unmap shared memory.
+ */
+void slshm_close(slshm_t *shm) {
+    if (shm->mem != NULL) {
+        munmap(shm->mem, 2 * (SLSHM_RING_HEADER + (size_t) shm->capacity));
+    }
+    close(shm->in_ready);
+    close(shm->in_space);
+    close(shm->out_ready);
+    close(shm->out_space);
+    close(shm->sock);
+    free(shm);
+}
+
+/** @} */
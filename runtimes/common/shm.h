@@ -0,0 +1,73 @@
+/**
+ * @defgroup shm
+ * 
+ * Shared memory ring buffer transport; an alternative to `sockets` for
+ * high-rate runtimes. See `libsilverline.shm.SLSharedMemory` for the
+ * memory layout and handshake.
+ * 
+ * @{
+ * @file common/shm.h
+ * @brief Silverline Shared Memory Transport.
+ */
+
+#include <stdbool.h>
+#include <stdint.h>
+
+#include "sockets.h"
+
+#ifndef COMMON_SHM_H
+#define COMMON_SHM_H
+
+/** Size of each ring header (head, tail, waiting on separate lines). */
+#define SLSHM_RING_HEADER 192
+/** Frame length indicating padding to the end of the ring. */
+#define SLSHM_PAD 0xffffffff
+
+/**
+ * @brief Ring buffer header, shared between processes.
+ */
+typedef struct {
+    /** Consumer position (bytes, monotonic). */
+    uint64_t head;
+    char _pad0[56];
+    /** Producer position (bytes, monotonic). */
+    uint64_t tail;
+    char _pad1[56];
+    /** Set by the producer when waiting for space. */
+    uint64_t waiting;
+    char _pad2[56];
+} slshm_ring_t;
+
+/**
+ * @brief Shared memory connection (runtime side).
+ */
+typedef struct {
+    /** AF_UNIX socket used for the handshake and disconnect detection. */
+    int sock;
+    /** Ring size in bytes. */
+    uint32_t capacity;
+    /** Mapped shared memory. */
+    char *mem;
+    /** Inbound (manager -> runtime) ring. */
+    slshm_ring_t *in;
+    /** Outbound (runtime -> manager) ring. */
+    slshm_ring_t *out;
+    /** Inbound ring: data ready / space available eventfds. */
+    int in_ready, in_space;
+    /** Outbound ring: data ready / space available eventfds. */
+    int out_ready, out_space;
+} slshm_t;
+
+#if !defined(DOXYGEN_SHOULD_SKIP_THIS)
+slshm_t *slshm_open(int runtime, int module);
+message_t *slshm_read(slshm_t *shm);
+bool slshm_write_many(slshm_t *shm, message_t *msgs, int nmsgs);
+bool slshm_write(slshm_t *shm, message_t *msg);
+bool slshm_rwrite(
+    slshm_t *shm, int h1, int h2, char *payload, int payloadlen);
+void slshm_close(slshm_t *shm);
+#endif
+
+#endif
+
+/** @} */
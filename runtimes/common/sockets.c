@@ -6,19 +6,35 @@
  */
 
 #include <sys/socket.h>
+#include <sys/uio.h>
 #include <sys/un.h>
+#include <errno.h>
 #include <stdlib.h>
 #include <stdio.h>
+#include <string.h>
+#include <unistd.h>
 
 #include "sockets.h"
 
+/** Negotiated read/write protocol versions by file descriptor (0 = v1). */
+static uint8_t slsocket_rversion[SLSOCKET_MAX_FD];
+static uint8_t slsocket_wversion[SLSOCKET_MAX_FD];
+
+static int slsocket_version(uint8_t *versions, int fd) {
+    return (fd < SLSOCKET_MAX_FD && versions[fd] == 2) ? 2 : 1;
+}
+
 /**
- * @brief Connect to Silverline manager socket.
+ * @brief Connect to Silverline manager socket without negotiating.
+ * 
+ * The connection uses protocol v1; used directly by transports which only
+ * use the socket for setup (i.e. shared memory).
+ * 
  * @param runtime runtime index.
  * @param module module index.
  * @return Socket file descriptor, or -1 on error.
  */
-int slsocket_open(int runtime, int module) {
+int slsocket_connect(int runtime, int module) {
     int fd = socket(AF_UNIX, SOCK_STREAM, 0);
     if (fd < 0) { return fd; }
 
@@ -32,32 +48,148 @@ int slsocket_open(int runtime, int module) {
     }
 
     int res = connect(fd, (const struct sockaddr *) &addr, sizeof(addr));
-    if (res < 0) { return res; }
-    else { return fd; }
+    if (res < 0) {
+        close(fd);
+        return res;
+    }
+    if (fd < SLSOCKET_MAX_FD) {
+        slsocket_rversion[fd] = 0;
+        slsocket_wversion[fd] = 0;
+    }
+    return fd;
+}
+
+/**
+ * @brief Connect to Silverline manager socket.
+ * 
+ * Requests protocol `SLSOCKET_VERSION` from the manager; messages are
+ * written using the new version immediately, and read using it once the
+ * manager replies.
+ * 
+ * @param runtime runtime index.
+ * @param module module index.
+ * @return Socket file descriptor, or -1 on error.
+ */
+int slsocket_open(int runtime, int module) {
+    int fd = slsocket_connect(runtime, module);
+    if (fd < 0 || fd >= SLSOCKET_MAX_FD) { return fd; }
+
+    char version = SLSOCKET_VERSION;
+    slsocket_rwrite(fd, H_CONTROL, H_HELLO, &version, 1);
+    slsocket_wversion[fd] = SLSOCKET_VERSION;
+    return fd;
+}
+
+/**
+ * @brief Encode message header.
+ * @param buf Output buffer; must have space for `HEADER_SIZE_V2` bytes.
+ * @param msg Message to encode.
+ * @param version Protocol version.
+ * @return Size of header.
+ */
+size_t slsocket_pack(char *buf, message_t *msg, int version) {
+    memcpy(buf, &msg->payloadlen, sizeof(uint32_t));
+    if (version == 2) {
+        memcpy(buf + 4, &msg->h1, sizeof(uint16_t));
+        memcpy(buf + 6, &msg->h2, sizeof(uint16_t));
+        buf[8] = msg->flags;
+        buf[9] = 0;
+        return HEADER_SIZE_V2;
+    } else {
+        buf[4] = (char) ((msg->h1 & 0x7f) | ((msg->h1 & H_CONTROL) ? 0x80 : 0));
+        buf[5] = (char) msg->h2;
+        return HEADER_SIZE_V1;
+    }
+}
+
+/**
+ * @brief Decode message header.
+ * @param buf Header bytes.
+ * @param msg Message to write header values to.
+ * @param version Protocol version.
+ */
+void slsocket_unpack(char *buf, message_t *msg, int version) {
+    memcpy(&msg->payloadlen, buf, sizeof(uint32_t));
+    if (version == 2) {
+        memcpy(&msg->h1, buf + 4, sizeof(uint16_t));
+        memcpy(&msg->h2, buf + 6, sizeof(uint16_t));
+        msg->flags = buf[8];
+    } else {
+        uint8_t h1 = buf[4];
+        msg->h1 = (h1 & 0x7f) | ((h1 & 0x80) ? H_CONTROL : 0);
+        msg->h2 = (uint8_t) buf[5];
+        msg->flags = 0;
+    }
 }
 
 /**
  * @brief Read message from socket.
+ * 
+ * Version negotiation replies from the manager are handled here, and are
+ * not returned.
+ * 
  * @param fd File descriptor of socket.
- * @return Message read.
+ * @return Message read, or NULL if the connection was closed.
  */
 message_t *slsocket_read(int fd) {
-    message_t *msg = malloc(sizeof(message_t));
-    if(recv(fd, (char *) msg, HEADER_SIZE, MSG_WAITALL) < HEADER_SIZE) {
-        free(msg);
-        return NULL;
-    };
-
-    int payloadlen = msg->payloadlen;
-    msg->payload = malloc(payloadlen);
-    char *head = msg->payload;
-    while (payloadlen > 0) {
-        int recv_tgt = payloadlen < 4096 ? payloadlen : 4096;
-        int recv_size = recv(fd, head, recv_tgt, MSG_WAITALL);
-        payloadlen -= recv_size;
-        head += recv_size;
+    while (true) {
+        int version = slsocket_version(slsocket_rversion, fd);
+        size_t size = version == 2 ? HEADER_SIZE_V2 : HEADER_SIZE_V1;
+        char header[HEADER_SIZE_V2];
+        if (recv(fd, header, size, MSG_WAITALL) < (ssize_t) size) {
+            return NULL;
+        }
+
+        message_t *msg = malloc(sizeof(message_t));
+        slsocket_unpack(header, msg, version);
+
+        int payloadlen = msg->payloadlen;
+        msg->payload = malloc(payloadlen);
+        char *head = msg->payload;
+        while (payloadlen > 0) {
+            int recv_tgt = payloadlen < 4096 ? payloadlen : 4096;
+            int recv_size = recv(fd, head, recv_tgt, MSG_WAITALL);
+            if (recv_size <= 0) {
+                slsocket_free(msg);
+                return NULL;
+            }
+            payloadlen -= recv_size;
+            head += recv_size;
+        }
+
+        if (msg->h1 == H_CONTROL && msg->h2 == H_HELLO
+                && msg->payloadlen > 0 && fd < SLSOCKET_MAX_FD) {
+            slsocket_rversion[fd] = msg->payload[0];
+            slsocket_free(msg);
+            continue;
+        }
+        return msg;
+    }
+}
+
+/**
+ * @brief Write all buffers to socket, resuming after partial writes.
+ * @param fd File descriptor of socket.
+ * @param iov Buffers to write; modified in place.
+ * @param iovcnt Number of buffers.
+ */
+static void slsocket_writev(int fd, struct iovec *iov, int iovcnt) {
+    while (iovcnt > 0) {
+        ssize_t sent = writev(fd, iov, iovcnt);
+        if (sent < 0) {
+            if (errno == EINTR) { continue; }
+            return;
+        }
+        while (iovcnt > 0 && (size_t) sent >= iov->iov_len) {
+            sent -= iov->iov_len;
+            iov++;
+            iovcnt--;
+        }
+        if (iovcnt > 0) {
+            iov->iov_base = (char *) iov->iov_base + sent;
+            iov->iov_len -= sent;
+        }
     }
-    return msg;
 }
 
 /**
@@ -66,8 +198,142 @@ message_t *slsocket_read(int fd) {
  * @param msg Message to write. Has header values already set.
  */
 void slsocket_write(int fd, message_t *msg) {
-    send(fd, (char *) msg, HEADER_SIZE, 0);
-    send(fd, msg->payload, msg->payloadlen, 0);
+    slsocket_write_many(fd, msg, 1);
+}
+
+/**
+ * @brief Write several messages to socket.
+ * 
+ * Headers and payloads are gathered into one `writev` call for every
+ * `SLSOCKET_BATCH` messages.
+ * 
+ * @param fd File descriptor of socket.
+ * @param msgs Array of messages to write. Have header values already set.
+ * @param nmsgs Number of messages.
+ */
+void slsocket_write_many(int fd, message_t *msgs, int nmsgs) {
+    int version = slsocket_version(slsocket_wversion, fd);
+    struct iovec iov[2 * SLSOCKET_BATCH];
+    char headers[SLSOCKET_BATCH][HEADER_SIZE_V2];
+    for (int i = 0; i < nmsgs; i += SLSOCKET_BATCH) {
+        int iovcnt = 0;
+        for (int j = i; j < nmsgs && j < i + SLSOCKET_BATCH; j++) {
+            iov[iovcnt].iov_base = headers[j - i];
+            iov[iovcnt].iov_len = slsocket_pack(
+                headers[j - i], &msgs[j], version);
+            iovcnt++;
+            if (msgs[j].payloadlen > 0) {
+                iov[iovcnt].iov_base = msgs[j].payload;
+                iov[iovcnt].iov_len = msgs[j].payloadlen;
+                iovcnt++;
+            }
+        }
+        slsocket_writev(fd, iov, iovcnt);
+    }
+}
+
+/**
+ * @brief Write several messages to socket as batch messages.
+ * 
+ * Messages are sent inside `H_BATCH` control messages (up to
+ * `SLSOCKET_BATCH` messages each), which the manager unpacks and handles as
+ * if they were sent individually; each message is encoded with a v2 header
+ * regardless of the negotiated protocol version. Use this to send many small
+ * messages (i.e. channel publishes) with less framing overhead than
+ * `slsocket_write_many`.
+ * 
+ * @param fd File descriptor of socket.
+ * @param msgs Array of messages to write. Have header values already set.
+ * @param nmsgs Number of messages.
+ */
+void slsocket_write_batch(int fd, message_t *msgs, int nmsgs) {
+    int version = slsocket_version(slsocket_wversion, fd);
+    struct iovec iov[1 + 2 * SLSOCKET_BATCH];
+    char headers[1 + SLSOCKET_BATCH][HEADER_SIZE_V2];
+    for (int i = 0; i < nmsgs; i += SLSOCKET_BATCH) {
+        message_t batch = {
+            .payloadlen = 0, .h1 = H_CONTROL, .h2 = H_BATCH, .flags = 0 };
+        int iovcnt = 1;
+        for (int j = i; j < nmsgs && j < i + SLSOCKET_BATCH; j++) {
+            char *header = headers[1 + j - i];
+            iov[iovcnt].iov_base = header;
+            iov[iovcnt].iov_len = slsocket_pack(header, &msgs[j], 2);
+            batch.payloadlen += iov[iovcnt].iov_len + msgs[j].payloadlen;
+            iovcnt++;
+            if (msgs[j].payloadlen > 0) {
+                iov[iovcnt].iov_base = msgs[j].payload;
+                iov[iovcnt].iov_len = msgs[j].payloadlen;
+                iovcnt++;
+            }
+        }
+        iov[0].iov_base = headers[0];
+        iov[0].iov_len = slsocket_pack(headers[0], &batch, version);
+        slsocket_writev(fd, iov, iovcnt);
+    }
+}
+
+/**
+ * @brief Decode the next message contained in a batch message.
+ * 
+ * The decoded message's payload points into the batch message's payload,
+ * and must not be freed.
+ * 
+ * @param batch Batch message (`H_BATCH`).
+ * @param offset Offset into the batch payload; should start at 0, and is
+ *      advanced past the decoded message.
+ * @param msg Decoded message.
+ * @return false if there are no more (complete) messages in the batch.
+ */
+bool slsocket_unbatch(message_t *batch, size_t *offset, message_t *msg) {
+    if (*offset + HEADER_SIZE_V2 > batch->payloadlen) { return false; }
+    slsocket_unpack(batch->payload + *offset, msg, 2);
+    size_t end = *offset + HEADER_SIZE_V2 + msg->payloadlen;
+    if (end > batch->payloadlen) { return false; }
+    msg->payload = batch->payload + *offset + HEADER_SIZE_V2;
+    *offset = end;
+    return true;
+}
+
+/**
+ * @brief Get the number of targets in a multicast message.
+ * 
+ * Multicast messages (`H_MULTICAST`, from the manager) carry one channel
+ * message payload for several (module, channel) targets:
+ * `[n:2][module:2][fd:2] ... [payload]`.
+ * 
+ * @param multicast Multicast message.
+ * @return Number of targets, or 0 if the message is truncated.
+ */
+int slsocket_multicast_count(message_t *multicast) {
+    if (multicast->payloadlen < 2) { return 0; }
+    uint16_t n;
+    memcpy(&n, multicast->payload, sizeof(n));
+    if (2 + 4 * (size_t) n > multicast->payloadlen) { return 0; }
+    return n;
+}
+
+/**
+ * @brief Decode the message for one target of a multicast message.
+ * 
+ * The decoded message's payload points into the multicast message's
+ * payload (shared by all targets), and must not be freed.
+ * 
+ * @param multicast Multicast message (`H_MULTICAST`).
+ * @param i Target index, from 0 to `slsocket_multicast_count`.
+ * @param msg Decoded message; `h1` is the module and `h2` the channel.
+ * @return false if there is no such target.
+ */
+bool slsocket_unmulticast(message_t *multicast, int i, message_t *msg) {
+    int n = slsocket_multicast_count(multicast);
+    if (i < 0 || i >= n) { return false; }
+    uint16_t target[2];
+    memcpy(target, multicast->payload + 2 + 4 * i, sizeof(target));
+    msg->h1 = target[0];
+    msg->h2 = target[1];
+    msg->flags = 0;
+    msg->payload = multicast->payload + 2 + 4 * n;
+    msg->payloadlen = multicast->payloadlen - (2 + 4 * n);
+    return true;
 }
 
 /**
@@ -82,6 +348,7 @@ void slsocket_rwrite(int fd, int h1, int h2, char *payload, int payloadlen) {
     message_t msg;
     msg.h1 = h1;
     msg.h2 = h2;
+    msg.flags = 0;
     msg.payload = payload;
     msg.payloadlen = payloadlen;
     slsocket_write(fd, &msg);
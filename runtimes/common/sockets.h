@@ -9,6 +9,7 @@
  * @brief Silverline Sockets Implementation.
  */
 
+#include <stdbool.h>
 #include <stdint.h>
 #include <stddef.h>
 
@@ -22,41 +23,71 @@
 #define H_CH_CLOSE    0x04
 #define H_LOG_MODULE  0x05
 #define H_PROFILE     0x06
+#define H_HELLO       0x07
+#define H_BATCH       0x08
+#define H_MULTICAST   0x09
 
 #define H_CREATE      0x00
 #define H_DELETE      0x01
 #define H_STOP        0x02
 
-#define H_CONTROL     0x80
-#define H_INDEX       0x7f
+#define H_CONTROL     0x8000
+#define H_INDEX       0x7fff
+
+#define H_FLAG_WIDE     0x01
+#define H_FLAG_INTERVAL 0x02
 
 #define CH_RDONLY     0x01
 #define CH_WRONLY     0x02
 #define CH_RDWR       0x03
 
 #define CH_QOS0       0x00
-#define CH_QOS1       0x40
-#define CH_QOS2       0x80
+#define CH_QOS1       0x04
+#define CH_QOS2       0x08
+
+#define CH_LOCAL      0x10
+#define CH_CONFLATE   0x20
 
 /**
  * @brief Silverline manager message; see runtime-manager for documentation.
  * 
- * Payloadlen, h1, and h2 are packed contiguously so that the first bytes
- * of `(char *) message_t` correspond to the packet header.
+ * Headers are encoded on the wire using protocol v1 (8-bit h1, h2) or v2
+ * (16-bit h1, h2, and flags), depending on the negotiated version.
  */
-typedef struct __attribute__((__packed__)) {
+typedef struct {
     uint32_t payloadlen;
-    uint8_t h1;
-    uint8_t h2;
+    uint16_t h1;
+    uint16_t h2;
+    uint8_t flags;
     char *payload;
 } message_t;
 
-#define HEADER_SIZE (offsetof(message_t, payload))
+/** Protocol v1 header: [len:4][h1:1][h2:1] */
+#define HEADER_SIZE_V1 6
+/** Protocol v2 header: [len:4][h1:2][h2:2][flags:1][-:1] */
+#define HEADER_SIZE_V2 10
+
+/** Protocol version requested by `slsocket_open`. */
+#define SLSOCKET_VERSION 2
+
+/** Sockets with file descriptors past this limit always use protocol v1. */
+#define SLSOCKET_MAX_FD 1024
+
+/** Maximum number of messages gathered into a single `writev` call. */
+#define SLSOCKET_BATCH 64
 
 #if !defined(DOXYGEN_SHOULD_SKIP_THIS)
+int slsocket_connect(int runtime, int module);
 int slsocket_open(int runtime, int module);
+size_t slsocket_pack(char *buf, message_t *msg, int version);
+void slsocket_unpack(char *buf, message_t *msg, int version);
 message_t *slsocket_read(int fd);
 void slsocket_write(int fd, message_t *msg);
+void slsocket_write_many(int fd, message_t *msgs, int nmsgs);
+void slsocket_write_batch(int fd, message_t *msgs, int nmsgs);
+bool slsocket_unbatch(message_t *batch, size_t *offset, message_t *msg);
+int slsocket_multicast_count(message_t *multicast);
+bool slsocket_unmulticast(message_t *multicast, int i, message_t *msg);
 void slsocket_rwrite(int fd, int h1, int h2, char *payload, int payloadlen);
 void slsocket_free(message_t *msg);
 #endif
@@ -0,0 +1,144 @@
+/**
+ * @defgroup ipc-bench
+ * 
+ * Manager <-> runtime IPC benchmark peer; C equivalent of
+ * `runtimes/ipc_bench.py`. See `tools/ipc.py` for the message protocol.
+ * 
+ * Usage: `ipc-bench <runtime index> [protocol version]`; the transport is
+ * selected by the `SL_TRANSPORT` environment variable (`socket` or `shm`).
+ * 
+ * @{
+ * @file main.c
+ * @brief IPC benchmark peer.
+ */
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#include "sockets.h"
+#include "shm.h"
+
+#define ECHO   0x00
+#define SINK   0x01
+#define SYNC   0x02
+#define SOURCE 0x03
+
+/** Transport connection; exactly one of `fd`, `shm` is used. */
+typedef struct {
+    int fd;
+    slshm_t *shm;
+} peer_t;
+
+static message_t *peer_read(peer_t *peer) {
+    if (peer->shm != NULL) { return slshm_read(peer->shm); }
+    return slsocket_read(peer->fd);
+}
+
+static void peer_write_many(peer_t *peer, message_t *msgs, int nmsgs) {
+    if (peer->shm != NULL) {
+        slshm_write_many(peer->shm, msgs, nmsgs);
+    } else {
+        slsocket_write_many(peer->fd, msgs, nmsgs);
+    }
+}
+
+static void peer_write(peer_t *peer, uint16_t h2, char *payload, int len) {
+    message_t msg = {
+        .payloadlen = len, .h1 = 0x00, .h2 = h2, .flags = 0,
+        .payload = payload};
+    peer_write_many(peer, &msg, 1);
+}
+
+/**
+ * @brief Send `count` messages of `size` bytes in batches, then sync.
+ */
+static void source(peer_t *peer, message_t *req) {
+    uint32_t args[3];
+    if (req->payloadlen < sizeof(args)) { return; }
+    memcpy(args, req->payload, sizeof(args));
+    uint32_t count = args[0], size = args[1], batch = args[2];
+    if (batch == 0) { batch = 1; }
+
+    char *data = calloc(size > 0 ? size : 1, 1);
+    message_t *msgs = malloc(batch * sizeof(message_t));
+    for (uint32_t i = 0; i < batch; i++) {
+        msgs[i] = (message_t) {
+            .payloadlen = size, .h1 = 0x00, .h2 = SINK, .flags = 0,
+            .payload = data};
+    }
+    for (uint32_t i = 0; i < count; i += batch) {
+        uint32_t n = count - i < batch ? count - i : batch;
+        peer_write_many(peer, msgs, n);
+    }
+    peer_write(peer, SYNC, NULL, 0);
+    free(msgs);
+    free(data);
+}
+
+/**
+ * @brief Handle a channel message; returns the updated sink count.
+ */
+static uint32_t handle(peer_t *peer, message_t *msg, uint32_t received) {
+    switch (msg->h2) {
+        case ECHO: peer_write_many(peer, msg, 1); break;
+        case SINK: received++; break;
+        case SYNC:
+            peer_write(peer, SYNC, (char *) &received, sizeof(received));
+            received = 0;
+            break;
+        case SOURCE: source(peer, msg); break;
+        default: break;
+    }
+    return received;
+}
+
+int main(int argc, char **argv) {
+    if (argc < 2) {
+        fprintf(stderr, "Usage: %s <runtime> [version]\n", argv[0]);
+        return 1;
+    }
+    int index = atoi(argv[1]);
+    int version = argc > 2 ? atoi(argv[2]) : SLSOCKET_VERSION;
+
+    peer_t peer = { .fd = -1, .shm = NULL };
+    char *transport = getenv("SL_TRANSPORT");
+    if (transport != NULL && strcmp(transport, "shm") == 0) {
+        peer.shm = slshm_open(index, -1);
+        if (peer.shm == NULL) { return 1; }
+    } else {
+        peer.fd = version == 1
+            ? slsocket_connect(index, -1) : slsocket_open(index, -1);
+        if (peer.fd < 0) { return 1; }
+    }
+
+    uint32_t received = 0;
+    while (true) {
+        message_t *msg = peer_read(&peer);
+        if (msg == NULL) { break; }
+        if ((msg->h1 & H_CONTROL) && msg->h2 == H_MULTICAST) {
+            message_t target;
+            for (int i = 0; slsocket_unmulticast(msg, i, &target); i++) {
+                received = handle(&peer, &target, received);
+            }
+        } else if (msg->h1 & H_CONTROL) {
+            slsocket_free(msg);
+            break;
+        } else {
+            received = handle(&peer, msg, received);
+        }
+        slsocket_free(msg);
+    }
+
+    if (peer.shm != NULL) {
+        slshm_close(peer.shm);
+    } else {
+        close(peer.fd);
+    }
+    return 0;
+}
+
+/** @} */
@@ -0,0 +1,70 @@
+"""Manager <-> runtime IPC benchmark peer.
+
+Runtime side of ``manage.py ipc``; see `tools/ipc.py` for the message
+protocol. `runtimes/ipc-bench` implements the same peer in C.
+"""
+
+import os
+import sys
+import struct
+
+from libsilverline import Message, Header, connect
+
+
+ECHO = 0x00
+SINK = 0x01
+SYNC = 0x02
+SOURCE = 0x03
+
+
+class IPCBenchPeer:
+    """Echo/sink/source peer for transport benchmarking."""
+
+    def __init__(self, index: int, version: int = 2) -> None:
+        kwargs = {}
+        if os.environ.get("SL_TRANSPORT", "socket") == "socket":
+            kwargs["version"] = version
+        self.socket = connect(index, timeout=60., **kwargs)
+        self.received = 0
+
+    def source(self, payload: bytes) -> None:
+        """Send ``count`` messages of ``size`` bytes, then a sync message."""
+        count, size, batch = struct.unpack("III", payload)
+        data = bytes(size)
+        for i in range(0, count, batch):
+            self.socket.write_many(
+                [Message(0x00, SINK, data)] * min(batch, count - i))
+        self.socket.write(Message(0x00, SYNC, bytes()))
+
+    def handle(self, msg: Message) -> None:
+        """Handle channel message."""
+        if msg.h2 == ECHO:
+            self.socket.write(msg)
+        elif msg.h2 == SINK:
+            self.received += 1
+        elif msg.h2 == SYNC:
+            self.socket.write(Message(
+                0x00, SYNC, struct.pack("I", self.received)))
+            self.received = 0
+        elif msg.h2 == SOURCE:
+            self.source(bytes(msg.payload))
+
+    def loop(self) -> None:
+        """Main loop; exits on stop or disconnect."""
+        while True:
+            msg = self.socket.read()
+            if msg is None:
+                return
+            if msg.h1 & Header.control and msg.h2 == Header.multicast:
+                for target in msg.unmulticast():
+                    self.handle(target)
+            elif msg.h1 & Header.control:
+                return
+            else:
+                self.handle(msg)
+
+
+if __name__ == '__main__':
+    IPCBenchPeer(
+        int(sys.argv[1]),
+        version=int(sys.argv[2]) if len(sys.argv) > 2 else 2).loop()
@@ -71,7 +71,7 @@ int main(int argc, char **argv) {
     while (1) {
         message_t *msg = slsocket_read(runtime.socket);
         if (msg != NULL) {
-            if ((msg->h1 & H_CONTROL) != 0) {
+            if ((msg->h1 & H_CONTROL) != 0 && msg->h2 == H_CREATE) {
                 log_msg(
                     L_DBG, "Runtime received message: %.*s",
                     msg->payloadlen, msg->payload);
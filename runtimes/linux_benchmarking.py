@@ -7,7 +7,7 @@ import threading
 import struct
 import signal
 
-from libsilverline import Message, SLSocket, Header
+from libsilverline import Message, Header, connect
 from common import make_command, run_and_wait
 
 
@@ -15,7 +15,7 @@ class LinuxBenchmarkingRuntime:
     """Mimimal linux benchmarking runtime."""
 
     def __init__(self, index: int) -> None:
-        self.socket = SLSocket(index, server=False, timeout=5.)
+        self.socket = connect(index, timeout=5.)
         self.process = -1
 
     def _run(self, cmd):
@@ -74,7 +74,7 @@ class LinuxBenchmarkingRuntime:
     def run(self, msg):
         """Run program."""
         self.stop = False
-        data = json.loads(msg.payload)
+        data = json.loads(bytes(msg.payload))
 
         args = data.get("args", {})
 
@@ -90,10 +90,10 @@ class LinuxBenchmarkingRuntime:
 
         stats = self._run_loop(data.get("file"), args, repeat, repeat_mode)
 
-        self.socket.write(Message(
-            Header.control | 0x00, Header.profile, stats))
-        self.socket.write(Message.from_dict(
-            Header.control | 0x00, Header.exited, {"status": "exited"}))
+        self.socket.write_many([
+            Message(Header.control | 0x00, Header.profile, stats),
+            Message.from_dict(
+                Header.control | 0x00, Header.exited, {"status": "exited"})])
 
     def handle_message(self, msg: Message) -> None:
         """Handle message from manager."""
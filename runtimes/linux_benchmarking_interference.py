@@ -7,7 +7,7 @@ import threading
 import signal
 from multiprocessing.pool import ThreadPool
 
-from libsilverline import Message, SLSocket, Header
+from libsilverline import Message, Header, connect
 from common import make_command, run_and_wait
 
 
@@ -15,7 +15,7 @@ class LinuxBenchmarkingRuntime:
     """Mimimal linux benchmarking runtime."""
 
     def __init__(self, index):
-        self.socket = SLSocket(index, server=False, timeout=5.)
+        self.socket = connect(index, timeout=5.)
         self.process = []
         self.done = False
 
@@ -63,7 +63,7 @@ class LinuxBenchmarkingRuntime:
     def run(self, msg):
         """Run program."""
         self.stop = False
-        data = json.loads(msg.payload)
+        data = json.loads(bytes(msg.payload))
 
         args = data.get("args", {})
 
@@ -74,10 +74,10 @@ class LinuxBenchmarkingRuntime:
 
         stats = self.__run(files, cmds, args.get("limit", 60.0))
 
-        self.socket.write(Message.from_dict(
-            Header.control | 0x00, Header.profile, stats))
-        self.socket.write(Message.from_dict(
-            Header.control | 0x00, Header.exited, {"status": "exited"}))
+        self.socket.write_many([
+            Message.from_dict(Header.control | 0x00, Header.profile, stats),
+            Message.from_dict(
+                Header.control | 0x00, Header.exited, {"status": "exited"})])
 
     def handle_message(self, msg: Message) -> None:
         """Handle message from manager."""
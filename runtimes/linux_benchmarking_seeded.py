@@ -9,7 +9,7 @@ import signal
 import random
 import subprocess
 
-from libsilverline import Message, SLSocket, Header
+from libsilverline import Message, Header, connect
 from common import make_command, run_and_wait
 
 
@@ -33,7 +33,7 @@ class LinuxBenchmarkingRuntime:
     """Mimimal linux benchmarking runtime."""
 
     def __init__(self, index: int) -> None:
-        self.socket = SLSocket(index, server=False, timeout=5.)
+        self.socket = connect(index, timeout=5.)
         self.process = -1
         self.done = False
 
@@ -95,17 +95,17 @@ class LinuxBenchmarkingRuntime:
     def run(self, msg):
         """Run program."""
         self.stop = False
-        data = json.loads(msg.payload)
+        data = json.loads(bytes(msg.payload))
 
         args = data.get("args", {})
         repeat = args.get("repeat", 1)
 
         stats = self._run_loop(data.get("file"), args, repeat)
 
-        self.socket.write(Message(
-            Header.control | 0x00, Header.profile, stats))
-        self.socket.write(Message.from_dict(
-            Header.control | 0x00, Header.exited, {"status": "exited"}))
+        self.socket.write_many([
+            Message(Header.control | 0x00, Header.profile, stats),
+            Message.from_dict(
+                Header.control | 0x00, Header.exited, {"status": "exited"})])
 
     def handle_message(self, msg: Message) -> None:
         """Handle message from manager."""
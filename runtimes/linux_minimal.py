@@ -6,7 +6,7 @@ import threading
 from subprocess import Popen, PIPE
 from beartype.typing import Optional, IO
 
-from libsilverline import Message, SLSocket, Header, Flags
+from libsilverline import Message, Header, Flags, connect
 
 
 class LinuxMinimalRuntime:
@@ -17,12 +17,12 @@ class LinuxMinimalRuntime:
 
     def __init__(self, index: int, cmd: str = "wasmer run") -> None:
         self.cmd = cmd
-        self.socket = SLSocket(index, server=False, timeout=5.)
+        self.socket = connect(index, timeout=5.)
         self.pipe: Optional[IO[bytes]] = None
 
     def run(self, msg: Message) -> None:
         """Run program."""
-        data = json.loads(msg.payload)
+        data = json.loads(bytes(msg.payload))
         cmd = [self.cmd]
         args = data.get("args", {})
         if "env" in args and args["env"]:
@@ -37,15 +37,19 @@ class LinuxMinimalRuntime:
             + bytes("$SL/proc/stdio", encoding='utf-8')))
 
         stdout, _ = process.communicate()
-        self.socket.write(Message(0x00, 0x00, stdout))
-        self.socket.write(Message.from_dict(
-            Header.control | 0x00, Header.exited, {"status": "exited"}))
+        self.socket.write_many([
+            Message(0x00, 0x00, stdout),
+            Message.from_dict(
+                Header.control | 0x00, Header.exited, {"status": "exited"})])
 
     def handle_message(self, msg: Message) -> None:
         """Handle message from manager."""
         if msg.h1 & Header.control == 0:
             if self.pipe is not None:
                 self.pipe.write(msg.payload)
+        elif msg.h2 == Header.multicast:
+            for m in msg.unmulticast():
+                self.handle_message(m)
         elif msg.h2 == Header.create:
             threading.Thread(target=self.run, args=[msg]).start()
 
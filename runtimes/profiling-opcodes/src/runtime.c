@@ -40,20 +40,24 @@ bool run_module(module_t *mod) {
         wamr_inst_module(&mod->wamr, NULL) &&
         wamr_run_module(&mod->wamr, &mod->args));
 
+    char exitmsg[] = "{\"status\": \"exited\"}";
+    message_t exited = {
+        .payloadlen = strlen(exitmsg), .h1 = H_CONTROL | 0x00,
+        .h2 = H_EXITED, .payload = exitmsg};
+
     if(res) {
         uint64_t *table = (
             (WASMModuleInstance *) mod->wamr.inst)->e->opcode_table;
-        slsocket_rwrite(
-            runtime.socket, H_CONTROL | 0x00, H_PROFILE,
-            (char *) table, 256 * sizeof(uint64_t));
+        message_t msgs[2] = {{
+            .payloadlen = 256 * sizeof(uint64_t), .h1 = H_CONTROL | 0x00,
+            .h2 = H_PROFILE, .payload = (char *) table}, exited};
+        slsocket_write_many(runtime.socket, msgs, 2);
 
         wamr_destroy_module(&mod->wamr);
+    } else {
+        slsocket_write(runtime.socket, &exited);
     }
 
-    char exitmsg[] = "{\"status\": \"exited\"}";
-    slsocket_rwrite(
-        runtime.socket, H_CONTROL | 0x00, H_EXITED, exitmsg, strlen(exitmsg));
-
     destroy_module_args(&mod->args);
     destroy_metadata_args(&mod->meta);
     return res;
@@ -81,7 +85,7 @@ int main(int argc, char **argv) {
     while (1) {
         message_t *msg = slsocket_read(runtime.socket);
         if (msg != NULL) {
-            if ((msg->h1 & H_CONTROL) != 0) {
+            if ((msg->h1 & H_CONTROL) != 0 && msg->h2 == H_CREATE) {
                 log_msg(
                     L_DBG, "Runtime received message: %.*s",
                     msg->payloadlen, msg->payload);
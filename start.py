@@ -7,7 +7,7 @@ from argparse import ArgumentParser
 
 from libsilverline import configure_log, MQTTServer
 
-from manager import Manager
+from manager import Manager, AsyncManager, ForkServer
 import interfaces
 
 
@@ -28,12 +28,50 @@ def _parse(p):
     p.add_argument(
         "-r", "--runtimes", nargs='+', help="Runtimes to start.",
         default=["linux/min/wasmer"])
+    p.add_argument(
+        "--log_queue", action='store_true', default=False,
+        help="Write logs from a background thread, so that runtimes and "
+        "modules which log heavily do not stall message handling.")
+    p.add_argument(
+        "--asyncio", action='store_true', default=False,
+        help="Run the manager on an asyncio event loop.")
+    p.add_argument(
+        "--local_fastpath", action='store_true', default=False,
+        help="Only publish channel messages to the MQTT broker if another "
+        "manager is subscribed to the topic.")
+    p.add_argument(
+        "--max_inflight", type=int, default=20,
+        help="Maximum number of in-flight QoS 1/2 MQTT messages.")
+    p.add_argument(
+        "--max_queued", type=int, default=0,
+        help="Maximum number of queued QoS 1/2 MQTT messages (0: unbounded).")
+    p.add_argument(
+        "--dispatch_workers", type=int, default=2,
+        help="Number of channel message delivery threads.")
+    p.add_argument(
+        "--subscribe_delay", type=float, default=0.02,
+        help="Time (seconds) to batch channel subscription changes for.")
+    p.add_argument(
+        "--subscribe_linger", type=float, default=0.,
+        help="Time (seconds) to stay subscribed to topics without channels.")
+    p.add_argument(
+        "--subscribe_collapse", type=int, default=0,
+        help="Subscribe to `parent/+` instead if at least this many channel "
+        "topics share a parent (0: never).")
+    p.add_argument(
+        "--fork_server", action='store_true', default=False,
+        help="Start Python runtimes by forking a template process which has "
+        "already imported them, instead of starting a new interpreter.")
+    p.add_argument(
+        "--publish_connections", type=int, default=0,
+        help="Additional MQTT connections to publish channel messages "
+        "through, sharded by topic (0: use the manager's connection).")
 
     return p
 
 
 def _main(args):
-    configure_log(args.log, args.verbose)
+    configure_log(args.log, args.verbose, queued=args.log_queue)
 
     with open('config.json') as f:
         cfg = json.load(f)
@@ -57,8 +95,23 @@ def _main(args):
     runtimes = [
         _make_runtime(rt, cpu) for rt, cpu in zip(args.runtimes, args.cpus)]
 
+    fork_server = None
+    if args.fork_server:
+        fork_server = ForkServer(preload=list({
+            rt.script for rt in runtimes
+            if getattr(rt, "script", None) is not None}))
+
     mqtt = MQTTServer.from_config(cfg)
-    Manager(runtimes, server=mqtt, name=args.name).start().run_until_stop()
+    mgr_class = AsyncManager if args.asyncio else Manager
+    mgr_class(
+        runtimes, server=mqtt, name=args.name,
+        local_fastpath=args.local_fastpath, max_inflight=args.max_inflight,
+        max_queued=args.max_queued, dispatch_workers=args.dispatch_workers,
+        subscribe_delay=args.subscribe_delay,
+        subscribe_linger=args.subscribe_linger,
+        subscribe_collapse=args.subscribe_collapse, fork_server=fork_server,
+        publish_connections=args.publish_connections
+    ).start().run_until_stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,62 @@
+"""Batch and multicast message encoding."""
+
+import pytest
+
+from libsilverline import Message, Header
+
+
+def test_batch_roundtrip():
+    """Messages (including empty and wide-header ones) survive batching."""
+    msgs = [
+        Message(1, 2, b"abc"),
+        Message(Header.control | 0x1234, Header.log_module, b"log", 0x01),
+        Message(0x7fff, 0xffff, b""),
+        Message(3, 4, memoryview(b"view")),
+    ]
+    batch = Message.from_batch(msgs)
+    assert batch.h1 == Header.control
+    assert batch.h2 == Header.batch
+
+    decoded = batch.unbatch()
+    assert [(m.h1, m.h2, bytes(m.payload), m.flags) for m in decoded] == [
+        (m.h1, m.h2, bytes(m.payload), m.flags) for m in msgs]
+
+
+def test_batch_header():
+    """Batch messages can be addressed to a module."""
+    batch = Message.from_batch([Message(1, 2, b"x")], h1=Header.control | 5)
+    assert batch.h1 == Header.control | 5
+    assert len(batch.unbatch()) == 1
+
+
+def test_batch_empty():
+    assert Message.from_batch([]).unbatch() == []
+
+
+def test_batch_truncated():
+    batch = Message.from_batch([Message(1, 2, b"abcdef")])
+    with pytest.raises(ValueError):
+        Message(batch.h1, batch.h2, batch.payload[:-1]).unbatch()
+
+
+def test_multicast_roundtrip():
+    """Each target gets the same payload."""
+    targets = [(1, 2), (3, 0x1234), (0x7fff, 0)]
+    msg = Message.from_multicast(targets, b"payload")
+    assert msg.h1 == Header.control
+    assert msg.h2 == Header.multicast
+
+    decoded = msg.unmulticast()
+    assert [(m.h1, m.h2) for m in decoded] == targets
+    assert all(bytes(m.payload) == b"payload" for m in decoded)
+
+
+def test_multicast_empty_payload():
+    decoded = Message.from_multicast([(1, 1)], b"").unmulticast()
+    assert [(m.h1, m.h2, bytes(m.payload)) for m in decoded] == [(1, 1, b"")]
+
+
+def test_multicast_truncated():
+    msg = Message.from_multicast([(1, 2), (3, 4)], b"")
+    with pytest.raises(ValueError):
+        Message(msg.h1, msg.h2, msg.payload[:-2]).unmulticast()
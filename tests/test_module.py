@@ -0,0 +1,77 @@
+"""Module table free list and generation counters."""
+
+import pytest
+
+from manager.module import ModuleLookup
+from manager.exceptions import ModuleException
+
+
+def test_insert_lowest_free():
+    """Freed indices are reused, lowest first."""
+    modules = ModuleLookup(max=4)
+    assert [modules.insert({"uuid": u}) for u in "abc"] == [0, 1, 2]
+
+    modules.remove("b")
+    modules.remove(0)
+    assert modules.free_index() == 0
+    assert modules.insert({"uuid": "d"}) == 0
+    assert modules.insert({"uuid": "e"}) == 1
+    assert modules.insert({"uuid": "f"}) == 3
+
+
+def test_lookup():
+    modules = ModuleLookup()
+    data = {"uuid": "a"}
+    idx = modules.insert(data)
+    assert data["index"] == idx
+    assert modules.get("a") is modules.get(idx)
+    assert modules.uuid(idx) == "a"
+
+    modules.remove(idx)
+    with pytest.raises(KeyError):
+        modules.get(idx)
+    with pytest.raises(KeyError):
+        modules.get("a")
+    with pytest.raises(KeyError):
+        modules.get(-1)
+
+
+def test_limit():
+    modules = ModuleLookup(max=2)
+    modules.insert({"uuid": "a"})
+    modules.insert({"uuid": "b"})
+    with pytest.raises(ModuleException):
+        modules.insert({"uuid": "c"})
+    with pytest.raises(ModuleException):
+        modules.free_index()
+
+
+def test_duplicate():
+    modules = ModuleLookup()
+    modules.insert({"uuid": "a"})
+    with pytest.raises(ModuleException):
+        modules.insert({"uuid": "a"})
+
+
+def test_generation():
+    """Indices are stale once freed or reused, even by the same UUID."""
+    modules = ModuleLookup(max=4)
+    idx = modules.insert({"uuid": "a"})
+    generation = modules.generation
+    assert not modules.stale(idx, generation)
+
+    other = modules.insert({"uuid": "b"})
+    assert modules.generation > generation
+    assert modules.stale(other, generation)
+    other_generation = modules.generation
+    assert not modules.stale(idx, generation)
+
+    modules.remove("a")
+    assert modules.stale(idx, generation)
+    assert modules.insert({"uuid": "a"}) == idx
+    assert modules.stale(idx, generation)
+    assert not modules.stale(idx, modules.generation)
+
+    assert not modules.stale(other, other_generation)
+    assert modules.stale(4, modules.generation)
+    assert modules.stale(-1, modules.generation)
@@ -0,0 +1,83 @@
+"""Outbox queue policies."""
+
+import time
+
+from libsilverline import Message, Header
+from manager.outbox import Outbox
+
+
+def _msg(module, fd, payload=b"x"):
+    return Message(module, fd, payload)
+
+
+def _drain(outbox, timeout=5.):
+    """Wait for the writer to handle all queued messages, then close."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = outbox.stats()
+        if stats["queued"] == 0 and stats["sent"] + stats["dropped"] > 0:
+            break
+        time.sleep(0.01)
+    outbox.close()
+
+
+def test_conflate_keeps_latest():
+    """Only the newest message is queued for a conflated channel."""
+    outbox = Outbox()
+    outbox.conflate(1, 2)
+    outbox.put_many([_msg(1, 2, bytes([i])) for i in range(5)])
+
+    stats = outbox.stats()
+    assert stats["queued"] == 1
+    assert stats["queued_bytes"] == 1
+    assert stats["dropped"] == 4
+
+    written: list = []
+    outbox.start(lambda msgs: written.extend(msgs) or len(msgs))
+    _drain(outbox)
+    assert [bytes(m.payload) for m in written] == [bytes([4])]
+
+
+def test_conflate_policy():
+    """The conflate policy keeps the newest message for each channel."""
+    outbox = Outbox(policy="conflate")
+    outbox.put_many(
+        [_msg(1, 2, bytes([i])) for i in range(3)]
+        + [_msg(1, 3, bytes([i])) for i in range(3)])
+
+    stats = outbox.stats()
+    assert stats["queued"] == 2
+    assert stats["dropped"] == 4
+
+
+def test_drop_newest():
+    outbox = Outbox(max_bytes=4, policy="drop_newest")
+    outbox.put_many([_msg(1, 0, b"ab") for _ in range(3)])
+    assert outbox.stats()["queued"] == 2
+    assert outbox.stats()["dropped"] == 1
+
+
+def test_drop_oldest_keeps_control():
+    """Control messages are never dropped."""
+    dropped = []
+    outbox = Outbox(max_bytes=4, policy="drop_oldest", on_drop=dropped.append)
+    control = Message(Header.control | 1, Header.create, b"{}")
+    outbox.put_many([control, _msg(1, 0, b"a"), _msg(1, 0, b"bc")])
+    outbox.put(_msg(1, 0, b"de"))
+
+    assert [bytes(m.payload) for m in dropped] == [b"a", b"bc"]
+    assert outbox.stats()["queued"] == 2
+
+
+def test_write_timeout_counts_drops():
+    """Messages which were not written are counted as dropped."""
+    dropped = []
+    outbox = Outbox(on_drop=dropped.append)
+    outbox.put_many([_msg(1, 0, bytes([i])) for i in range(4)])
+    outbox.start(lambda msgs: 1)
+    _drain(outbox)
+
+    stats = outbox.stats()
+    assert stats["sent"] == 1
+    assert stats["sent_bytes"] == 1
+    assert [bytes(m.payload) for m in dropped] == [b"\x01", b"\x02", b"\x03"]
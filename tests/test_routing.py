@@ -0,0 +1,67 @@
+"""Topic routing index."""
+
+from libsilverline import Channel, Flags
+from manager.routing import RoutingIndex
+
+
+def _ch(fd, topic):
+    return Channel(runtime=0, module=0, fd=fd, topic=topic, flags=Flags.read)
+
+
+def test_exact_and_wildcard():
+    index = RoutingIndex()
+    a, b, c = _ch(0, "a/b/c"), _ch(1, "a/+/c"), _ch(2, "a/#")
+    assert index.add(a) and index.add(b) and index.add(c)
+
+    assert set(index.match("a/b/c")) == {a, b, c}
+    assert set(index.match("a/x/c")) == {b, c}
+    assert set(index.match("a")) == {c}
+    assert index.match("b/b/c") == ()
+    assert "a/+/c" in index and "a/+" not in index
+
+
+def test_dollar_topics():
+    """Leading wildcards do not match topics starting with `$`."""
+    index = RoutingIndex()
+    index.add(_ch(0, "#"))
+    index.add(_ch(1, "+/x"))
+    exact = _ch(2, "$SYS/x")
+    index.add(exact)
+    assert index.match("$SYS/x") == (exact,)
+
+
+def test_cache_invalidation():
+    index = RoutingIndex()
+    a = _ch(0, "a/b")
+    index.add(a)
+    assert index.match("a/b") == (a,)
+    assert index.match("a/c") == ()
+
+    wildcard = _ch(1, "a/+")
+    index.add(wildcard)
+    assert set(index.match("a/b")) == {a, wildcard}
+    assert index.match("a/c") == (wildcard,)
+
+    assert index.remove(wildcard)
+    assert index.match("a/b") == (a,)
+    assert index.match("a/c") == ()
+    assert index.remove(a)
+    assert index.match("a/b") == ()
+
+
+def test_refcount_and_prune():
+    index = RoutingIndex()
+    x, y = _ch(0, "a/+/c"), _ch(1, "a/+/c")
+    assert index.add(x)
+    assert not index.add(y)
+    assert not index.remove(x)
+    assert index.remove(y)
+    assert len(index.wildcard.children) == 0
+
+
+def test_cache_size():
+    index = RoutingIndex(cache_size=2)
+    index.add(_ch(0, "#"))
+    for topic in ("a", "b", "c"):
+        index.match(topic)
+    assert list(index._cache) == ["b", "c"]
@@ -0,0 +1,83 @@
+"""SLSocket framing and version negotiation."""
+
+import pytest
+
+from libsilverline import SLSocket, Message, Header
+
+
+def _pair(tmp_path, version):
+    server = SLSocket(1, server=True, timeout=1., base_path=str(tmp_path))
+    client = SLSocket(
+        1, server=False, timeout=1., base_path=str(tmp_path),
+        version=version)
+    server.accept()
+    return server, client
+
+
+def _unpack(msg):
+    return msg.h1, msg.h2, bytes(msg.payload), msg.flags
+
+
+def test_hello_v2(tmp_path):
+    """Clients requesting v2 switch both directions over to v2."""
+    server, client = _pair(tmp_path, 2)
+    try:
+        assert client.version == 2
+        client.write(Message(0x1234, 0x5678, b"up", Header.wide))
+        assert _unpack(server.read()) == (0x1234, 0x5678, b"up", 1)
+        assert server.version == 2
+
+        server.write_many([
+            Message(Header.control | 0x100, Header.log_module, b"a", 2),
+            Message(3, 0x300, b"")])
+        assert _unpack(client.read()) == (
+            Header.control | 0x100, Header.log_module, b"a", 2)
+        assert _unpack(client.read()) == (3, 0x300, b"", 0)
+    finally:
+        client.close()
+        server.close()
+
+
+def test_hello_v1(tmp_path):
+    """Clients which do not send hello stay on v1 (without flags)."""
+    server, client = _pair(tmp_path, 1)
+    try:
+        client.write(Message(Header.control | 5, Header.ch_open, b"x", 1))
+        assert _unpack(server.read()) == (
+            Header.control | 5, Header.ch_open, b"x", 0)
+        assert server.version == 1
+        assert client.version == 1
+
+        server.write(Message(0x7f, 0xff, b"down"))
+        assert _unpack(client.read()) == (0x7f, 0xff, b"down", 0)
+        with pytest.raises(ValueError):
+            server.write(Message(0x80, 0, b""))
+        with pytest.raises(ValueError):
+            server.write(Message(0, 0x100, b""))
+    finally:
+        client.close()
+        server.close()
+
+
+def test_read_many(tmp_path):
+    """Several frames (including large ones) are read in one call."""
+    server, client = _pair(tmp_path, 2)
+    try:
+        client.write_many(
+            [Message(i, i, bytes([i]) * (100 * i)) for i in range(1, 4)])
+        msgs = []
+        while len(msgs) < 3:
+            msgs += server.read_many()
+        assert [(m.h1, len(m.payload)) for m in msgs] == [
+            (1, 100), (2, 200), (3, 300)]
+        assert server.version == 2
+    finally:
+        client.close()
+        server.close()
+
+
+def test_closed(tmp_path):
+    server, client = _pair(tmp_path, 1)
+    client.connection.close()
+    assert server.read() is None
+    server.close()
@@ -3,11 +3,14 @@
 from . import alias
 from . import aot
 from . import benchmark
+from . import broker
 from . import command
 from . import configure
 from . import cpufreq
+from . import dispatch
 from . import get
 from . import index
+from . import ipc
 from . import list
 from . import put
 from . import run
@@ -20,12 +23,15 @@ from .shortcuts import shortcuts
 commands: dict = {
     "aot": aot,
     "benchmark": benchmark,
+    "broker": broker,
     "alias": alias,
     "cmd": command,
     "configure": configure,
     "cpufreq": cpufreq,
+    "dispatch": dispatch,
     "get": get,
     "index": index,
+    "ipc": ipc,
     "list": list,
     "put": put,
     "run": run,
@@ -0,0 +1,74 @@
+"""Local MQTT broker stand-in.
+
+Runs `libsilverline.MQTTBroker` in the foreground, so that the manager,
+orchestrator, and command line tools can be run (and load tested) without a
+mosquitto broker, e.g. in CI::
+
+    hc broker --port 1883 --interval 10 --out broker.json
+
+Prints message throughput and broker latency every ``--interval`` seconds,
+and writes the final statistics (including per-topic counters) to ``--out``
+on exit.
+"""
+
+import json
+import asyncio
+
+from rich.console import Console
+from rich.table import Table
+
+from libsilverline import MQTTBroker
+
+
+_desc = "Run a local MQTT broker stand-in for offline testing."
+
+
+def _parse(p):
+    p.add_argument(
+        "--host", default="127.0.0.1", help="Address to listen on.")
+    p.add_argument("--port", type=int, default=1883, help="Port to listen on.")
+    p.add_argument(
+        "--interval", type=float, default=0.,
+        help="Statistics reporting interval (seconds); 0 to disable.")
+    p.add_argument(
+        "--out", default=None,
+        help="File to write final statistics to (JSON) on exit.")
+    return p
+
+
+def _table(stats):
+    table = Table()
+    columns = [
+        "clients", "received", "received/s", "sent", "sent/s",
+        "p50_us", "p99_us", "max_us"]
+    for column in columns:
+        table.add_column(column, justify="right")
+    latency = stats.get("latency", {})
+    table.add_row(*[
+        str(stats.get(c, latency.get(c, "--"))) for c in columns])
+    return table
+
+
+async def _serve(args, broker):
+    await broker.serve()
+    print("Listening on {}:{}".format(broker.host, broker.port))
+    while True:
+        if args.interval > 0:
+            await asyncio.sleep(args.interval)
+            Console().print(_table(broker.stats()))
+        else:
+            await asyncio.sleep(3600)
+
+
+def _main(args):
+    broker = MQTTBroker(host=args.host, port=args.port)
+    try:
+        asyncio.run(_serve(args, broker))
+    except KeyboardInterrupt:
+        pass
+
+    stats = broker.stats()
+    Console().print(_table(stats))
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(stats, f, indent=4)
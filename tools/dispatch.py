@@ -0,0 +1,171 @@
+"""Runtime message dispatch microbenchmarks.
+
+Measures how many messages per second a single thread (i.e. core) of the
+manager can handle, without any transport or MQTT broker in the way:
+
+- ``publish``: handling a channel message from a runtime (looked up and
+  delivered to one reader channel on the same runtime).
+- ``batch``: the same, with ``--batch`` messages in each batch message.
+- ``control``: handling a module log control message (with logging
+  disabled).
+
+Each case is measured in a separate process with the previous dispatch
+(a structural ``match`` on every message, reproduced here as
+`_MatchDispatch`) and the current ``control_handlers`` table. Pass
+``--production`` to run both without runtime type checking (see
+`libsilverline.hotpath`). For example::
+
+    hc dispatch --count 200000
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+from rich.console import Console
+from rich.table import Table
+
+
+_desc = "Benchmark runtime message dispatch throughput."
+
+
+CASES = ["publish", "batch", "control"]
+
+
+def _parse(p):
+    p.add_argument(
+        "--case", nargs='+', default=CASES, choices=CASES,
+        help="Message handling path(s) to benchmark.")
+    p.add_argument(
+        "--count", type=int, default=100000,
+        help="Number of messages per measurement.")
+    p.add_argument(
+        "--size", type=int, default=64, help="Channel message payload size.")
+    p.add_argument(
+        "--batch", type=int, default=16, help="Messages per batch message.")
+    p.add_argument(
+        "--production", action='store_true', default=False,
+        help="Disable runtime type checking (SL_PRODUCTION=1).")
+    p.add_argument(
+        "--python", default=sys.executable,
+        help="Python executable for benchmark processes.")
+    return p
+
+
+def _worker(case, count, size, batch, dispatch):
+    """Run a single measurement; returns messages per second."""
+    from libsilverline import Message, Header, Flags
+    from manager import Manager, RuntimeManager, exceptions
+
+    class _Runtime(RuntimeManager):
+        POLL_RECEIVE = False
+
+        def start(self):
+            return {}
+
+        def send_many(self, msgs):
+            pass
+
+    class _MatchDispatch(_Runtime):
+        """Runtime message handling before the ``control_handlers`` table."""
+
+        def __handle(self, msg):
+            match (msg.h1 & Header.control, msg.h1 & Header.index_bits,
+                   msg.h2):
+                case (0x00, h1, h2):
+                    self.mgr.channels.publish(self.index, h1, h2, msg.payload)
+                case (Header.control, _, Header.keepalive):
+                    self.handle_keepalive(bytes(msg.payload))
+                case (Header.control, _, Header.log_runtime):
+                    self.handle_log(bytes(msg.payload), module=-1)
+                case (Header.control, idx, Header.exited):
+                    self.cleanup_module(idx, self.modules.uuid(idx), msg)
+                case (Header.control, idx, Header.ch_open):
+                    self.mgr.channels.open(
+                        runtime=self.index, module=idx,
+                        **self._RuntimeManager__open_channel_args(msg))
+                case (Header.control, idx, Header.ch_close):
+                    fd, _ = self._RuntimeManager__channel_index(msg)
+                    self.mgr.channels.close(self.index, idx, fd)
+                case (Header.control, idx, Header.log_module):
+                    self.handle_log(bytes(msg.payload), module=idx)
+                case (Header.control, idx, Header.profile):
+                    self.handle_profile(
+                        self.modules.uuid(idx), bytes(msg.payload))
+                case _:
+                    raise exceptions.SLException("Unknown message type")
+
+        def on_runtime_message(self, msg):
+            if msg.h1 & Header.control and msg.h2 == Header.batch:
+                try:
+                    msgs = msg.unbatch()
+                except Exception as e:
+                    exceptions.handle_error(
+                        e, self.log, self.index, msg.h1, msg.h2)
+                    return
+            else:
+                msgs = [msg]
+
+            for msg in msgs:
+                try:
+                    self.__handle(msg)
+                except Exception as e:
+                    exceptions.handle_error(
+                        e, self.log, self.index, msg.h1, msg.h2)
+
+    runtime = (_MatchDispatch if dispatch == "match" else _Runtime)(
+        name="bench")
+    mgr = Manager([runtime], name="bench", dispatch_workers=0)
+    runtime.index = 0
+    runtime.mgr = mgr
+    mgr.channels.open(0, 0, 0, b"bench", Flags.write | Flags.local)
+    mgr.channels.open(0, 1, 0, b"bench", Flags.read | Flags.local)
+
+    data = bytes(size)
+    if case == "publish":
+        msg = Message(0, 0, data)
+    elif case == "batch":
+        msg = Message.from_batch([Message(0, 0, data)] * batch)
+        count = count // batch
+    else:
+        msg = Message(Header.control | 1, Header.log_module, b"\x85" + data)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        runtime.on_runtime_message(msg)
+    if case == "batch":
+        count = count * batch
+    return count / (time.perf_counter() - start)
+
+
+def _run(args, case, dispatch):
+    process = subprocess.run(
+        [args.python, "tools/dispatch.py", case, str(args.count),
+         str(args.size), str(args.batch), dispatch],
+        capture_output=True, check=True, text=True, env={
+            **os.environ, "SL_PRODUCTION": "1" if args.production else "0",
+            "PYTHONPATH": os.pathsep.join(
+                [".", os.environ.get("PYTHONPATH", "")])})
+    return json.loads(process.stdout.strip().split('\n')[-1])
+
+
+def _main(args):
+    table = Table()
+    for column in ["case", "match msg/s", "table msg/s", "speedup"]:
+        table.add_column(column, justify="right")
+
+    for case in args.case:
+        before = _run(args, case, "match")
+        after = _run(args, case, "table")
+        table.add_row(
+            case, "{:.0f}".format(before), "{:.0f}".format(after),
+            "{:.2f}x".format(after / before))
+    Console().print(table)
+
+
+if __name__ == '__main__':
+    print(json.dumps(_worker(
+        sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]),
+        sys.argv[5])))
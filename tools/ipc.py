@@ -0,0 +1,271 @@
+"""Manager <-> runtime IPC microbenchmarks.
+
+Runs a benchmark peer (``runtimes/ipc_bench.py`` or the C equivalent in
+``runtimes/ipc-bench``) for each (peer x transport) combination, and measures
+one-way throughput in each direction and request/response latency for each
+payload size. For example::
+
+    hc ipc --peer python c --size 0 64 1024 --out ipc.csv
+
+The manager side uses the same transport classes as the runtime manager
+(acting as the server); the peer handles channel messages on module 0 by
+``h2``:
+
+- ``0x00`` (echo): send the message back.
+- ``0x01`` (sink): count and discard.
+- ``0x02`` (sync): reply with ``0x02``, with the number of sink messages
+  received since the last sync (``u32``).
+- ``0x03`` (source): payload ``[count:u32][size:u32][batch:u32]``; send
+  ``count`` sink messages of ``size`` bytes (``batch`` per write), then a
+  sync message.
+
+Multicast messages (``Header.multicast``) are handled as one message for
+each target; any other control message stops the peer.
+
+The ``fanout`` and ``mcast`` patterns measure delivering each payload to
+``--fanout`` channels, either as separate messages or as a single multicast
+message; throughput is reported in delivered (channel) messages.
+"""
+
+import os
+import time
+import struct
+import subprocess
+
+import numpy as np
+import pandas as pd
+from rich.console import Console
+from rich.table import Table
+
+from libsilverline import Message, Header, SLSocket, SLSharedMemory
+
+
+_desc = "Benchmark manager <-> runtime IPC transports."
+
+
+ECHO = 0x00
+SINK = 0x01
+SYNC = 0x02
+SOURCE = 0x03
+
+PEERS = {
+    "python": lambda python, index, version: [
+        python, "runtimes/ipc_bench.py", str(index), str(version)],
+    "c": lambda python, index, version: [
+        "runtimes/ipc-bench/build/ipc-bench", str(index), str(version)]
+}
+
+# (transport, protocol version)
+TRANSPORTS = {
+    "socket": (SLSocket, 2),
+    "socket-v1": (SLSocket, 1),
+    "shm": (SLSharedMemory, 2),
+}
+
+PATTERNS = ["send", "recv", "rr", "fanout", "mcast"]
+
+DEFAULT_SIZES = [0, 64, 1024, 16384, 262144, 1048576]
+
+
+def _parse(p):
+    p.add_argument(
+        "--peer", nargs='+', default=list(PEERS.keys()),
+        choices=list(PEERS.keys()), help="Benchmark peer implementation(s).")
+    p.add_argument(
+        "--transport", nargs='+', default=list(TRANSPORTS.keys()),
+        choices=list(TRANSPORTS.keys()), help="Transport(s) to benchmark.")
+    p.add_argument(
+        "--pattern", nargs='+', default=PATTERNS, choices=PATTERNS,
+        help="One-way manager->runtime (send), one-way runtime->manager "
+        "(recv), request/response (rr), and/or one-way manager->runtime to "
+        "--fanout channels with separate (fanout) or multicast (mcast) "
+        "messages.")
+    p.add_argument(
+        "--size", nargs='+', type=int, default=DEFAULT_SIZES,
+        help="Payload sizes, in bytes.")
+    p.add_argument(
+        "--count", type=int, default=10000,
+        help="Maximum number of messages per one-way measurement.")
+    p.add_argument(
+        "--rr", type=int, default=2000,
+        help="Maximum number of round trips per latency measurement.")
+    p.add_argument(
+        "--max_bytes", type=int, default=1 << 28,
+        help="Limit the total payload bytes per measurement; large payloads "
+        "use fewer messages (but at least --min_count).")
+    p.add_argument(
+        "--min_count", type=int, default=50,
+        help="Minimum number of messages per measurement.")
+    p.add_argument(
+        "--batch", type=int, default=16,
+        help="Messages per write_many call for one-way measurements.")
+    p.add_argument(
+        "--fanout", type=int, default=16,
+        help="Channels each payload is delivered to by fanout/mcast.")
+    p.add_argument(
+        "--warmup", type=int, default=100, help="Warmup round trips.")
+    p.add_argument(
+        "--index", type=int, default=0xfe,
+        help="Runtime index (socket address) to use for the benchmark.")
+    p.add_argument(
+        "--python", default="python", help="Python executable for peers.")
+    p.add_argument(
+        "--out", default=None,
+        help="Save results to this file (.csv or .json).")
+    return p
+
+
+def _count(args, size, limit):
+    return max(args.min_count, min(limit, args.max_bytes // max(size, 1)))
+
+
+def _sync(transport):
+    """Send sync message and wait for reply; returns sink message count."""
+    transport.write(Message(0x00, SYNC, bytes()))
+    while True:
+        msg = transport.read()
+        if msg is None:
+            raise TimeoutError("Benchmark peer did not respond.")
+        if msg.h2 == SYNC:
+            return struct.unpack("I", msg.payload)[0] if msg.payload else 0
+
+
+def _send(args, transport, size):
+    """One-way manager -> runtime throughput."""
+    n = _count(args, size, args.count)
+    data = bytes(size)
+    start = time.perf_counter()
+    for i in range(0, n, args.batch):
+        transport.write_many(
+            [Message(0x00, SINK, data)] * min(args.batch, n - i))
+    received = _sync(transport)
+    duration = time.perf_counter() - start
+    return {"n": n, "lost": n - received, "duration": duration}
+
+
+def _fanout(args, transport, size, multicast=False):
+    """One-way manager -> runtime throughput, to several channels."""
+    n = _count(args, size, args.count) // args.fanout * args.fanout
+    data = bytes(size)
+    if multicast:
+        msgs = [Message.from_multicast(
+            [(0x00, SINK)] * args.fanout, data)]
+    else:
+        msgs = [Message(0x00, SINK, data)] * args.fanout
+    start = time.perf_counter()
+    for i in range(0, n, args.fanout):
+        transport.write_many(msgs)
+    received = _sync(transport)
+    duration = time.perf_counter() - start
+    return {"n": n, "lost": n - received, "duration": duration}
+
+
+def _recv(args, transport, size):
+    """One-way runtime -> manager throughput."""
+    n = _count(args, size, args.count)
+    start = time.perf_counter()
+    transport.write(Message(
+        0x00, SOURCE, struct.pack("III", n, size, args.batch)))
+    received = 0
+    while True:
+        msg = transport.read()
+        if msg is None:
+            raise TimeoutError("Benchmark peer did not respond.")
+        if msg.h2 == SYNC:
+            break
+        received += 1
+    duration = time.perf_counter() - start
+    return {"n": n, "lost": n - received, "duration": duration}
+
+
+def _rr(args, transport, size, n=None):
+    """Request/response latency."""
+    n = _count(args, size, args.rr) if n is None else n
+    data = bytes(size)
+    latency = np.zeros(n)
+    for i in range(n):
+        start = time.perf_counter_ns()
+        transport.write(Message(0x00, ECHO, data))
+        msg = transport.read()
+        if msg is None:
+            raise TimeoutError("Benchmark peer did not respond.")
+        latency[i] = time.perf_counter_ns() - start
+    latency /= 1000
+    return {
+        "n": n, "lost": 0, "duration": np.sum(latency) / 1e6,
+        "mean_us": np.mean(latency), "p50_us": np.percentile(latency, 50),
+        "p90_us": np.percentile(latency, 90),
+        "p99_us": np.percentile(latency, 99), "max_us": np.max(latency)
+    }
+
+
+def _run(args, peer, transport):
+    """Run all patterns and sizes for a single (peer, transport)."""
+    cls, version = TRANSPORTS[transport]
+    server = cls(args.index, server=True, timeout=30.)
+    process = subprocess.Popen(
+        PEERS[peer](args.python, args.index, version),
+        env={**os.environ, "SL_TRANSPORT": cls.NAME})
+
+    results = []
+    try:
+        server.accept()
+        # Also completes version negotiation before anything is measured.
+        if args.warmup > 0:
+            _rr(args, server, 0, n=args.warmup)
+        _sync(server)
+
+        for size in args.size:
+            for pattern in args.pattern:
+                res = {
+                    "send": _send, "recv": _recv, "rr": _rr,
+                    "fanout": _fanout,
+                    "mcast": lambda *a: _fanout(*a, multicast=True)
+                }[pattern](args, server, size)
+                res.update({
+                    "peer": peer, "transport": transport,
+                    "pattern": pattern, "size": size,
+                    "msg/s": res["n"] / res["duration"],
+                    "MB/s": res["n"] * size / res["duration"] / 1e6})
+                results.append(res)
+        server.write(Message(Header.control, Header.stop, bytes()))
+    finally:
+        process.wait(timeout=10.)
+        server.close()
+    return results
+
+
+def _fmt(x):
+    if pd.isna(x):
+        return "--"
+    elif isinstance(x, float):
+        return "{:.1f}".format(x) if x < 1000 else "{:.0f}".format(x)
+    else:
+        return str(x)
+
+
+def _table(df):
+    table = Table()
+    columns = [
+        "peer", "transport", "pattern", "size", "n", "msg/s", "MB/s",
+        "p50_us", "p90_us", "p99_us", "max_us"]
+    for column in columns:
+        table.add_column(column, justify="right")
+    for _, row in df.iterrows():
+        table.add_row(*[_fmt(row.get(c)) for c in columns])
+    return table
+
+
+def _main(args):
+    results = []
+    for peer in args.peer:
+        for transport in args.transport:
+            results += _run(args, peer, transport)
+
+    df = pd.DataFrame(results)
+    Console().print(_table(df))
+    if args.out is not None:
+        if args.out.endswith(".json"):
+            df.to_json(args.out, orient="records", indent=2)
+        else:
+            df.to_csv(args.out, index=False)